@@ -3,25 +3,41 @@ from tkinter import simpledialog, messagebox, font
 import sqlite3
 import networkx as nx
 import numpy as np
-import pandas as pd
 import statistics
 from heapq import nsmallest
 import os
 import shutil
 import random
-from graph_operations import get_graph_from_db
+import graph_cache
+import landmarks
+import node_metrics
+import edge_stats
+import tasks
+from nearest import k_nearest, multi_source_k_nearest
 
 def find_nearest_nodes(): 
-    G = get_graph_from_db()
     node = simpledialog.askstring("Input", "Enter the node name to find nearest nodes:")
-    if node not in G.nodes():
-        messagebox.showerror("Error", f"Node '{node}' not found in the graph.")
+    if not node:
         return
 
-    distances = nx.single_source_dijkstra_path_length(G, node)
-    nearest_nodes = nsmallest(31, distances.items(), key=lambda x: x[1])  # Get top 21 (including the node itself)
-    nearest_nodes = [n for n in nearest_nodes if n[0] != node][:30]  # Exclude the node itself and get top 20
+    def search():
+        G = graph_cache.get_snapshot()
+        if node not in G:
+            raise KeyError(f"Node '{node}' not found in the graph.")
+        # Stop the search once the 30 nearest nodes (excluding the node itself) are settled;
+        # with a landmark file the search also skips neighbors too far to be among them
+        oracle = landmarks.get_oracle()
+        if oracle is not None:
+            return oracle.k_nearest(node, 30)
+        return k_nearest(G, node, 30)
 
+    # Runs on the task pool so the window stays responsive while the graph loads
+    tasks.get_scheduler().submit(
+        f"Nearest to {node}", search,
+        on_done=lambda nearest_nodes: show_nearest_nodes(node, nearest_nodes),
+        on_error=lambda error: messagebox.showerror("Error", error.args[0] if error.args else str(error)))
+
+def show_nearest_nodes(node, nearest_nodes):
     result = "\n".join([f"{i+1}. {n[0]}: {n[1]}" for i, n in enumerate(nearest_nodes)])
     # messagebox.showinfo("Nearest Nodes", f"Top 20 nearest nodes to {node}:\n\n{result}")
     # Create a custom messagebox with larger font
@@ -37,7 +53,14 @@ def find_nearest_nodes():
     # Plot the local graph
     # plot_local_graph(node, nearest_nodes)
     
-def calculate_node_metrics(G, center_nodes):
+def calculate_node_metrics(G, center_nodes, db_path=None):
+    # Imported on first use; pandas is slow to load
+    import pandas as pd
+
+    # With db_path, metrics already stored in node_metrics are used as they are
+    stored = node_metrics.get_metrics(center_nodes, db_path) if db_path else {}
+    missing = [node for node in center_nodes if node not in stored]
+
     results = {
         'Node': [],
         'Connected Nodes': [],
@@ -46,15 +69,24 @@ def calculate_node_metrics(G, center_nodes):
         'Distance 20': []
     }
     
+    # Distances to the 20 nearest other nodes of every center, computed in parallel
+    nearest_by_node, _ = multi_source_k_nearest(G, missing, 20) if missing else ({}, set())
+
     for node in center_nodes:
+        if node in stored:
+            metrics = stored[node]
+            results['Node'].append(node)
+            results['Connected Nodes'].append(metrics['degree'])
+            results['Distance 5'].append(metrics['dist5'])
+            results['Distance 10'].append(metrics['dist10'])
+            results['Distance 20'].append(metrics['dist20'])
+            continue
+
         # Number of directly connected nodes (degree)
         degree = G.degree(node)
 
-        # Calculate distances to all other nodes
-        lengths = nx.single_source_dijkstra_path_length(G, node)
-
-        # Exclude the node itself and sort distances to other nodes
-        sorted_lengths = sorted(lengths.values())[1:]
+        # Distances to the 20 nearest other nodes, already sorted
+        sorted_lengths = [d for _, d in nearest_by_node[node]]
 
         # Calculate average distances for top 5, 10, and 20 nearest nodes
         avg_dist_top5 = sum(sorted_lengths[:5]) / min(5, len(sorted_lengths))
@@ -81,13 +113,18 @@ def display_metrics(df):
     text_widget.config(state=tk.DISABLED)
 
 def calculate_edge_statistics():
-    G = get_graph_from_db()
-    edge_weights = [data['weight'] for u, v, data in G.edges(data=True)]
+    # Streamed from SQLite and cached between calls; no graph is built
+    summary = edge_stats.get_stats().summary()
 
-    if edge_weights:
-        average_weight = sum(edge_weights) / len(edge_weights)
-        median_weight = statistics.median(edge_weights)
+    if summary['count']:
+        average_weight = summary['mean']
+        # Exact ranks rather than the digest's estimates
+        quantiles = edge_stats.exact_quantiles((0.5, 0.9))
+        median_weight = quantiles[0.5]
 
-        messagebox.showinfo("Edge Statistics", f"Average Edge Weight: {average_weight:.2f}\nMedian Edge Weight: {median_weight:.2f}")
+        messagebox.showinfo("Edge Statistics", f"Average Edge Weight: {average_weight:.2f}\nMedian Edge Weight: {median_weight:.2f}\n"
+                                               f"Min/Max Edge Weight: {summary['min']:.2f} / {summary['max']:.2f}\n"
+                                               f"Standard Deviation: {summary['stdev']:.2f}\n"
+                                               f"90th Percentile: {quantiles[0.9]:.2f}")
     else:
         messagebox.showinfo("Edge Statistics", "No edges found in the graph.")
@@ -0,0 +1,6 @@
+"""
+Benchmarks on seeded synthetic vaults.
+
+Run ``python -m benchmarks --output results.json`` from the repository root, and later
+``python -m benchmarks --baseline results.json`` to see which benchmarks got slower.
+"""
@@ -0,0 +1,42 @@
+import argparse
+import json
+import sys
+import tempfile
+from benchmarks.suite import BENCHMARKS, run, compare
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description="Run the benchmark suite on synthetic vaults.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000],
+                        help="Vault sizes in nodes (default: 1000 10000)")
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help="Run only these benchmarks")
+    parser.add_argument('--repeats', type=int, default=3, help="Timed runs per benchmark (default: 3)")
+    parser.add_argument('--seed', type=int, default=0, help="Generator seed (default: 0)")
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    parser.add_argument('--baseline', help="Compare against a results file from an earlier run")
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help="Slowdown ratio reported as a regression (default: 1.25)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix='graph-bench-') as directory:
+        results = run(args.sizes, directory, args.only, args.repeats, args.seed)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+        rows = compare(results, baseline, args.threshold)
+        print(f"\n{'size':>8} {'benchmark':<16} {'baseline':>10} {'current':>10} {'ratio':>7}")
+        for size, name, base, current, ratio, regressed in rows:
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{size:>8} {name:<16} {base:>10.4f} {current:>10.4f} {ratio:>7.2f}{flag}")
+        if any(row[-1] for row in rows):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
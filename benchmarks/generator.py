@@ -0,0 +1,67 @@
+import sqlite3
+import numpy as np
+from database import create_tables
+
+# Words used to build note titles, so search benchmarks have realistic substrings
+WORDS = (
+    'graph', 'note', 'layout', 'python', 'sqlite', 'index', 'search', 'vector', 'memory',
+    'cache', 'query', 'network', 'design', 'reading', 'journal', 'project', 'idea',
+    'review', 'paper', 'method', 'history', 'language', 'model', 'music', 'travel',
+    'health', 'budget', 'recipe', 'garden', 'meeting', 'lecture', 'draft', 'topic',
+)
+
+def generate_vault(n, seed=0, avg_degree=6, exponent=2.5):
+    """
+    Generate a synthetic note graph with power-law degrees (Chung-Lu model).
+
+    Node ``i`` gets an expected degree proportional to ``(i + 1) ** (-1 / (exponent - 1))``,
+    so a few hub notes collect many links, like topic pages in a real vault. Weights are
+    integers from 1 to 10. The same ``n`` and ``seed`` always give the same graph.
+
+    :param n: Number of nodes.
+    :param avg_degree: Target average degree.
+    :param exponent: Exponent of the degree distribution.
+    :return: ``(names, u, v, w)``: node names and arrays of undirected edges (``u < v``,
+        no duplicates).
+    """
+    rng = np.random.default_rng(seed)
+    words = rng.choice(WORDS, size=(n, 2))
+    names = [f"{a} {b} {i}" for i, (a, b) in enumerate(words.tolist())]
+
+    expected = (np.arange(n) + 1.0) ** (-1.0 / (exponent - 1.0))
+    p = expected / expected.sum()
+    m = n * avg_degree // 2
+    # Draw a few extra pairs to make up for self-loops and duplicates
+    u = rng.choice(n, size=int(m * 1.3) + 10, p=p)
+    v = rng.choice(n, size=len(u), p=p)
+    u, v = np.minimum(u, v), np.maximum(u, v)
+    keep = u != v
+    u, v = u[keep], v[keep]
+    _, first = np.unique(u.astype(np.int64) * n + v, return_index=True)
+    first = np.sort(first)[:m]
+    u, v = u[first], v[first]
+    w = rng.integers(1, 11, size=len(u)).astype(np.float64)
+    return names, u, v, w
+
+def write_database(path, names, u, v, w):
+    """Write a generated vault to a new SQLite database, one row per undirected edge."""
+    conn = sqlite3.connect(path)
+    create_tables(conn)
+    with conn:
+        conn.executemany("INSERT INTO nodes (id, name) VALUES (?, ?)",
+                         ((i + 1, name) for i, name in enumerate(names)))
+        # u < v, so ids are already in canonical order
+        conn.executemany("INSERT INTO links (source_id, target_id, weight) VALUES (?, ?, ?)",
+                         zip((u + 1).tolist(), (v + 1).tolist(), w.tolist()))
+    conn.close()
+
+def write_chunk_file(path, names, u, v, w):
+    """Write a generated vault as a text chunk file (``NodeA: NodeB, 5, NodeC, 10`` per line)."""
+    order = np.argsort(u, kind='stable')
+    u, v, w = u[order], v[order], w[order]
+    starts = np.flatnonzero(np.r_[True, u[1:] != u[:-1]]) if len(u) else []
+    ends = list(starts[1:]) + [len(u)]
+    with open(path, 'w', encoding='utf-8') as file:
+        for start, end in zip(starts, ends):
+            relations = ', '.join(f"{names[b]}, {weight:g}" for b, weight in zip(v[start:end].tolist(), w[start:end].tolist()))
+            file.write(f"{names[u[start]]}: {relations}\n")
@@ -0,0 +1,197 @@
+import os
+import platform
+import sys
+import time
+import numpy as np
+import communities
+import graph_cache
+import landmarks
+import node_search
+import snapshot_file
+import text_chunks_query
+import visualization
+from bulk_ingest import bulk_ingest
+from crossings import CrossingIndex
+from force_layout import barnes_hut_layout
+from graph_snapshot import load_snapshot
+from nearest import k_nearest
+from benchmarks.generator import WORDS, generate_vault, write_database, write_chunk_file
+
+# Registered benchmarks in run order: name -> function(context) that runs the work once
+BENCHMARKS = {}
+
+def benchmark(name):
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+class Context:
+    """Generated vault for one size: database and chunk file paths, sample nodes, snapshot."""
+
+    def __init__(self, n, directory, seed=0):
+        self.n = n
+        self.seed = seed
+        self.names, self.u, self.v, self.w = generate_vault(n, seed)
+        self.db_path = os.path.join(directory, f'vault_{n}.db')
+        self.chunk_path = os.path.join(directory, f'vault_{n}.txt')
+        self.ingest_path = os.path.join(directory, f'ingest_{n}.db')
+        write_database(self.db_path, self.names, self.u, self.v, self.w)
+        write_chunk_file(self.chunk_path, self.names, self.u, self.v, self.w)
+        self.snapshot = load_snapshot(self.db_path)
+
+        rng = np.random.default_rng(seed)
+        # Sample nodes that have edges, as a user would pick them
+        linked = np.unique(np.concatenate([self.u, self.v]))
+        self.sources = [self.names[i] for i in rng.choice(linked, size=min(100, len(linked)), replace=False)]
+        self.keywords = [f"{a} {b}"[:k] for a, b, k in zip(rng.choice(WORDS, 50), rng.choice(WORDS, 50), rng.integers(3, 12, 50))]
+
+        # Local graph like the one the GUI lays out: a center and its 500 nearest nodes
+        local = [self.sources[0]] + [node for node, _ in k_nearest(self.snapshot, self.sources[0], 500)]
+        self.local_G = self.snapshot.to_networkx(local)
+        self.local_pos = barnes_hut_layout(self.local_G, dim=2, iterations=50, seed=seed)
+
+@benchmark('load_snapshot')
+def bench_load_snapshot(ctx):
+    load_snapshot(ctx.db_path)
+
+@benchmark('load_snapshot_file')
+def bench_load_snapshot_file(ctx):
+    # Mapped .snapshot file; the warm-up run writes it
+    snapshot_file.load_cached_snapshot(ctx.db_path)
+
+@benchmark('load_graph')
+def bench_load_graph(ctx):
+    # get_graph_from_db path: a full networkx reload through the graph cache
+    graph_cache.invalidate(ctx.db_path)
+    graph_cache.get_graph(ctx.db_path)
+
+@benchmark('k_nearest')
+def bench_k_nearest(ctx):
+    for source in ctx.sources:
+        k_nearest(ctx.snapshot, source, 20)
+
+@benchmark('oracle_k_nearest')
+def bench_oracle_k_nearest(ctx):
+    # Same queries as k_nearest through the landmark oracle; the warm-up run builds it
+    if getattr(ctx, 'oracle', None) is None:
+        ctx.oracle = landmarks.build_oracle(ctx.snapshot)
+    for source in ctx.sources:
+        ctx.oracle.k_nearest(source, 20)
+
+@benchmark('related_chunks')
+def bench_related_chunks(ctx):
+    for source in ctx.sources[:20]:
+        text_chunks_query.get_related_chunks(ctx.db_path, source, max_depth=3)
+
+@benchmark('crossings')
+def bench_crossings(ctx):
+    CrossingIndex(ctx.local_G.edges(), ctx.local_pos).count_crossings()
+
+@benchmark('layout')
+def bench_layout(ctx):
+    barnes_hut_layout(ctx.local_G, dim=2, iterations=50, seed=ctx.seed)
+
+@benchmark('plot_2d')
+def bench_plot_2d(ctx):
+    # Full 2D pipeline (layout, crossing removal, refinement, drawing) on a headless backend
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    centers = ctx.sources[:2]
+    nearest_nodes = [pair for center in centers for pair in k_nearest(ctx.snapshot, center, 20)]
+    saved = visualization.DB_PATH
+    visualization.DB_PATH = ctx.db_path
+    try:
+        visualization.plot_combined_local_graph_2D(centers, nearest_nodes, 'spring_grid', {'k': 0.7, 'iterations': 50})
+    finally:
+        visualization.DB_PATH = saved
+        plt.close('all')
+
+@benchmark('render_2d')
+def bench_render_2d(ctx):
+    # Batched renderer on the 500-node local graph, rasterized as by savefig
+    import io
+    import render2d
+    render2d.render_figure(ctx.sources[:1], ctx.local_pos, ctx.local_G).savefig(io.BytesIO(), format='png')
+
+@benchmark('html_3d')
+def bench_html_3d(ctx):
+    # 3D HTML export of the 500-node local graph, flattened onto z = 0
+    import render3d
+    pos = {node: (x, y, 0.0) for node, (x, y) in ctx.local_pos.items()}
+    figure = render3d.build_figure_3d(ctx.sources[:1], pos, ctx.local_G)
+    render3d.write_html_3d(figure, os.path.join(os.path.dirname(ctx.db_path), f'local_{ctx.n}.html'))
+
+@benchmark('communities')
+def bench_communities(ctx):
+    communities.build_hierarchy(ctx.snapshot)
+
+@benchmark('ingest')
+def bench_ingest(ctx):
+    if os.path.exists(ctx.ingest_path):
+        os.remove(ctx.ingest_path)
+    bulk_ingest(ctx.chunk_path, ctx.ingest_path, progress=None)
+
+@benchmark('search')
+def bench_search(ctx):
+    for keyword in ctx.keywords:
+        node_search.search_nodes(keyword, ctx.db_path)
+        node_search.search_edges(keyword, ctx.db_path, limit=100)
+
+def run(sizes, directory, names=None, repeats=3, seed=0, log=print):
+    """
+    Run the benchmarks for every vault size.
+
+    Each benchmark runs once to warm up, then ``repeats`` times; the fastest run counts.
+
+    :param names: Benchmarks to run, defaults to all of :data:`BENCHMARKS`.
+    :return: Result dict ready to be written as JSON.
+    """
+    names = list(names or BENCHMARKS)
+    results = {}
+    for n in sizes:
+        started = time.perf_counter()
+        ctx = Context(n, directory, seed)
+        log(f"vault of {n} nodes and {len(ctx.u)} edges generated in {time.perf_counter() - started:.2f}s")
+        results[str(n)] = {}
+        for name in names:
+            fn = BENCHMARKS[name]
+            fn(ctx)
+            times = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                fn(ctx)
+                times.append(time.perf_counter() - start)
+            results[str(n)][name] = {'seconds': min(times), 'runs': times}
+            log(f"  {name:<16} {min(times):.4f}s")
+        graph_cache.invalidate()
+    return {
+        'meta': {
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'seed': seed,
+            'repeats': repeats,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+
+def compare(current, baseline, threshold=1.25):
+    """
+    Compare two result dicts.
+
+    :param threshold: Slowdown ratio from which a benchmark counts as a regression.
+    :return: List of ``(size, name, baseline_seconds, current_seconds, ratio, regressed)``
+        for the benchmarks present in both.
+    """
+    rows = []
+    for size, benches in current['results'].items():
+        for name, result in benches.items():
+            base = baseline.get('results', {}).get(size, {}).get(name)
+            if base is None:
+                continue
+            ratio = result['seconds'] / base['seconds'] if base['seconds'] > 0 else float('inf')
+            rows.append((size, name, base['seconds'], result['seconds'], ratio, ratio > threshold))
+    return rows
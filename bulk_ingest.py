@@ -0,0 +1,230 @@
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from database import create_tables, get_schema_version, resume_graph_version, suspend_graph_version
+from landmarks import refresh_oracle
+from node_metrics import update_metrics
+
+# Pragmas for large imports: synchronous=NORMAL only syncs at checkpoints and a 256 MB
+# page cache keeps the UNIQUE indexes in memory. They only last for the connection.
+BULK_PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -262144",
+    "PRAGMA temp_store = MEMORY",
+)
+
+def apply_bulk_pragmas(conn, wal=False):
+    # WAL lets readers keep working during the import, but unlike the pragmas above
+    # it is stored in the database file and stays after the connection closes, so it
+    # is only switched on when asked for
+    for pragma in BULK_PRAGMAS:
+        conn.execute(pragma)
+    if wal:
+        conn.execute("PRAGMA journal_mode = WAL")
+
+def parse_line(line):
+    """
+    Parse one ``NodeA: NodeB, 5, NodeC, 10`` line into a list of (source, target, weight).
+
+    Returns None for lines without exactly one ':' and raises ValueError or IndexError
+    for malformed relation lists.
+    """
+    parts = line.strip().split(':')
+    if len(parts) != 2:
+        return None
+    source = parts[0].strip()
+    connections = parts[1].strip().split(',')
+    edges = []
+    for i in range(0, len(connections), 2):
+        target = connections[i].strip()
+        weight = float(connections[i + 1].strip())
+        edges.append((source, target, weight))
+    return edges
+
+def iter_edges(lines, stats=None):
+    """
+    Stream (source, target, weight) tuples from an iterable of lines.
+
+    Malformed lines are skipped and counted in ``stats['skipped']``.
+    """
+    for line in lines:
+        if stats is not None:
+            stats['lines'] = stats.get('lines', 0) + 1
+        try:
+            edges = parse_line(line)
+        except (ValueError, IndexError):
+            if stats is not None:
+                stats['skipped'] = stats.get('skipped', 0) + 1
+            continue
+        if edges:
+            yield from edges
+
+def _parse_range(filename, start, end):
+    # Parse the lines that start inside [start, end) of the file
+    stats = {}
+    edges = []
+    with open(filename, 'rb') as file:
+        if start > 0:
+            file.seek(start - 1)
+            file.readline()  # Finish the line that belongs to the previous range
+        while file.tell() < end:
+            line = file.readline()
+            if not line:
+                break
+            edges.extend(iter_edges([line.decode('utf-8')], stats))
+    return edges, stats
+
+def iter_file_edges(filename, workers=1, stats=None):
+    """
+    Stream the edges of a text chunk file, optionally parsing it on several processes.
+
+    With ``workers > 1`` the file is split into byte ranges that are parsed in
+    parallel; results are still yielded in file order.
+    """
+    if workers <= 1:
+        with open(filename, 'r', encoding='utf-8') as file:
+            yield from iter_edges(file, stats)
+        return
+
+    size = os.path.getsize(filename)
+    step = max(1, -(-size // (workers * 4)))
+    ranges = [(start, min(start + step, size)) for start in range(0, size, step)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_parse_range, filename, start, end) for start, end in ranges]
+        for future in futures:
+            edges, chunk_stats = future.result()
+            if stats is not None:
+                for key, value in chunk_stats.items():
+                    stats[key] = stats.get(key, 0) + value
+            yield from edges
+
+def print_progress(stage, done, total, elapsed):
+    rate = done / elapsed if elapsed > 0 else 0
+    print(f"{stage}: {done}/{total} ({rate:,.0f} rows/s)")
+
+def insert_nodes_and_edges(conn, node_names, edge_rows, edge_count=None, batch_size=100000, progress=None):
+    """
+    Write nodes and edges with batched ``executemany`` calls. The caller owns the transaction.
+
+    :param node_names: Iterable of node names, inserted with INSERT OR IGNORE.
+    :param edge_rows: Iterable of undirected (source, target, weight) edges, inserted with
+        INSERT OR REPLACE: one row per pair from schema version 3 on, a row for each
+        direction before.
+    :param edge_count: Total number of edges, for progress reports only.
+    :param progress: Optional ``progress(stage, done, total, elapsed)`` callback.
+    """
+    c = conn.cursor()
+    start = time.perf_counter()
+    # From schema version 2 on, edges go straight into the integer-keyed links table
+    # instead of through the name-based edges view
+    version = get_schema_version(conn)
+    node_ids = {} if version >= 2 else None
+    if version >= 4:
+        # One graph version change for the whole import instead of one per row
+        suspend_graph_version(conn)
+
+    node_names = list(node_names)
+    for i in range(0, len(node_names), batch_size):
+        c.executemany("INSERT OR IGNORE INTO nodes (name) VALUES (?)",
+                      ((name,) for name in node_names[i:i + batch_size]))
+        if progress:
+            progress("nodes", min(i + batch_size, len(node_names)), len(node_names), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    done = 0
+    edge_rows = iter(edge_rows)
+    while True:
+        batch = list(islice(edge_rows, batch_size))
+        if not batch:
+            break
+        if node_ids is None:
+            c.executemany("INSERT OR REPLACE INTO edges (source, target, weight) VALUES (?, ?, ?)",
+                          (row for source, target, weight in batch
+                           for row in ((source, target, weight), (target, source, weight))))
+        else:
+            lookup_node_ids(conn, {name for row in batch for name in row[:2]}, node_ids)
+            if version >= 3:
+                # One canonical row per pair, lower node id first
+                rows = ((min(node_ids[source], node_ids[target]), max(node_ids[source], node_ids[target]), weight)
+                        for source, target, weight in batch)
+            else:
+                rows = (row for source, target, weight in batch
+                        for row in ((node_ids[source], node_ids[target], weight),
+                                    (node_ids[target], node_ids[source], weight)))
+            c.executemany("INSERT OR REPLACE INTO links (source_id, target_id, weight) VALUES (?, ?, ?)", rows)
+        done += len(batch)
+        if progress:
+            progress("edges", done, edge_count if edge_count is not None else done, time.perf_counter() - start)
+    if version >= 4:
+        resume_graph_version(conn)
+    return done
+
+def lookup_node_ids(conn, names, node_ids):
+    """
+    Add the ids of ``names`` to the ``node_ids`` dict, inserting nodes that do not exist yet.
+    """
+    missing = [name for name in names if name not in node_ids]
+    if not missing:
+        return
+    c = conn.cursor()
+    c.executemany("INSERT OR IGNORE INTO nodes (name) VALUES (?)", ((name,) for name in missing))
+    # Stay below SQLite's bound-parameter limit
+    for i in range(0, len(missing), 500):
+        chunk = missing[i:i + 500]
+        rows = c.execute(f"SELECT name, id FROM nodes WHERE name IN ({','.join('?' * len(chunk))})", chunk)
+        node_ids.update(rows)
+
+def bulk_ingest(filename, db_path, workers=1, batch_size=100000, progress=print_progress, wal=False):
+    """
+    Import a text chunk file (``NodeA: NodeB, 5, NodeC, 10`` per line) in one transaction.
+
+    Edges are undirected and deduplicated in memory: ``A: B, 5`` and ``B: A, 7`` are the
+    same pair, and the weight given last in the file wins. Pairs listed in both
+    directions with different weights are counted in ``conflicts``.
+
+    :param filename: Path of the text file.
+    :param db_path: SQLite database to create or update.
+    :param workers: Number of processes used to parse the file.
+    :param batch_size: Rows per ``executemany`` call.
+    :param progress: ``progress(stage, done, total, elapsed)`` callback, or None.
+    :param wal: Switch the database to WAL journal mode first, so other connections can
+        read while the import runs. The database stays in WAL mode afterwards.
+    :return: Dict with counts of lines, skipped lines, direction conflicts, nodes, edges
+        and recomputed node metrics, the landmark update stats, and the duration.
+    """
+    started = time.perf_counter()
+    stats = {'lines': 0, 'skipped': 0, 'conflicts': 0}
+
+    # Dedupe in memory; node names keep their order of first appearance
+    edges = {}
+    nodes = {}
+    for source, target, weight in iter_file_edges(filename, workers, stats):
+        nodes[source] = None
+        nodes[target] = None
+        if source != target and (target, source) in edges:
+            # The reverse direction of a pair already seen
+            if edges[(target, source)] != weight:
+                stats['conflicts'] += 1
+            edges[(target, source)] = weight
+        else:
+            edges[(source, target)] = weight
+    if progress:
+        progress("parsed", len(edges), len(edges), time.perf_counter() - started)
+
+    edge_rows = ((source, target, weight) for (source, target), weight in edges.items())
+
+    conn = sqlite3.connect(db_path)
+    apply_bulk_pragmas(conn, wal)
+    create_tables(conn)
+    with conn:
+        rows = insert_nodes_and_edges(conn, nodes, edge_rows, len(edges), batch_size, progress)
+    conn.close()
+
+    # Only does work once node_metrics has been built for this database
+    stats['metrics_updated'] = update_metrics(nodes, db_path)
+    # Likewise for the landmark file; repairs the stored distances around the new edges
+    stats['landmarks'] = refresh_oracle(db_path)
+    stats.update(nodes=len(nodes), edges=rows, seconds=time.perf_counter() - started)
+    return stats
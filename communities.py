@@ -0,0 +1,425 @@
+import argparse
+import sqlite3
+import sys
+import time
+import numpy as np
+import graph_cache
+import instrumentation
+from database import DB_PATH
+from tasks import checkpoint
+
+# Hierarchy of communities for a whole-vault overview. Label propagation groups the
+# notes into communities, the communities become the supernodes of a smaller graph
+# whose edges sum the links between them, and the same is repeated on that graph until
+# at most TOP_SIZE supernodes are left. Level 1 groups notes, level 2 groups level-1
+# supernodes and so on; the top level is what the overview draws first.
+#
+# Community detection reads edges as affinities, 1 / weight, since a small weight
+# means two notes are close. No community takes more than MAX_CHILDREN members, so
+# expanding a supernode never adds more than that many to the drawing. Nodes without
+# a community of their own (no links at their level, or every neighbor's community
+# is full) are grouped with similar leftovers: unlinked nodes together, the rest by
+# the community of their strongest neighbor.
+#
+# Tables:
+#   communities        (level, id) -> parent at level + 1 (NULL at the top), number of
+#                      notes, and label: name of its best connected note, NULL for the
+#                      groups of unlinked nodes
+#   community_members  note name -> level-1 community
+#   community_links    (level, source, target) with source < target -> number of note
+#                      links between the two supernodes and the sum of their affinities
+
+TOP_SIZE = 200
+MAX_CHILDREN = 200
+MAX_LEVELS = 12
+MAX_ITERATIONS = 20
+# Share of nodes that may update in one round; updating all at once makes labels oscillate
+UPDATE_FRACTION = 0.5
+# Propagation stops when fewer than this share of nodes would still change label
+TOLERANCE = 1e-3
+# Weights at or below zero count as this weight
+MIN_WEIGHT = 1e-6
+
+def create_community_tables(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS communities
+                    (level INTEGER, id INTEGER, parent INTEGER, size INTEGER, label TEXT,
+                     PRIMARY KEY(level, id)) WITHOUT ROWID''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS community_members
+                    (node TEXT PRIMARY KEY, community INTEGER)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS community_links
+                    (level INTEGER, source INTEGER, target INTEGER, links INTEGER, strength REAL,
+                     PRIMARY KEY(level, source, target)) WITHOUT ROWID''')
+    # The primary key covers source-side lookups; this covers the target side
+    conn.execute("CREATE INDEX IF NOT EXISTS community_links_target ON community_links(level, target)")
+
+def _has_community_tables(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'communities'").fetchone() is not None
+
+def _csr(n, u, v, *values):
+    """Adjacency of the undirected edges ``(u, v)`` in CSR form, with per-edge ``values``."""
+    rows = np.concatenate([u, v])
+    order = np.argsort(rows, kind='stable')
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+    return indptr, np.concatenate([v, u])[order], [np.concatenate([x, x])[order] for x in values]
+
+def _first_per_group(groups):
+    """Start of every run of equal values in the sorted array ``groups``."""
+    return np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]]) if len(groups) else np.zeros(0, dtype=np.int64)
+
+def label_propagation(indptr, indices, affinity, max_size=MAX_CHILDREN, seed=0):
+    """
+    Semi-synchronous label propagation on a CSR graph with community size limits.
+
+    Every round, a random half of the nodes adopt the label with the largest total
+    affinity among their neighbors, keeping their own label on ties. Labels whose
+    community already has ``max_size`` members are not adopted, and a round lets no
+    more nodes join a label than it has room for.
+
+    :return: Label of every node; labels are node ids.
+    """
+    n = len(indptr) - 1
+    labels = np.arange(n)
+    if not len(indices):
+        return labels
+    rng = np.random.default_rng(seed)
+    rows = np.repeat(labels, np.diff(indptr))
+    for iteration in range(MAX_ITERATIONS):
+        checkpoint(iteration, MAX_ITERATIONS, 'communities')
+        # Total affinity of every (node, neighbor label) pair
+        keys = rows * n + labels[indices]
+        order = np.argsort(keys)
+        keys = keys[order]
+        starts = _first_per_group(keys)
+        score = np.add.reduceat(affinity[order], starts)
+        row, label = np.divmod(keys[starts], n)
+
+        current = label == labels[row]
+        sizes = np.bincount(labels, minlength=n)
+        allowed = current | (sizes[label] < max_size)
+        row, label, score, current = row[allowed], label[allowed], score[allowed], current[allowed]
+        # Best score of every node, taking its own label on ties and else the smallest
+        # label; pairs are sorted by (node, label), so no further sort is needed
+        starts = _first_per_group(row)
+        group = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(row)]))
+        priority = (score >= np.maximum.reduceat(score, starts)[group]) * (2 + current)
+        chosen = np.flatnonzero(priority == np.maximum.reduceat(priority, starts)[group])
+        chosen = chosen[_first_per_group(row[chosen])]
+        row, label = row[chosen], label[chosen]
+
+        changing = label != labels[row]
+        if changing.sum() <= TOLERANCE * n:
+            break
+        move = changing & (rng.random(len(row)) < UPDATE_FRACTION)
+        row, label = row[move], label[move]
+        # Admit joiners in order of their label until the community is full
+        order = np.argsort(label, kind='stable')
+        row, label = row[order], label[order]
+        rank = np.arange(len(label)) - np.repeat(_first_per_group(label), np.diff(np.r_[_first_per_group(label), len(label)]))
+        admitted = rank < max_size - sizes[label]
+        labels[row[admitted]] = label[admitted]
+    return labels
+
+def _group_leftovers(labels, indptr, indices, affinity, max_size):
+    """
+    Group the nodes that are alone in their community.
+
+    Unlinked nodes are grouped together, linked ones with the other leftovers whose
+    strongest neighbor is in the same community, in groups of at most ``max_size``.
+    """
+    n = len(labels)
+    alone = np.bincount(labels, minlength=n)[labels] == 1
+    if alone.sum() < 2:
+        return labels
+    degree = np.diff(indptr)
+    rows = np.repeat(np.arange(n), degree)
+    # Label of the strongest neighbor, -1 for unlinked nodes
+    strongest = np.full(n, -1, dtype=np.int64)
+    order = np.lexsort((-affinity, rows))
+    first = order[_first_per_group(rows[order])]
+    strongest[rows[first]] = labels[indices[first]]
+
+    nodes = np.flatnonzero(alone)
+    nodes = nodes[np.argsort(strongest[nodes], kind='stable')]
+    groups = strongest[nodes]
+    starts = _first_per_group(groups)
+    rank = np.arange(len(nodes)) - np.repeat(starts, np.diff(np.r_[starts, len(nodes)]))
+    # Every (neighbor community, chunk) pair becomes a group with a new label
+    chunk = np.r_[True, (groups[1:] != groups[:-1]) | (rank[1:] % max_size == 0)]
+    labels = labels.copy()
+    labels[nodes] = n + np.cumsum(chunk) - 1
+    return labels
+
+def _compact(labels):
+    _, inverse = np.unique(labels, return_inverse=True)
+    return inverse.reshape(-1)
+
+@instrumentation.traced('build_hierarchy')
+def build_hierarchy(snapshot, top_size=TOP_SIZE, max_children=MAX_CHILDREN, seed=0):
+    """
+    Coarsen a graph snapshot level by level until at most ``top_size`` supernodes remain.
+
+    Stops early when a level no longer shrinks, which only happens for graphs with more
+    than ``top_size`` components that cannot be grouped any further.
+
+    :return: List of levels, each a dict with ``parent`` (supernode of every node of the
+        level below), ``size`` (notes per supernode), ``label`` (best connected note
+        per supernode, -1 for groups of unlinked nodes) and the supernode edges ``u``,
+        ``v``, ``links`` and ``strength``.
+    """
+    n = len(snapshot.names)
+    rows = np.repeat(np.arange(n), np.diff(snapshot.indptr))
+    once = snapshot.indices > rows
+    u, v = rows[once], snapshot.indices[once].astype(np.int64)
+    strength = 1.0 / np.maximum(snapshot.weights[once], MIN_WEIGHT)
+    links = np.ones(len(u), dtype=np.int64)
+    size = np.ones(n, dtype=np.int64)
+    # Unlinked notes do not name a supernode
+    label = np.where(np.diff(snapshot.indptr) > 0, np.arange(n), -1)
+
+    levels = []
+    count = n
+    while count > top_size and len(levels) < MAX_LEVELS:
+        with instrumentation.span('level', nodes=count, edges=len(u)):
+            indptr, indices, (affinity,) = _csr(count, u, v, strength)
+            labels = label_propagation(indptr, indices, affinity, max_children, seed + len(levels))
+            labels = _group_leftovers(labels, indptr, indices, affinity, max_children)
+            parent = _compact(labels)
+            supernodes = int(parent.max()) + 1 if count else 0
+            if supernodes >= count:
+                break
+
+            # Label: the best connected note among the named children with the most notes
+            node_strength = np.bincount(u, weights=strength, minlength=count) + np.bincount(v, weights=strength, minlength=count)
+            order = np.lexsort((-node_strength, -size, label < 0, parent))
+            label = label[order[_first_per_group(parent[order])]]
+            size = np.bincount(parent, weights=size, minlength=supernodes).astype(np.int64)
+
+            # Sum the edges between different supernodes
+            pu, pv = parent[u], parent[v]
+            between = pu != pv
+            a = np.minimum(pu, pv)[between]
+            b = np.maximum(pu, pv)[between]
+            keys = a * supernodes + b
+            order = np.argsort(keys, kind='stable')
+            keys = keys[order]
+            starts = _first_per_group(keys)
+            links = np.add.reduceat(links[between][order], starts) if len(starts) else links[:0]
+            strength = np.add.reduceat(strength[between][order], starts) if len(starts) else strength[:0]
+            u, v = np.divmod(keys[starts], supernodes)
+
+        levels.append(dict(parent=parent, size=size, label=label, u=u, v=v, links=links, strength=strength))
+        count = supernodes
+    return levels
+
+def _write_hierarchy(levels, names, db_path):
+    def write(conn):
+        create_community_tables(conn)
+        conn.execute("DELETE FROM communities")
+        conn.execute("DELETE FROM community_members")
+        conn.execute("DELETE FROM community_links")
+        conn.executemany("INSERT INTO community_members VALUES (?, ?)", zip(names, levels[0]['parent'].tolist()))
+        for i, level in enumerate(levels):
+            number = i + 1
+            parents = levels[i + 1]['parent'].tolist() if i + 1 < len(levels) else [None] * len(level['size'])
+            labels = [names[note] if note >= 0 else None for note in level['label'].tolist()]
+            conn.executemany("INSERT INTO communities VALUES (?, ?, ?, ?, ?)",
+                             zip([number] * len(parents), range(len(parents)), parents, level['size'].tolist(), labels))
+            conn.executemany("INSERT INTO community_links VALUES (?, ?, ?, ?, ?)",
+                             zip([number] * len(level['u']), level['u'].tolist(), level['v'].tolist(),
+                                 level['links'].tolist(), level['strength'].tolist()))
+
+    # Derived data: written through the graph cache's connection so the graph stays loaded
+    graph_cache.side_write(write, db_path)
+
+def build_communities(db_path=DB_PATH, top_size=TOP_SIZE, max_children=MAX_CHILDREN):
+    """
+    Build the community hierarchy of the graph in ``db_path`` and store it in its tables.
+
+    Replaces a previous hierarchy; notes added later belong to no supernode until the
+    next build.
+
+    :return: Number of supernodes per level, from level 1 up.
+    """
+    snapshot = graph_cache.get_snapshot(db_path)
+    levels = build_hierarchy(snapshot, top_size, max_children)
+    if not levels:
+        # A graph small enough to show whole is its own top level: one group of everything
+        levels = [dict(parent=np.zeros(len(snapshot.names), dtype=np.int64), size=np.array([len(snapshot.names)]),
+                       label=np.array([int(np.argmax(np.diff(snapshot.indptr)))] if snapshot.names else [-1]),
+                       u=np.zeros(0, dtype=np.int64), v=np.zeros(0, dtype=np.int64),
+                       links=np.zeros(0, dtype=np.int64), strength=np.zeros(0))]
+    with instrumentation.span('write_communities'):
+        _write_hierarchy(levels, snapshot.names, db_path)
+    return [len(level['size']) for level in levels]
+
+class Hierarchy:
+    """
+    Community hierarchy of a database, loaded by :func:`load_hierarchy`.
+
+    Items are ``(level, id)`` pairs: ``(0, i)`` is note ``i`` of the graph snapshot,
+    higher levels are supernodes. Parents are kept in memory; supernode edges are read
+    from the database when asked for.
+    """
+
+    def __init__(self, db_path, snapshot, parents, sizes, labels):
+        self.db_path = db_path
+        self.snapshot = snapshot
+        # parents[l][i]: id at level l + 1 of item (l, i), -1 at the top and for notes
+        # added after the build; parents[0] is indexed by snapshot node id
+        self.parents = parents
+        self.sizes = sizes
+        self.labels = labels
+        self.levels = len(parents) - 1
+        self.notes = int(sizes[self.levels].sum())
+        self._children = {}
+        self._adjacency_cache = {}
+
+    def top(self):
+        return [(self.levels, i) for i in range(len(self.sizes[self.levels]))]
+
+    def parent(self, item):
+        level, i = item
+        if level >= self.levels:
+            return None
+        p = int(self.parents[level][i])
+        return (level + 1, p) if p >= 0 else None
+
+    def children(self, item):
+        """Items one level below ``item``; empty for notes."""
+        level, i = item
+        if level == 0:
+            return []
+        if level not in self._children:
+            # Children of every supernode of the level, grouped by parent
+            order = np.argsort(self.parents[level - 1], kind='stable')
+            bounds = np.searchsorted(self.parents[level - 1][order], np.arange(len(self.sizes[level]) + 1))
+            self._children[level] = (order, bounds)
+        order, bounds = self._children[level]
+        return [(level - 1, int(c)) for c in order[bounds[i]:bounds[i + 1]].tolist()]
+
+    def size(self, item):
+        level, i = item
+        return 1 if level == 0 else int(self.sizes[level][i])
+
+    def label(self, item):
+        level, i = item
+        if level == 0:
+            return self.snapshot.names[i]
+        label = self.labels[level][i]
+        return f"{label} ({self.sizes[level][i]})" if label is not None else f"unlinked ({self.sizes[level][i]})"
+
+    def _adjacency(self, level):
+        """``(indptr, indices, links, strength)`` of the graph at ``level``, read once."""
+        if level not in self._adjacency_cache:
+            if level == 0:
+                snapshot = self.snapshot
+                self._adjacency_cache[0] = (snapshot.indptr, snapshot.indices, np.ones(len(snapshot.indices), dtype=np.int64),
+                                            1.0 / np.maximum(snapshot.weights, MIN_WEIGHT))
+            else:
+                conn = sqlite3.connect(self.db_path)
+                try:
+                    rows = conn.execute("SELECT source, target, links, strength FROM community_links WHERE level = ?",
+                                        (level,)).fetchall()
+                finally:
+                    conn.close()
+                u, v, links, strength = (np.array(column) for column in zip(*rows)) if rows else [np.zeros(0, dtype=np.int64)] * 4
+                indptr, indices, (links, strength) = _csr(len(self.sizes[level]), u.astype(np.int64), v.astype(np.int64),
+                                                          links.astype(np.int64), strength.astype(np.float64))
+                self._adjacency_cache[level] = (indptr, indices, links, strength)
+        return self._adjacency_cache[level]
+
+    def _owners(self, items):
+        """For every level, the position in ``items`` of the item containing each id, or -1."""
+        owners = [None] * (self.levels + 1)
+        own = [[] for _ in range(self.levels + 1)]
+        for k, (level, i) in enumerate(items):
+            own[level].append((i, k))
+        for level in range(self.levels, -1, -1):
+            # Inherit the owner of the parent, then mark the items of this level
+            owner = np.full(len(self.parents[level]), -1, dtype=np.int64)
+            if level < self.levels:
+                parents = self.parents[level]
+                linked = parents >= 0
+                owner[linked] = owners[level + 1][parents[linked]]
+            if own[level]:
+                ids, positions = zip(*own[level])
+                owner[list(ids)] = positions
+            owners[level] = owner
+        return owners
+
+    def edges(self, items):
+        """
+        Aggregated edges between a set of items that do not contain each other.
+
+        An edge at the lower level of its two ends is attributed to the item that
+        contains its other end, so every note link is counted once.
+
+        :return: Dict ``(a, b) -> (links, strength)`` with ``a`` at a lower or the same
+            level as ``b``.
+        """
+        items = list(items)
+        owners = self._owners(items)
+        item_level = np.array([level for level, _ in items], dtype=np.int64)
+        ends, links, strength = [], [], []
+        for level in sorted(set(item_level.tolist())):
+            indptr, indices, level_links, level_strength = self._adjacency(level)
+            ids = np.array([i for l, i in items if l == level], dtype=np.int64)
+            starts, counts = indptr[ids], indptr[ids + 1] - indptr[ids]
+            positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            a = np.repeat(owners[level][ids], counts)
+            b = owners[level][indices[positions]]
+            # Same-level pairs are seen from both ends; keep one
+            keep = (b >= 0) & (b != a) & ((item_level[b] != level) | (a < b))
+            ends.append(a[keep] * len(items) + b[keep])
+            links.append(level_links[positions][keep])
+            strength.append(level_strength[positions][keep])
+        if not ends:
+            return {}
+        keys, inverse = np.unique(np.concatenate(ends), return_inverse=True)
+        links = np.bincount(inverse, weights=np.concatenate(links), minlength=len(keys))
+        strength = np.bincount(inverse, weights=np.concatenate(strength), minlength=len(keys))
+        return {(items[a], items[b]): (int(l), s) for a, b, l, s in
+                zip((keys // len(items)).tolist(), (keys % len(items)).tolist(), links.tolist(), strength.tolist())}
+
+@instrumentation.traced('load_hierarchy')
+def load_hierarchy(db_path=DB_PATH):
+    """Load the stored hierarchy of ``db_path``, or return None if it was never built."""
+    snapshot = graph_cache.get_snapshot(db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        if not _has_community_tables(conn):
+            return None
+        rows = conn.execute("SELECT level, id, parent, size, label FROM communities ORDER BY level, id").fetchall()
+        if not rows:
+            return None
+        levels = rows[-1][0]
+        parents = [np.full(len(snapshot.names), -1, dtype=np.int64)]
+        sizes, labels = [None], [None]
+        for level in range(1, levels + 1):
+            level_rows = [row for row in rows if row[0] == level]
+            parents.append(np.array([-1 if p is None else p for _, _, p, _, _ in level_rows], dtype=np.int64))
+            sizes.append(np.array([size for _, _, _, size, _ in level_rows], dtype=np.int64))
+            labels.append([label for _, _, _, _, label in level_rows])
+        for node, community in conn.execute("SELECT node, community FROM community_members"):
+            i = snapshot.index.get(node)
+            if i is not None:
+                parents[0][i] = community
+    finally:
+        conn.close()
+    return Hierarchy(db_path, snapshot, parents, sizes, labels)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the community hierarchy of a database for the vault overview.")
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--top-size', type=int, default=TOP_SIZE, help="stop coarsening at this many supernodes")
+    parser.add_argument('--max-children', type=int, default=MAX_CHILDREN, help="largest number of members of a community")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    counts = build_communities(args.db, args.top_size, args.max_children)
+    print(f"{len(counts)} levels ({' > '.join(map(str, counts))} supernodes) written to {args.db} "
+          f"in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    sys.exit(main())
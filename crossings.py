@@ -0,0 +1,251 @@
+from collections import defaultdict
+from itertools import chain
+import numpy as np
+import instrumentation
+
+def segments_intersect(p1, p2, p3, p4):
+    """
+    Vectorized version of ``visualization.line_intersection``.
+
+    Each argument is an (n, 2) array of endpoints; row ``i`` tests segment
+    ``p1[i]-p2[i]`` against ``p3[i]-p4[i]``. Parallel segments never intersect.
+    """
+    x1, y1 = p1[:, 0], p1[:, 1]
+    x2, y2 = p2[:, 0], p2[:, 1]
+    x3, y3 = p3[:, 0], p3[:, 1]
+    x4, y4 = p4[:, 0], p4[:, 1]
+
+    denom = (y4 - y3) * (x2 - x1) - (x4 - x3) * (y2 - y1)
+    parallel = denom == 0
+    safe = np.where(parallel, 1.0, denom)
+    ua = ((x4 - x3) * (y1 - y3) - (y4 - y3) * (x1 - x3)) / safe
+    ub = ((x2 - x1) * (y1 - y3) - (y2 - y1) * (x1 - x3)) / safe
+
+    return ~parallel & (ua >= 0) & (ua <= 1) & (ub >= 0) & (ub <= 1)
+
+def _expand(starts, counts):
+    """Concatenated ranges ``starts[i]:starts[i] + counts[i]``."""
+    total = int(counts.sum())
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + np.arange(total) - offsets
+
+class CrossingIndex:
+    """
+    Uniform-grid index of the edges of a 2D layout, keeping the set of crossing edges.
+
+    Every edge is registered in the grid cells its bounding box covers, so only edges
+    that share a cell and whose bounding boxes overlap are ever tested, and the tests
+    run as one batched NumPy call. The crossings are found once when the index is
+    built. After nodes move (:meth:`move_node`), the next read re-files just their
+    incident edges and retests them against the edges in their cells, so the set stays
+    current without rescanning the layout.
+
+    Edges that share an endpoint are not reported: they always meet at that endpoint,
+    and moving one of the four nodes can never separate them.
+    """
+
+    # Cell keys pack (x, y) cell coordinates into one integer
+    KEY_SHIFT = 32
+
+    def __init__(self, edges, pos, cell_size=None):
+        self.edges = list(edges)
+        node_list = list(dict.fromkeys(n for edge in self.edges for n in edge))
+        self.node_index = {node: i for i, node in enumerate(node_list)}
+        self.ends = np.array([(self.node_index[u], self.node_index[v]) for u, v in self.edges],
+                             dtype=np.int64).reshape(-1, 2)
+        self.xy = np.array([pos[node] for node in node_list], dtype=np.float64).reshape(-1, 2)
+
+        self.incident = defaultdict(list)
+        for e, (u, v) in enumerate(self.ends.tolist()):
+            self.incident[u].append(e)
+            if v != u:
+                self.incident[v].append(e)
+
+        if cell_size is None:
+            # About one edge per cell over the drawing's bounding box, but never much
+            # smaller than a typical edge, which would file it in too many cells
+            if len(self.ends):
+                extent = np.abs(self.xy[self.ends[:, 0]] - self.xy[self.ends[:, 1]]).max(axis=1)
+                width, height = self.xy.max(axis=0) - self.xy.min(axis=0)
+                cell_size = max(float(np.sqrt(width * height / len(self.ends))), float(np.median(extent)) / 2)
+            if not cell_size or cell_size <= 0:
+                cell_size = 1.0
+        self.cell_size = cell_size
+
+        edge_ids = np.arange(len(self.edges))
+        keys, owners = self._cell_entries(edge_ids)
+        self.cells = defaultdict(set)
+        self.edge_cells = [[] for _ in range(len(self.edges))]
+        for key, e in zip(keys.tolist(), owners.tolist()):
+            self.cells[key].add(e)
+            self.edge_cells[e].append(key)
+
+        # Crossing partners of every edge, and edges moved since they were last tested
+        self.partners = defaultdict(set)
+        self.dirty = set()
+        self._add_crossings(self._test(self._pairs_in_cells(keys, owners)))
+
+    def _cell_entries(self, edge_ids):
+        """``(cell keys, edge ids)`` of the cells covered by each edge's bounding box."""
+        a = self.xy[self.ends[edge_ids, 0]]
+        b = self.xy[self.ends[edge_ids, 1]]
+        lo = np.floor(np.minimum(a, b) / self.cell_size).astype(np.int64)
+        hi = np.floor(np.maximum(a, b) / self.cell_size).astype(np.int64)
+        spans = hi - lo + 1
+        counts = spans[:, 0] * spans[:, 1]
+        owners = np.repeat(edge_ids, counts)
+        r = _expand(np.zeros(len(edge_ids), dtype=np.int64), counts)
+        ny = np.repeat(spans[:, 1], counts)
+        cx = np.repeat(lo[:, 0], counts) + r // ny
+        cy = np.repeat(lo[:, 1], counts) + r % ny
+        return (cx << self.KEY_SHIFT) + cy, owners
+
+    def _cell_key(self, xy):
+        cell = np.floor(xy / self.cell_size).astype(np.int64)
+        return (cell[:, 0] << self.KEY_SHIFT) + cell[:, 1]
+
+    def _reference_cell(self, i, j):
+        """
+        Cell holding the lower corner of the overlap of the bounding boxes of edges ``i``
+        and ``j``; a pair found in several cells is only kept in this one.
+        """
+        lo_i = np.minimum(self.xy[self.ends[i, 0]], self.xy[self.ends[i, 1]])
+        lo_j = np.minimum(self.xy[self.ends[j, 0]], self.xy[self.ends[j, 1]])
+        return self._cell_key(np.maximum(lo_i, lo_j))
+
+    def _pairs_in_cells(self, keys, owners):
+        """Distinct edge pairs ``(i < j)`` that share at least one cell."""
+        order = np.argsort(keys, kind='stable')
+        keys, owners = keys[order], owners[order]
+        if not len(keys):
+            return np.zeros((0, 2), dtype=np.int64)
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        ends = np.repeat(np.r_[starts[1:], len(keys)], np.diff(np.r_[starts, len(keys)]))
+        # Every entry is paired with the entries after it in the same cell
+        position = np.arange(len(keys))
+        counts = ends - position - 1
+        m = len(self.edges)
+        if counts.sum() >= m * (m - 1) // 2:
+            # Dense drawing: the cells would list more pairs than there are
+            return np.stack(np.triu_indices(m, 1), axis=1)
+        first = np.repeat(position, counts)
+        i, j = owners[first], owners[_expand(position + 1, counts)]
+        keep = self._reference_cell(i, j) == keys[first]
+        i, j = i[keep], j[keep]
+        return np.stack([np.minimum(i, j), np.maximum(i, j)], axis=1)
+
+    def _test(self, pairs):
+        """The pairs among ``pairs`` whose edges cross."""
+        pairs = pairs.reshape(-1, 2)
+        a = self.ends[pairs[:, 0]]
+        b = self.ends[pairs[:, 1]]
+        disjoint = ((a[:, 0] != b[:, 0]) & (a[:, 0] != b[:, 1]) &
+                    (a[:, 1] != b[:, 0]) & (a[:, 1] != b[:, 1]))
+        pairs, a, b = pairs[disjoint], a[disjoint], b[disjoint]
+
+        a_lo = np.minimum(self.xy[a[:, 0]], self.xy[a[:, 1]])
+        a_hi = np.maximum(self.xy[a[:, 0]], self.xy[a[:, 1]])
+        b_lo = np.minimum(self.xy[b[:, 0]], self.xy[b[:, 1]])
+        b_hi = np.maximum(self.xy[b[:, 0]], self.xy[b[:, 1]])
+        overlap = np.all((a_lo <= b_hi) & (b_lo <= a_hi), axis=1)
+        pairs, a, b = pairs[overlap], a[overlap], b[overlap]
+        instrumentation.count('pairs_tested', len(pairs))
+
+        hit = segments_intersect(self.xy[a[:, 0]], self.xy[a[:, 1]], self.xy[b[:, 0]], self.xy[b[:, 1]])
+        return pairs[hit]
+
+    def _add_crossings(self, pairs):
+        if len(pairs) < 256:
+            for i, j in pairs.tolist():
+                self.partners[i].add(j)
+                self.partners[j].add(i)
+            return
+        # Group both directions by edge and extend each edge's set once
+        a = np.concatenate([pairs[:, 0], pairs[:, 1]])
+        b = np.concatenate([pairs[:, 1], pairs[:, 0]])
+        order = np.argsort(a, kind='stable')
+        a, b = a[order], b[order]
+        starts = np.flatnonzero(np.r_[True, a[1:] != a[:-1]])
+        for e, group in zip(a[starts].tolist(), np.split(b, starts[1:])):
+            self.partners[e].update(group.tolist())
+
+    def move_node(self, node, xy):
+        """
+        Update the position of ``node``.
+
+        Its incident edges are retested, in one batch with the edges of every other
+        node moved since, the next time the crossings are read.
+        """
+        i = self.node_index.get(node)
+        if i is None:
+            return
+        self.xy[i] = xy
+        self.dirty.update(self.incident[i])
+
+    def _refresh(self):
+        """Re-file the edges moved since the last call and retest them."""
+        if not self.dirty:
+            return
+        moved = sorted(self.dirty)
+        self.dirty.clear()
+        for e in moved:
+            for other in self.partners.pop(e, ()):
+                self.partners[other].discard(e)
+            for key in self.edge_cells[e]:
+                bucket = self.cells[key]
+                bucket.discard(e)
+                if not bucket:
+                    del self.cells[key]
+
+        keys, owners = self._cell_entries(np.array(moved, dtype=np.int64))
+        for e in moved:
+            self.edge_cells[e] = []
+        for key, e in zip(keys.tolist(), owners.tolist()):
+            self.cells[key].add(e)
+            self.edge_cells[e].append(key)
+
+        # Retest the moved edges against everything now sharing a cell with them
+        buckets = [self.cells[key] for key in keys.tolist()]
+        counts = np.fromiter(map(len, buckets), dtype=np.int64, count=len(buckets))
+        others = np.fromiter(chain.from_iterable(buckets), dtype=np.int64, count=int(counts.sum()))
+        i = np.repeat(owners, counts)
+        keep = (others != i) & (self._reference_cell(i, others) == np.repeat(keys, counts))
+        # A pair of two moved edges is seen from both of them
+        is_moved = np.zeros(len(self.edges), dtype=bool)
+        is_moved[moved] = True
+        keep &= ~is_moved[others] | (i < others)
+        i, others = i[keep], others[keep]
+        self._add_crossings(self._test(np.stack([np.minimum(i, others), np.maximum(i, others)], axis=1)))
+
+    def sync(self, pos, nodes):
+        """Pick up new positions for ``nodes`` from ``pos`` if they changed; return the nodes that moved."""
+        moved = []
+        for node in nodes:
+            i = self.node_index.get(node)
+            if i is not None and (self.xy[i] != np.asarray(pos[node], dtype=np.float64)).any():
+                self.move_node(node, pos[node])
+                moved.append(node)
+        return moved
+
+    def crossing_pairs(self):
+        """Return an (m, 2) array of crossing edge-id pairs, in edge order."""
+        self._refresh()
+        pairs = sorted((i, j) for i, partners in self.partners.items() for j in partners if i < j)
+        return np.array(pairs, dtype=np.int64).reshape(-1, 2)
+
+    def crossing_edges(self):
+        """Return the crossings as ``(u1, v1, u2, v2)`` node tuples."""
+        return [(*self.edges[i], *self.edges[j]) for i, j in self.crossing_pairs().tolist()]
+
+    def crossings_at(self, node):
+        """Return the crossings of the edges incident to ``node``, as in :meth:`crossing_edges`."""
+        i = self.node_index.get(node)
+        if i is None:
+            return []
+        self._refresh()
+        pairs = sorted({(min(e, f), max(e, f)) for e in self.incident.get(i, ()) for f in self.partners.get(e, ())})
+        return [(*self.edges[e], *self.edges[f]) for e, f in pairs]
+
+    def count_crossings(self):
+        self._refresh()
+        return sum(len(partners) for partners in self.partners.values()) // 2
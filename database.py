@@ -1,3 +1,4 @@
+import csv
 import os
 import shutil
 import sqlite3
@@ -6,7 +7,26 @@ import sqlite3
 EXISTING_DB_PATH = os.path.join(os.path.dirname(__file__), 'existing_graph_data.db')
 DB_PATH = os.path.join(os.path.dirname(__file__), 'graph_data.db')
 
+# Schema versions, stored in PRAGMA user_version:
+#   1 - edges(source TEXT, target TEXT, weight) with the node names repeated in every row
+#   2 - links(source_id, target_id, weight) referencing nodes.id, with an `edges` view
+#       (source, target, weight) on top so name-based readers and writers keep working
+#   3 - links stores every undirected edge once, as source_id <= target_id; the edges
+#       view lists both directions
+#   4 - graph_version holds a value that triggers replace on every change to nodes or
+#       links, so files derived from the graph can tell whether it changed; writes to
+#       other tables (positions, metrics, the search index) leave it alone
+SCHEMA_VERSION = 4
+
+# How migrate_to_v3 combines the two directions of a pair stored with different weights
+DIRECTION_RULES = {'min': 'MIN', 'max': 'MAX', 'avg': 'AVG'}
+
 def initialize_database():
+    # Bring both databases up to the current schema before using them
+    for path in (EXISTING_DB_PATH, DB_PATH):
+        if os.path.exists(path):
+            upgrade_database(path)
+
     if os.path.exists(EXISTING_DB_PATH) and not os.path.exists(DB_PATH):
         shutil.copy2(EXISTING_DB_PATH, DB_PATH)
         print(f"Existing database copied from {EXISTING_DB_PATH} to {DB_PATH}")
@@ -18,13 +38,280 @@ def initialize_database():
 
 def create_database():
     conn = sqlite3.connect(DB_PATH)
+    create_tables(conn)
+    conn.commit()
+    conn.close()
+
+def get_schema_version(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version:
+        return version
+    # Databases created before versioning have an edges table and user_version 0
+    row = conn.execute("SELECT type FROM sqlite_master WHERE name = 'edges'").fetchone()
+    return 1 if row else 0
+
+def create_tables(conn, weight_rule='min'):
+    """
+    Make sure the current schema exists, creating it or migrating an old one in place.
+
+    :param weight_rule: Passed to :func:`migrate_to_v3` when an older database is upgraded.
+    :return: The report of :func:`migrate_to_v3` if it ran, else None.
+    """
+    version = get_schema_version(conn)
+    report = None
+    if version == 1:
+        migrate_to_v2(conn)
+        version = 2
+    if version == 2:
+        report = migrate_to_v3(conn, weight_rule)
+        version = 3
+    if version == 3:
+        migrate_to_v4(conn)
+        return report
+
     c = conn.cursor()
     c.execute('''CREATE TABLE IF NOT EXISTS nodes
                  (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS edges
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  source TEXT, target TEXT, weight REAL,
-                  UNIQUE(source, target))''')
+    create_links_table(conn)
+    create_edges_view(conn)
+    create_graph_version(conn)
+    c.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+def create_links_table(conn, table='links', undirected=True):
+    c = conn.cursor()
+    # Undirected links keep one row per pair, with the lower node id as source
+    check = ", CHECK(source_id <= target_id)" if undirected else ""
+    c.execute(f'''CREATE TABLE IF NOT EXISTS {table}
+                  (source_id INTEGER NOT NULL REFERENCES nodes(id),
+                   target_id INTEGER NOT NULL REFERENCES nodes(id),
+                   weight REAL,
+                   PRIMARY KEY(source_id, target_id){check}) WITHOUT ROWID''')
+    # The primary key covers source-side lookups; this covers the target side
+    c.execute(f'''CREATE INDEX IF NOT EXISTS {table}_target
+                  ON {table}(target_id, source_id, weight)''')
+
+def create_edges_view(conn):
+    c = conn.cursor()
+    # Both directions of every pair; a self-loop is listed once
+    c.execute('''CREATE VIEW IF NOT EXISTS edges AS
+                 SELECT s.name AS source, t.name AS target, l.weight AS weight
+                 FROM links l
+                 JOIN nodes s ON s.id = l.source_id
+                 JOIN nodes t ON t.id = l.target_id
+                 UNION ALL
+                 SELECT t.name AS source, s.name AS target, l.weight AS weight
+                 FROM links l
+                 JOIN nodes s ON s.id = l.source_id
+                 JOIN nodes t ON t.id = l.target_id
+                 WHERE l.source_id != l.target_id''')
+
+    # Writes through the view behave like the old table with INSERT OR REPLACE, except
+    # that (A, B) and (B, A) address the same row. The trigger bodies never raise a
+    # conflict on purpose: the conflict policy of the outer statement (e.g. OR REPLACE)
+    # would override theirs and could replace nodes. Since every pair shows up twice in
+    # the view, an UPDATE or DELETE matching both directions fires twice for the pair.
+    c.execute('''CREATE TRIGGER IF NOT EXISTS edges_insert INSTEAD OF INSERT ON edges
+                 BEGIN
+                     INSERT INTO nodes (name) SELECT NEW.source
+                         WHERE NOT EXISTS (SELECT 1 FROM nodes WHERE name = NEW.source);
+                     INSERT INTO nodes (name) SELECT NEW.target
+                         WHERE NOT EXISTS (SELECT 1 FROM nodes WHERE name = NEW.target);
+                     UPDATE links SET weight = NEW.weight
+                         WHERE (source_id, target_id) =
+                               (SELECT min(s.id, t.id), max(s.id, t.id) FROM nodes s, nodes t
+                                WHERE s.name = NEW.source AND t.name = NEW.target);
+                     INSERT INTO links (source_id, target_id, weight)
+                         SELECT min(s.id, t.id), max(s.id, t.id), NEW.weight FROM nodes s, nodes t
+                         WHERE s.name = NEW.source AND t.name = NEW.target
+                           AND NOT EXISTS (SELECT 1 FROM links
+                                           WHERE source_id = min(s.id, t.id) AND target_id = max(s.id, t.id));
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS edges_delete INSTEAD OF DELETE ON edges
+                 BEGIN
+                     DELETE FROM links
+                         WHERE (source_id, target_id) =
+                               (SELECT min(s.id, t.id), max(s.id, t.id) FROM nodes s, nodes t
+                                WHERE s.name = OLD.source AND t.name = OLD.target);
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS edges_update INSTEAD OF UPDATE ON edges
+                 BEGIN
+                     INSERT INTO nodes (name) SELECT NEW.source
+                         WHERE NOT EXISTS (SELECT 1 FROM nodes WHERE name = NEW.source);
+                     INSERT INTO nodes (name) SELECT NEW.target
+                         WHERE NOT EXISTS (SELECT 1 FROM nodes WHERE name = NEW.target);
+                     UPDATE links
+                         SET (source_id, target_id, weight) =
+                             (SELECT min(s.id, t.id), max(s.id, t.id), NEW.weight FROM nodes s, nodes t
+                              WHERE s.name = NEW.source AND t.name = NEW.target)
+                         WHERE (source_id, target_id) =
+                               (SELECT min(s.id, t.id), max(s.id, t.id) FROM nodes s, nodes t
+                                WHERE s.name = OLD.source AND t.name = OLD.target);
+                 END''')
+
+def create_graph_version(conn):
+    c = conn.cursor()
+    # A random value rather than a counter: two copies of a database edited separately
+    # would soon reach the same count
+    c.execute("CREATE TABLE IF NOT EXISTS graph_version (version INTEGER NOT NULL)")
+    if c.execute("SELECT 1 FROM graph_version").fetchone() is None:
+        c.execute("INSERT INTO graph_version VALUES (random())")
+    for table in ('nodes', 'links'):
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            c.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()} AFTER {event} ON {table}
+                          BEGIN
+                              UPDATE graph_version SET version = random();
+                          END''')
+
+def suspend_graph_version(conn):
+    """
+    Drop the ``graph_version`` triggers for a bulk write; :func:`resume_graph_version` restores them.
+
+    The triggers fire once per row. A bulk write instead changes the version once, in
+    :func:`resume_graph_version`. A transaction is opened first, so other connections
+    never see the database without its triggers.
+    """
+    if not conn.in_transaction:
+        conn.execute("BEGIN")
+    for table in ('nodes', 'links'):
+        for event in ('insert', 'update', 'delete'):
+            conn.execute(f"DROP TRIGGER IF EXISTS {table}_version_{event}")
+
+def resume_graph_version(conn):
+    """Recreate the triggers dropped by :func:`suspend_graph_version` and give the graph a new version."""
+    create_graph_version(conn)
+    conn.execute("UPDATE graph_version SET version = random()")
+
+def get_graph_version(conn):
+    """
+    The graph content version of a database, or None before schema version 4.
+
+    Equal values mean the nodes and links have not changed in between.
+    """
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'graph_version'").fetchone() is None:
+        return None
+    return conn.execute("SELECT version FROM graph_version").fetchone()[0]
+
+def migrate_to_v2(conn):
+    """
+    Move a version 1 database (text edges table) to integer-keyed links, in one transaction.
+
+    Leaves directed links without the edges view; :func:`create_tables` follows up with
+    :func:`migrate_to_v3`.
+    """
+    c = conn.cursor()
     conn.commit()
-    conn.close()
+    c.execute("BEGIN")
+    try:
+        # Edge endpoints were never required to exist in nodes; add the missing ones in
+        # order of first appearance
+        c.execute('''INSERT OR IGNORE INTO nodes (name)
+                     SELECT name FROM (SELECT id, 0 AS side, source AS name FROM edges
+                                       UNION ALL
+                                       SELECT id, 1 AS side, target AS name FROM edges)
+                     WHERE name IS NOT NULL
+                     ORDER BY id, side''')
+        c.execute("ALTER TABLE edges RENAME TO edges_v1")
+        create_links_table(conn, undirected=False)
+        c.execute('''INSERT OR REPLACE INTO links (source_id, target_id, weight)
+                     SELECT s.id, t.id, e.weight
+                     FROM edges_v1 e
+                     JOIN nodes s ON s.name = e.source
+                     JOIN nodes t ON t.name = e.target
+                     ORDER BY e.id''')
+        c.execute("DROP TABLE edges_v1")
+        c.execute("PRAGMA user_version = 2")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def migrate_to_v3(conn, weight_rule='min'):
+    """
+    Collapse the two directed rows of every pair into one undirected row, in one transaction.
+
+    :param weight_rule: 'min', 'max' or 'avg', applied when the two directions of a
+        pair carry different weights.
+    :return: Dict with the number of rows before and after and ``conflicts``, a list of
+        ``(name_a, name_b, weight_ab, weight_ba)`` for the pairs whose weights differed.
+    """
+    if weight_rule not in DIRECTION_RULES:
+        raise ValueError(f"weight_rule must be one of {sorted(DIRECTION_RULES)}, not {weight_rule!r}")
+    c = conn.cursor()
+    conn.commit()
+    c.execute("BEGIN")
+    try:
+        report = {'rows_before': c.execute("SELECT COUNT(*) FROM links").fetchone()[0]}
+        report['conflicts'] = c.execute('''SELECT s.name, t.name, a.weight, b.weight
+                                          FROM links a
+                                          JOIN links b ON b.source_id = a.target_id AND b.target_id = a.source_id
+                                          JOIN nodes s ON s.id = a.source_id
+                                          JOIN nodes t ON t.id = a.target_id
+                                          WHERE a.source_id < a.target_id AND a.weight IS NOT b.weight
+                                          ORDER BY a.source_id, a.target_id''').fetchall()
+
+        c.execute("DROP VIEW IF EXISTS edges")
+        create_links_table(conn, 'links_v3')
+        c.execute(f'''INSERT INTO links_v3 (source_id, target_id, weight)
+                      SELECT min(source_id, target_id), max(source_id, target_id),
+                             {DIRECTION_RULES[weight_rule]}(weight)
+                      FROM links
+                      GROUP BY 1, 2''')
+        c.execute("DROP TABLE links")
+        c.execute("ALTER TABLE links_v3 RENAME TO links")
+        # SQLite cannot rename an index; build links_target afresh
+        c.execute("DROP INDEX links_v3_target")
+        create_links_table(conn)
+        create_edges_view(conn)
+        report['rows_after'] = c.execute("SELECT COUNT(*) FROM links").fetchone()[0]
+        c.execute("PRAGMA user_version = 3")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return report
+
+def migrate_to_v4(conn):
+    """Add the ``graph_version`` table and the triggers that keep it current, in one transaction."""
+    conn.commit()
+    conn.execute("BEGIN")
+    try:
+        create_graph_version(conn)
+        conn.execute("PRAGMA user_version = 4")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def upgrade_database(db_path, weight_rule='min'):
+    """
+    Upgrade the database at ``db_path`` to the current schema in place.
 
+    Pairs whose two directions had different weights are listed in
+    ``<db_path>.v3-conflicts.csv``.
+
+    :param weight_rule: See :func:`migrate_to_v3`.
+    :return: True if a migration ran.
+    """
+    conn = sqlite3.connect(db_path)
+    version = get_schema_version(conn)
+    if version == SCHEMA_VERSION or version == 0:
+        conn.close()
+        return False
+
+    print(f"Upgrading {db_path} from schema version {version} to {SCHEMA_VERSION}...")
+    report = create_tables(conn, weight_rule)
+    conn.commit()
+    if report:
+        print(f"Edge rows: {report['rows_before']} -> {report['rows_after']}")
+        if report['conflicts']:
+            conflicts_path = db_path + '.v3-conflicts.csv'
+            with open(conflicts_path, 'w', newline='', encoding='utf-8') as file:
+                writer = csv.writer(file)
+                writer.writerow(['source', 'target', 'weight', 'reverse_weight'])
+                writer.writerows(report['conflicts'])
+            print(f"{len(report['conflicts'])} pair(s) had different weights per direction; "
+                  f"kept the {weight_rule}, listed in {conflicts_path}")
+        # Reclaim the space of the old edge tables
+        conn.execute("VACUUM")
+    conn.close()
+    return True
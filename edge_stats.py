@@ -0,0 +1,468 @@
+import math
+import os
+import sqlite3
+import threading
+from database import DB_PATH, get_graph_version, get_schema_version
+
+class TDigest:
+    """
+    Mergeable quantile sketch (merging t-digest with the k1 scale function).
+
+    Values are buffered and periodically folded into at most about ``compression``
+    centroids, which are small near the tails, so extreme percentiles stay accurate.
+    Two digests merge by folding one's centroids into the other, which makes the
+    sketch suitable for chunked or parallel streams. Memory does not grow with the
+    number of values.
+    """
+
+    def __init__(self, compression=100):
+        self.compression = compression
+        self.means = []
+        self.weights = []
+        self.count = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._buffer = []
+
+    def add(self, x, w=1.0):
+        self._buffer.append((x, w))
+        self.count += w
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+        if len(self._buffer) >= 10 * self.compression:
+            self._compress()
+
+    def update(self, values):
+        for x in values:
+            self.add(x)
+
+    def merge(self, other):
+        other._compress()
+        self._buffer.extend(zip(other.means, other.weights))
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _k(self, q):
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _q_limit(self, q):
+        # Largest quantile a centroid starting at q may reach (one unit of k further)
+        k = self._k(q) + 1
+        if k >= self.compression / 4:
+            return 1.0
+        return (math.sin(2 * math.pi * k / self.compression) + 1) / 2
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        items = sorted(list(zip(self.means, self.weights)) + self._buffer)
+        self._buffer = []
+        total = sum(w for _, w in items)
+        means, weights = [], []
+        done = 0.0
+        mean, weight = items[0]
+        limit = self._q_limit(0.0)
+        for x, w in items[1:]:
+            if (done + weight + w) / total <= limit:
+                weight += w
+                mean += (x - mean) * w / weight
+            else:
+                means.append(mean)
+                weights.append(weight)
+                done += weight
+                limit = self._q_limit(done / total)
+                mean, weight = x, w
+        means.append(mean)
+        weights.append(weight)
+        self.means, self.weights = means, weights
+
+    def quantile(self, q):
+        """Approximate ``q``-quantile (0 <= q <= 1), or None for an empty digest."""
+        self._compress()
+        if not self.means:
+            return None
+        if len(self.means) == 1:
+            return self.means[0]
+        target = q * self.count
+        # Interpolate between centroid centers; the exact min and max anchor the tails
+        cumulative = 0.0
+        previous_center, previous_mean = 0.0, self.min
+        for mean, weight in zip(self.means, self.weights):
+            center = cumulative + weight / 2
+            if target < center:
+                if center == previous_center:
+                    return mean
+                t = (target - previous_center) / (center - previous_center)
+                return previous_mean + t * (mean - previous_mean)
+            cumulative += weight
+            previous_center, previous_mean = center, mean
+        if cumulative == previous_center:
+            return self.max
+        t = (target - previous_center) / (cumulative - previous_center)
+        return previous_mean + min(1.0, t) * (self.max - previous_mean)
+
+class EdgeStats:
+    """
+    Streaming summary of edge weights: count, mean, variance (Welford), min, max, a
+    fixed-width histogram and a :class:`TDigest` for percentiles.
+
+    Summaries of separate chunks can be merged, and single weights can be added or
+    removed, so a cached summary follows writes without rereading the database. The
+    digest cannot forget values; after many removals :func:`get_stats` rebuilds it.
+    """
+
+    def __init__(self, bin_width=1.0, compression=100):
+        self.bin_width = bin_width
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.histogram = {}
+        self.digest = TDigest(compression)
+        self.removed = 0
+        self.bounds_stale = False
+
+    def _bin(self, x):
+        return math.floor(x / self.bin_width)
+
+    def add(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+        b = self._bin(x)
+        self.histogram[b] = self.histogram.get(b, 0) + 1
+        self.digest.add(x)
+
+    def update(self, values):
+        for x in values:
+            self.add(x)
+
+    def remove(self, x):
+        if self.count <= 1:
+            self.__init__(self.bin_width, self.digest.compression)
+            return
+        delta = x - self.mean
+        self.count -= 1
+        self.mean -= delta / self.count
+        self.m2 = max(0.0, self.m2 - delta * (x - self.mean))
+        b = self._bin(x)
+        if self.histogram.get(b, 0) > 1:
+            self.histogram[b] -= 1
+        else:
+            self.histogram.pop(b, None)
+        self.removed += 1
+        if x <= self.min or x >= self.max:
+            self.bounds_stale = True
+
+    def merge(self, other):
+        """Fold ``other`` (same ``bin_width``) into this summary (Chan's parallel update)."""
+        if other.count == 0:
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        for b, n in other.histogram.items():
+            self.histogram[b] = self.histogram.get(b, 0) + n
+        self.digest.merge(other.digest)
+        self.removed += other.removed
+        self.bounds_stale = self.bounds_stale or other.bounds_stale
+        return self
+
+    @property
+    def variance(self):
+        # Population variance, like statistics.pvariance
+        return self.m2 / self.count if self.count else None
+
+    def quantile(self, q):
+        # Estimate; exact_quantiles reads the exact value from the database
+        return self.digest.quantile(q)
+
+    def summary(self, percentiles=(0.25, 0.5, 0.75, 0.9, 0.99)):
+        """Dict with count, mean, min, max, variance, stdev, median and the given percentiles."""
+        empty = self.count == 0
+        variance = self.variance
+        return {
+            'count': self.count,
+            'mean': None if empty else self.mean,
+            'min': None if empty else self.min,
+            'max': None if empty else self.max,
+            'variance': variance,
+            'stdev': None if variance is None else math.sqrt(variance),
+            'median': self.quantile(0.5),
+            'percentiles': {q: self.quantile(q) for q in percentiles},
+        }
+
+    def histogram_bins(self):
+        """Sorted list of ``(bin_start, bin_end, count)``."""
+        return [(b * self.bin_width, (b + 1) * self.bin_width, n) for b, n in sorted(self.histogram.items())]
+
+def _undirected_sql(conn):
+    # Every undirected edge once: the row stored in canonical direction (lower node id,
+    # or lower name before schema version 2), or the only row if just one direction exists.
+    # From schema version 3 on links holds exactly those rows
+    version = get_schema_version(conn)
+    if version >= 3:
+        return "SELECT l.source_id AS a, l.target_id AS b, l.weight AS weight FROM links l"
+    if version == 2:
+        return '''SELECT l.source_id AS a, l.target_id AS b, l.weight AS weight FROM links l
+                  WHERE l.source_id <= l.target_id
+                     OR NOT EXISTS (SELECT 1 FROM links r
+                                    WHERE r.source_id = l.target_id AND r.target_id = l.source_id)'''
+    return '''SELECT e.source AS a, e.target AS b, e.weight AS weight FROM edges e
+              WHERE e.source <= e.target
+                 OR NOT EXISTS (SELECT 1 FROM edges r WHERE r.source = e.target AND r.target = e.source)'''
+
+def _node_key_sql(conn):
+    # Expression mapping a node name to the key used in _undirected_sql
+    if get_schema_version(conn) >= 2:
+        return "(SELECT id FROM nodes WHERE name = ?)"
+    return "?"
+
+def _stream(conn, query, params=(), stats=None, batch_size=10000, bin_width=1.0):
+    stats = stats if stats is not None else EdgeStats(bin_width)
+    cursor = conn.execute(query, params)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for (weight,) in rows:
+            if weight is not None:
+                stats.add(weight)
+    return stats
+
+def compute_stats(db_path=DB_PATH, bin_width=1.0, batch_size=10000):
+    """
+    Stream every undirected edge weight of the database into a new :class:`EdgeStats`.
+
+    Weights are read ``batch_size`` rows at a time, so memory stays constant.
+    """
+    conn = sqlite3.connect(db_path)
+    stats = _stream(conn, f"SELECT weight FROM ({_undirected_sql(conn)})",
+                    batch_size=batch_size, bin_width=bin_width)
+    conn.close()
+    return stats
+
+def sql_summary(db_path=DB_PATH):
+    """
+    Count, mean, min, max and population variance computed entirely by SQLite aggregates.
+    """
+    conn = sqlite3.connect(db_path)
+    count, mean, low, high, mean_square = conn.execute(
+        f'''SELECT COUNT(weight), AVG(weight), MIN(weight), MAX(weight), AVG(weight * weight)
+            FROM ({_undirected_sql(conn)})''').fetchone()
+    conn.close()
+    variance = max(0.0, mean_square - mean * mean) if count else None
+    return {'count': count, 'mean': mean, 'min': low, 'max': high, 'variance': variance}
+
+def exact_quantiles(quantiles=(0.5,), db_path=DB_PATH, batch_size=10000):
+    """
+    Exact ``q``-quantiles of the undirected edge weights, or None for each if there are none.
+
+    Values between two ranks are interpolated linearly, so the 0.5 quantile is the
+    median as :func:`statistics.median` gives it. There is no index on the weights, so
+    SQLite sorts the whole column, O(m log m) for m edges; that sort is done once for
+    all ``quantiles``, and the sorted rows are read ``batch_size`` at a time up to the
+    highest rank needed. Use :meth:`EdgeStats.quantile` where an estimate is enough.
+
+    :return: Dict of quantile -> value.
+    """
+    conn = sqlite3.connect(db_path)
+    weights = f"SELECT weight FROM ({_undirected_sql(conn)}) WHERE weight IS NOT NULL"
+    (count,) = conn.execute(f"SELECT COUNT(*) FROM ({weights})").fetchone()
+    if not count:
+        conn.close()
+        return {q: None for q in quantiles}
+
+    # Each quantile needs the values at ranks floor(rank) and floor(rank) + 1
+    ranks = {q: (count - 1) * q for q in quantiles}
+    wanted = set()
+    for rank in ranks.values():
+        lower = math.floor(rank)
+        wanted.update((lower, min(lower + 1, count - 1)))
+    last = max(wanted)
+    values = {}
+    position = 0
+    cursor = conn.execute(f"{weights} ORDER BY weight")
+    while position <= last:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for (w,) in rows:
+            if position in wanted:
+                values[position] = w
+            position += 1
+    conn.close()
+
+    result = {}
+    for q, rank in ranks.items():
+        lower = math.floor(rank)
+        if rank == lower:
+            result[q] = values[lower]
+        else:
+            result[q] = values[lower] + (rank - lower) * (values[lower + 1] - values[lower])
+    return result
+
+def node_stats(node, db_path=DB_PATH, bin_width=1.0):
+    """:class:`EdgeStats` of the edges incident to ``node``."""
+    conn = sqlite3.connect(db_path)
+    key = _node_key_sql(conn)
+    undirected = _undirected_sql(conn)
+    # Two index lookups (node as first and as second endpoint) instead of an OR over the table
+    stats = _stream(conn, f'''SELECT weight FROM ({undirected}) WHERE a = {key}
+                              UNION ALL
+                              SELECT weight FROM ({undirected}) WHERE b = {key} AND a != b''',
+                    (node, node), bin_width=bin_width)
+    conn.close()
+    return stats
+
+def subgraph_stats(nodes, db_path=DB_PATH, bin_width=1.0):
+    """:class:`EdgeStats` of the edges with both endpoints in ``nodes``."""
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TEMP TABLE stats_nodes (name TEXT PRIMARY KEY)")
+    conn.executemany("INSERT OR IGNORE INTO stats_nodes VALUES (?)", ((node,) for node in nodes))
+    if get_schema_version(conn) >= 2:
+        members = "SELECT n.id FROM nodes n JOIN stats_nodes s ON s.name = n.name"
+    else:
+        members = "SELECT name FROM stats_nodes"
+    stats = _stream(conn, f'''SELECT weight FROM ({_undirected_sql(conn)})
+                              WHERE a IN ({members}) AND b IN ({members})''', bin_width=bin_width)
+    conn.close()
+    return stats
+
+def iter_node_breakdown(db_path=DB_PATH, batch_size=1000):
+    """
+    Stream per-node aggregates over all nodes with at least one edge.
+
+    Yields ``(node, count, mean, min, max, variance)`` sorted by node key. The grouping
+    runs inside SQLite, so only ``batch_size`` rows are held in Python at a time.
+    """
+    conn = sqlite3.connect(db_path)
+    name = "(SELECT name FROM nodes WHERE id = node)" if get_schema_version(conn) >= 2 else "node"
+    cursor = conn.execute(f'''WITH und AS ({_undirected_sql(conn)})
+                              SELECT {name}, COUNT(weight), AVG(weight), MIN(weight), MAX(weight),
+                                     MAX(0, AVG(weight * weight) - AVG(weight) * AVG(weight))
+                              FROM (SELECT a AS node, weight FROM und
+                                    UNION ALL
+                                    SELECT b, weight FROM und WHERE b != a)
+                              GROUP BY node''')
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        conn.close()
+
+def current_weights(conn, edges):
+    """
+    Undirected weights currently stored for the pairs of ``edges``, read before a write.
+
+    :param edges: Iterable of (source, target, ...) tuples.
+    :return: Dict of ``(min(source, target), max(source, target))`` -> weight for the
+        pairs that exist.
+    """
+    v2 = get_schema_version(conn) >= 2
+    weights = {}
+    for source, target, *_ in edges:
+        pair = (min(source, target), max(source, target))
+        if pair in weights:
+            continue
+        if v2:
+            ids = dict(conn.execute("SELECT name, id FROM nodes WHERE name IN (?, ?)", pair))
+            if len(ids) < len(set(pair)):
+                continue
+            lo, hi = sorted((ids[source], ids[target]))
+            row = conn.execute('''SELECT weight FROM links
+                                  WHERE (source_id = ? AND target_id = ?) OR (source_id = ? AND target_id = ?)
+                                  ORDER BY source_id > target_id LIMIT 1''', (lo, hi, hi, lo)).fetchone()
+        else:
+            lo, hi = pair
+            row = conn.execute('''SELECT weight FROM edges
+                                  WHERE (source = ? AND target = ?) OR (source = ? AND target = ?)
+                                  ORDER BY source > target LIMIT 1''', (lo, hi, hi, lo)).fetchone()
+        if row is not None:
+            weights[pair] = row[0]
+    return weights
+
+# Cached whole-database summaries, one per database file. Each entry keeps a connection
+# to read the graph version (database.get_graph_version), so writes to positions or
+# metrics keep the summary; writers in this process report their edge changes through
+# apply_edges so the summary is patched instead of recomputed.
+_cache = {}
+_cache_lock = threading.Lock()
+
+# Rebuild the digest once this share of the summarized weights has been removed
+REBUILD_FRACTION = 0.05
+
+def _version(conn):
+    # Before schema version 4 there is no graph version; any commit counts as a change
+    version = get_graph_version(conn)
+    return version if version is not None else conn.execute("PRAGMA data_version").fetchone()[0]
+
+def get_stats(db_path=DB_PATH, bin_width=1.0):
+    """
+    Cached :class:`EdgeStats` of the whole database, recomputed only after outside edge changes.
+
+    The returned object is shared; treat it as read-only.
+    """
+    key = os.path.abspath(db_path)
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is None:
+            entry = _cache[key] = {'conn': sqlite3.connect(key, check_same_thread=False),
+                                   'version': None, 'stats': None}
+        version = _version(entry['conn'])
+        stats = entry['stats']
+        if (stats is None or entry['version'] != version or stats.bin_width != bin_width
+                or stats.removed > REBUILD_FRACTION * max(stats.count, 1)):
+            stats = entry['stats'] = compute_stats(key, bin_width)
+            entry['version'] = version
+        elif stats.bounds_stale:
+            summary = sql_summary(key)
+            stats.min, stats.max = summary['min'], summary['max']
+            stats.bounds_stale = False
+        return stats
+
+def apply_edges(edges, previous, db_path=DB_PATH):
+    """
+    Patch the cached summary with edges this process just committed.
+
+    :param edges: Written (source, target, weight) tuples; both directions of a pair
+        count once and the last weight wins.
+    :param previous: :func:`current_weights` of the same edges, read before the write.
+    """
+    key = os.path.abspath(db_path)
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is None or entry['stats'] is None:
+            return
+        written = {}
+        for source, target, weight in edges:
+            written[(min(source, target), max(source, target))] = weight
+        stats = entry['stats']
+        for pair, weight in written.items():
+            if pair in previous:
+                stats.remove(previous[pair])
+            stats.add(weight)
+        # Accept our own commit, like graph_cache.apply_edges
+        entry['version'] = _version(entry['conn'])
+
+def invalidate(db_path=None):
+    """Drop the cached summary of ``db_path``, or of every database."""
+    with _cache_lock:
+        for key in ([os.path.abspath(db_path)] if db_path else list(_cache)):
+            entry = _cache.get(key)
+            if entry is not None:
+                entry['stats'] = None
@@ -0,0 +1,223 @@
+import numpy as np
+from graph_snapshot import GraphSnapshot
+from tasks import checkpoint
+
+# Deepest tree level; 3 * 16 bits of Morton code still fit in an int64
+MAX_DEPTH = 16
+
+def _morton_codes(q, depth):
+    # Interleave the bits of the integer cell coordinates, so a parent cell key is
+    # simply its child key shifted right by ``dim`` bits
+    dim = q.shape[1]
+    code = np.zeros(len(q), dtype=np.int64)
+    for bit in range(depth):
+        for d in range(dim):
+            code |= ((q[:, d] >> bit) & 1) << (bit * dim + d)
+    return code
+
+def _expand(start, counts):
+    # Flattened ranges [start, start + count) for every row
+    total = int(counts.sum())
+    return np.repeat(start, counts) + (np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts))
+
+def _repulsion(P, k, theta):
+    """Barnes-Hut approximation of the Fruchterman-Reingold repulsion ``k**2 / distance``."""
+    n, dim = P.shape
+    F = np.zeros_like(P)
+    if n < 2:
+        return F
+
+    lo = P.min(axis=0)
+    extent = float((P.max(axis=0) - lo).max()) or 1.0
+    # Enough levels for about one node per leaf
+    depth = int(min(MAX_DEPTH, max(1, np.ceil(np.log2(n) / dim) + 1)))
+    cells_per_axis = 1 << depth
+    q = np.minimum(((P - lo) / extent * cells_per_axis).astype(np.int64), cells_per_axis - 1)
+    code = _morton_codes(q, depth)
+
+    # Aggregate mass and center of mass of the occupied cells of every level
+    levels = []
+    for level in range(depth + 1):
+        key = code >> (dim * (depth - level))
+        cells, inverse = np.unique(key, return_inverse=True)
+        mass = np.bincount(inverse, minlength=len(cells)).astype(np.float64)
+        com = np.stack([np.bincount(inverse, weights=P[:, d], minlength=len(cells)) for d in range(dim)], axis=1)
+        com /= mass[:, None]
+        levels.append((key, cells, mass, com, extent / (1 << level)))
+
+    members = np.argsort(code, kind='stable')
+    sorted_code = code[members]
+
+    # Walk the tree for all nodes at once as a frontier of (node, cell) pairs
+    nodes = np.arange(n)
+    cells_at = np.zeros(n, dtype=np.int64)
+    for level, (key, cells, mass, com, size) in enumerate(levels):
+        if level == depth:
+            # Leaves are resolved node by node, skipping the node itself
+            start = np.searchsorted(sorted_code, cells[cells_at], side='left')
+            end = np.searchsorted(sorted_code, cells[cells_at], side='right')
+            others = members[_expand(start, end - start)]
+            a_nodes = np.repeat(nodes, end - start)
+            keep = others != a_nodes
+            a_nodes, others = a_nodes[keep], others[keep]
+            delta = P[a_nodes] - P[others]
+            m = 1.0
+        else:
+            delta = P[nodes] - com[cells_at]
+            distance = np.sqrt((delta * delta).sum(axis=1))
+            # A cell is approximated only if it is far enough and does not hold the node
+            accept = (key[nodes] != cells[cells_at]) & (size < theta * distance)
+            a_nodes = nodes[accept]
+            delta = delta[accept]
+            m = mass[cells_at[accept]]
+
+        if len(a_nodes):
+            dist2 = np.maximum((delta * delta).sum(axis=1), 1e-12)
+            factor = k * k * m / dist2
+            for d in range(dim):
+                F[:, d] += np.bincount(a_nodes, weights=delta[:, d] * factor, minlength=n)
+
+        if level == depth:
+            break
+
+        # Open the remaining cells: their children are a contiguous run of the next level
+        nodes = nodes[~accept]
+        parents = cells[cells_at[~accept]]
+        next_cells = levels[level + 1][1]
+        start = np.searchsorted(next_cells, parents << dim, side='left')
+        end = np.searchsorted(next_cells, (parents + 1) << dim, side='left')
+        if not (end - start).any():
+            break
+        nodes = np.repeat(nodes, end - start)
+        cells_at = _expand(start, end - start)
+
+    return F
+
+def force_layout(P, u, v, w, fixed=None, iterations=100, theta=1.2, k=None,
+                 attraction=None, tol=1e-4, seed=None):
+    """
+    Barnes-Hut force-directed layout on arrays, in 2D or 3D.
+
+    Repulsion between all nodes is approximated with a quadtree/octree (``theta`` is
+    the usual opening criterion, 0 means exact); edges attract their endpoints with a
+    strength given by ``attraction`` (by default ``1 / weight``, since a small weight
+    means two notes are close). Step length follows Hu's adaptive cooling: it grows
+    while the energy keeps dropping and shrinks when it rises.
+
+    :param P: (n, dim) array of start positions; modified in place and returned.
+    :param u: Edge source indices.
+    :param v: Edge target indices.
+    :param w: Edge weights.
+    :param fixed: Optional boolean mask of pinned nodes that never move.
+    :param iterations: Maximum number of iterations.
+    :param k: Natural edge length, defaults to ``1 / sqrt(n)`` like ``nx.spring_layout``.
+    :param tol: Stop once the step length falls below ``tol * k``.
+    :return: The positions array.
+    """
+    n = len(P)
+    if n == 0:
+        return P
+    if k is None:
+        k = 1.0 / np.sqrt(n)
+    if attraction is None:
+        w = np.asarray(w, dtype=np.float64)
+        attraction = 1.0 / np.where(w > 0, w, 1.0)
+        if len(attraction):
+            attraction /= attraction.mean()
+    movable = np.ones(n, dtype=bool) if fixed is None else ~np.asarray(fixed, dtype=bool)
+    rng = np.random.default_rng(seed)
+
+    step = 0.1 * (float((P.max(axis=0) - P.min(axis=0)).max()) or 1.0)
+    energy = np.inf
+    progress = 0
+    for iteration in range(iterations):
+        checkpoint(iteration, iterations, 'layout')
+        F = _repulsion(P, k, theta)
+
+        if len(u):
+            delta = P[v] - P[u]
+            distance = np.sqrt((delta * delta).sum(axis=1))
+            pull = delta * (distance * attraction / k)[:, None]
+            for d in range(P.shape[1]):
+                F[:, d] += np.bincount(u, weights=pull[:, d], minlength=n)
+                F[:, d] -= np.bincount(v, weights=pull[:, d], minlength=n)
+
+        F[~movable] = 0
+        magnitude = np.sqrt((F * F).sum(axis=1))
+        # Nodes stacked on top of each other feel no net force; shake them apart
+        stuck = movable & (magnitude == 0)
+        if stuck.any():
+            F[stuck] = rng.normal(size=(int(stuck.sum()), P.shape[1]))
+            magnitude[stuck] = np.sqrt((F[stuck] * F[stuck]).sum(axis=1))
+
+        moving = magnitude > 0
+        P[moving] += step * F[moving] / magnitude[moving, None]
+
+        # Adaptive cooling
+        new_energy = float((magnitude * magnitude).sum())
+        if new_energy < energy:
+            progress += 1
+            if progress >= 5:
+                progress = 0
+                step /= 0.9
+        else:
+            progress = 0
+            step *= 0.9
+        energy = new_energy
+
+        if step < tol * k:
+            break
+
+    return P
+
+def barnes_hut_layout(G, dim=2, pos=None, fixed=None, iterations=100, theta=1.2, k=None,
+                      scale=1, seed=None, weight='weight'):
+    """
+    Lay out an ``nx.Graph`` or ``GraphSnapshot`` with :func:`force_layout`.
+
+    :param pos: Optional dict of warm-start positions; other nodes start at random.
+    :param fixed: Optional nodes that keep their ``pos`` position.
+    :param scale: Without fixed nodes the result is rescaled to ``[-scale, scale]``,
+        like ``nx.spring_layout``.
+    :return: Dict of node -> position array.
+    """
+    if isinstance(G, GraphSnapshot):
+        nodes = G.names
+        rows = np.repeat(np.arange(len(nodes)), np.diff(G.indptr))
+        once = G.indices >= rows
+        u, v, w = rows[once], G.indices[once].astype(np.int64), G.weights[once]
+    else:
+        nodes = list(G.nodes())
+        index = {node: i for i, node in enumerate(nodes)}
+        edges = list(G.edges(data=weight, default=1))
+        u = np.array([index[a] for a, _, _ in edges], dtype=np.int64)
+        v = np.array([index[b] for _, b, _ in edges], dtype=np.int64)
+        w = np.array([x for _, _, x in edges], dtype=np.float64)
+
+    rng = np.random.default_rng(seed)
+    P = rng.random((len(nodes), dim))
+    known = np.zeros(len(nodes), dtype=bool)
+    if pos:
+        for i, node in enumerate(nodes):
+            if node in pos:
+                P[i] = np.asarray(pos[node], dtype=np.float64)[:dim]
+                known[i] = True
+        if known.any() and not known.all():
+            # Scatter new nodes over the area already occupied by the warm start
+            lo, hi = P[known].min(axis=0), P[known].max(axis=0)
+            P[~known] = lo + rng.random((int((~known).sum()), dim)) * np.maximum(hi - lo, 1e-3)
+
+    fixed_mask = None
+    if fixed is not None:
+        fixed = set(fixed)
+        fixed_mask = np.array([node in fixed and known[i] for i, node in enumerate(nodes)], dtype=bool)
+
+    force_layout(P, u, v, w, fixed=fixed_mask, iterations=iterations, theta=theta, k=k, seed=seed)
+
+    if fixed_mask is None or not fixed_mask.any():
+        P -= P.mean(axis=0)
+        extent = np.abs(P).max()
+        if extent > 0:
+            P *= scale / extent
+
+    return dict(zip(nodes, P))
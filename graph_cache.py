@@ -0,0 +1,166 @@
+import os
+import sqlite3
+import threading
+import networkx as nx
+import instrumentation
+from database import DB_PATH, get_schema_version
+from snapshot_file import load_cached_snapshot
+
+# One cache per database file, shared by every module in the process
+_caches = {}
+_caches_lock = threading.Lock()
+
+class GraphCache:
+    """
+    Keep the graph of one database loaded in memory.
+
+    The cache holds its own SQLite connection and compares ``PRAGMA data_version``
+    on every access. SQLite bumps that value whenever another connection commits,
+    so the graph is only rebuilt after something actually wrote to the database.
+    Writers in this process can call :meth:`apply_edges` right after committing to
+    patch the loaded graph instead of paying for a full reload.
+
+    Both an ``nx.Graph`` (:meth:`get_graph`) and a compact CSR
+    :class:`~graph_snapshot.GraphSnapshot` (:meth:`get_snapshot`) are available; each
+    is built on first use. The returned objects are shared; callers must treat them
+    as read-only.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = None
+        self.graph = None
+        self.snapshot = None
+        self.data_version = None
+        self.lock = threading.RLock()
+
+    def _connect(self):
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        return self.conn
+
+    def _current_version(self):
+        return self._connect().execute("PRAGMA data_version").fetchone()[0]
+
+    def _check_version(self):
+        version = self._current_version()
+        if version != self.data_version:
+            self.graph = None
+            self.snapshot = None
+            self.data_version = version
+
+    def get_graph(self):
+        with self.lock:
+            self._check_version()
+            if self.graph is None:
+                self.reload()
+            return self.graph
+
+    def get_snapshot(self):
+        with self.lock:
+            self._check_version()
+            if self.snapshot is None:
+                # Mapped from the .snapshot file next to the database when it is current
+                self.snapshot = load_cached_snapshot(self.db_path)
+            return self.snapshot
+
+    def reload(self):
+        with self.lock, instrumentation.span('load_graph') as span:
+            G = nx.Graph()
+            conn = self._connect()
+            if get_schema_version(conn) >= 3:
+                # One row per pair, read in links order like load_snapshot; the edges view
+                # would list every pair twice
+                query = '''SELECT s.name, t.name, l.weight
+                           FROM links l CROSS JOIN nodes s CROSS JOIN nodes t
+                           WHERE s.id = l.source_id AND t.id = l.target_id'''
+            else:
+                query = "SELECT source, target, weight FROM edges"
+            G.add_weighted_edges_from(conn.execute(query))
+            span.count('edges', G.number_of_edges())
+            self.graph = G
+
+    def apply_edges(self, edges):
+        """
+        Patch the loaded graph with edges that were just committed by this process.
+
+        :param edges: Iterable of (source, target, weight) tuples, in write order.
+        """
+        with self.lock:
+            # The CSR arrays are immutable, so the snapshot is rebuilt on next use
+            self.snapshot = None
+            if self.graph is not None:
+                self.graph.add_weighted_edges_from(edges)
+            # Our own commit moved data_version; accept the new value so the delta is not
+            # followed by a redundant full reload.
+            self.data_version = self._current_version()
+
+    def side_write(self, fn):
+        """
+        Run ``fn(conn)`` on the cache's own connection and commit.
+
+        Meant for writes that do not touch nodes or edges (layout positions, derived
+        tables). SQLite does not bump ``data_version`` for a connection's own commits, so
+        these writes do not throw away the loaded graph.
+        """
+        with self.lock:
+            conn = self._connect()
+            try:
+                result = fn(conn)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            return result
+
+    def invalidate(self):
+        with self.lock:
+            self.graph = None
+            self.snapshot = None
+            self.data_version = None
+
+    def close(self):
+        with self.lock:
+            self.invalidate()
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+def get_cache(db_path=DB_PATH):
+    key = os.path.abspath(db_path)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = GraphCache(key)
+        return cache
+
+def get_graph(db_path=DB_PATH):
+    """Return the cached graph for ``db_path``, reloading it only if the database changed."""
+    return get_cache(db_path).get_graph()
+
+def get_snapshot(db_path=DB_PATH):
+    """Return the cached CSR snapshot for ``db_path``, reloading it only if the database changed."""
+    return get_cache(db_path).get_snapshot()
+
+def apply_edges(edges, db_path=DB_PATH):
+    """Apply committed edge writes to the cached graph of ``db_path`` as a delta."""
+    key = os.path.abspath(db_path)
+    with _caches_lock:
+        cache = _caches.get(key)
+    if cache is not None:
+        cache.apply_edges(edges)
+
+def side_write(fn, db_path=DB_PATH):
+    """Run a write that does not change the graph without invalidating the cache, see :meth:`GraphCache.side_write`."""
+    return get_cache(db_path).side_write(fn)
+
+def invalidate(db_path=None):
+    """Drop the cached graph of ``db_path`` (or of every database) so it is rebuilt on next use."""
+    with _caches_lock:
+        if db_path is None:
+            caches = list(_caches.values())
+        else:
+            cache = _caches.get(os.path.abspath(db_path))
+            caches = [cache] if cache is not None else []
+    for cache in caches:
+        cache.invalidate()
@@ -2,7 +2,10 @@ import tkinter as tk
 from tkinter import simpledialog, messagebox, font
 import sqlite3
 from database import DB_PATH
-import networkx as nx
+import graph_cache
+import node_metrics
+import edge_stats
+from bulk_ingest import insert_nodes_and_edges
 
 class MultilineDialog(simpledialog.Dialog):
     def body(self, master):
@@ -28,8 +31,9 @@ def add_node_and_edges():
     if not nodes_input:
         return
 
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    # Parse everything first, then write it in one transaction
+    node_names = {}
+    edge_rows = []
 
     for line in nodes_input.split('\n'):
         line = line.strip()
@@ -46,7 +50,7 @@ def add_node_and_edges():
                                           "Please use the format: NodeA: NodeB, 5, NodeC, 10")
             continue
 
-        c.execute("INSERT OR IGNORE INTO nodes (name) VALUES (?)", (node_name,))
+        node_names[node_name] = None
 
         for i in range(0, len(related_nodes), 2):
             try:
@@ -56,26 +60,23 @@ def add_node_and_edges():
                 messagebox.showerror("Error", f"Invalid input for related node or weight: {', '.join(related_nodes[i:i+2])}")
                 continue
 
-            c.execute("INSERT OR IGNORE INTO nodes (name) VALUES (?)", (related_node,))
-            
-            c.execute("INSERT OR REPLACE INTO edges (source, target, weight) VALUES (?, ?, ?)",
-                      (node_name, related_node, weight))
-            c.execute("INSERT OR REPLACE INTO edges (source, target, weight) VALUES (?, ?, ?)",
-                      (related_node, node_name, weight))
+            node_names[related_node] = None
+            # Undirected; insert_nodes_and_edges stores the pair once (schema 3)
+            edge_rows.append((node_name, related_node, weight))
 
-    conn.commit()
+    conn = sqlite3.connect(DB_PATH)
+    # Weights being replaced, so the cached edge statistics can swap them out
+    previous = edge_stats.current_weights(conn, edge_rows)
+    with conn:
+        insert_nodes_and_edges(conn, node_names, edge_rows)
     conn.close()
+
+    # Patch the in-memory graph instead of forcing a full reload
+    graph_cache.apply_edges(edge_rows, DB_PATH)
+    edge_stats.apply_edges(edge_rows, previous, DB_PATH)
+    # Refresh the stored metrics of the nodes whose neighborhood changed
+    node_metrics.update_metrics(node_names, DB_PATH)
     messagebox.showinfo("Success", "Node and edges added successfully!")
 
 def get_graph_from_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    G = nx.Graph()
-    
-    c.execute("SELECT source, target, weight FROM edges")
-    for row in c.fetchall():
-        G.add_edge(row[0], row[1], weight=row[2])
-    
-    conn.close()
-    return G 
+    return graph_cache.get_graph(DB_PATH)
@@ -1,36 +1,36 @@
-import sqlite3
-import networkx as nx
-
-# Connect to the database
-conn = sqlite3.connect('graph_data.db')
-c = conn.cursor()
+import sys
+from database import DB_PATH
+import node_search
 
 # Function to search for records with a keyword
-def search_edges(keyword):
-    # SQL query to search for the keyword in source or target columns
-    query = """
-    SELECT id, source, target, weight 
-    FROM edges 
-    WHERE source LIKE ? OR target LIKE ?
+def search_edges(keyword, db_path=DB_PATH, page=0, page_size=50):
     """
-    
-    # Execute the query
-    c.execute(query, ('%' + keyword + '%', '%' + keyword + '%'))
-    
-    # Fetch all matching records
-    results = c.fetchall()
-    
-    # Print the results
-    if results:
-        print(f"Found {len(results)} record(s) matching '{keyword}':")
-        for row in results:
-            print(f"ID: {row[0]}, Source: {row[1]}, Target: {row[2]}, Weight: {row[3]}")
-    else:
-        print(f"No records found matching '{keyword}'")
+    Print one page of the nodes whose name contains ``keyword`` and of the edges touching them.
+
+    Node hits come from the trigram search index, best match first.
+
+    :param page: Zero-based page number.
+    :param page_size: Number of nodes and of edges shown per page.
+    """
+    offset = page * page_size
+    nodes = node_search.search_nodes(keyword, db_path, limit=page_size, offset=offset)
+    edges = node_search.search_edges(keyword, db_path, limit=page_size, offset=offset)
+
+    if not nodes and not edges:
+        print(f"No records found matching '{keyword}'" + (f" on page {page}" if page else ""))
+        return
 
-# Example usage
-search_keyword = 'xxx'  # Replace 'xxx' with your desired keyword
-search_edges(search_keyword)
+    print(f"Nodes matching '{keyword}' ({offset + 1}-{offset + len(nodes)}):")
+    for name in nodes:
+        print(f"  {name}")
+    print(f"Edges ({offset + 1}-{offset + len(edges)}):")
+    for source, target, weight in edges:
+        print(f"  Source: {source}, Target: {target}, Weight: {weight}")
+    if len(nodes) == page_size or len(edges) == page_size:
+        print(f"More results on page {page + 1}")
 
-# Close the connection
-conn.close()
+if __name__ == "__main__":
+    # Example usage: python graph_query.py keyword [page]
+    search_keyword = sys.argv[1] if len(sys.argv) > 1 else 'xxx'  # Replace 'xxx' with your desired keyword
+    search_page = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    search_edges(search_keyword, page=search_page)
@@ -1,4 +1,25 @@
+import csv
+import json
+import os
 import sqlite3
+import graph_cache
+import node_metrics
+from database import upgrade_database
+from node_search import rebuild_search_index
+
+# How the weights of edges that collapse into one edge after a merge are combined
+WEIGHT_RULES = {'min': 'MIN', 'max': 'MAX', 'sum': 'SUM'}
+
+def get_data_tables(cursor):
+    """
+    Return the names of the ordinary tables, leaving out virtual tables such as the
+    ``nodes_fts`` search index and the shadow tables that store their contents.
+    """
+    cursor.execute("SELECT name, sql FROM sqlite_master WHERE type='table';")
+    tables = cursor.fetchall()
+    virtual = [name for name, sql in tables if sql and sql.upper().startswith('CREATE VIRTUAL TABLE')]
+    return [name for name, _ in tables
+            if name not in virtual and not any(name.startswith(v + '_') for v in virtual)]
 
 def replace_text_in_db(db_path, old_string, new_string):
     """
@@ -12,11 +33,9 @@ def replace_text_in_db(db_path, old_string, new_string):
     cursor = conn.cursor()
 
     # Get the list of tables
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-    tables = cursor.fetchall()
+    tables = get_data_tables(cursor)
 
-    for table in tables:
-        table_name = table[0]
+    for table_name in tables:
         
         # Get the list of columns for the current table
         cursor.execute(f"PRAGMA table_info({table_name});")
@@ -41,6 +60,9 @@ def replace_text_in_db(db_path, old_string, new_string):
     # Close the connection
     conn.close()
 
+    # Renames can touch any node, so the cached graph is rebuilt on next use
+    graph_cache.invalidate(db_path)
+
 def clear_database(db_path):
     """
     Clear all data from all tables in the database.
@@ -56,13 +78,15 @@ def clear_database(db_path):
     # Begin transaction
     cursor.execute("BEGIN TRANSACTION;")
 
-    # Get the list of tables
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-    tables = cursor.fetchall()
+    # Get the list of tables; the search index's shadow tables must not be emptied directly
+    tables = get_data_tables(cursor)
 
     # Generate and execute DELETE statements for each table
     for table in tables:
-        cursor.execute(f"DELETE FROM {table[0]};")
+        cursor.execute(f"DELETE FROM {table};")
+
+    # Resync the search index with the now empty nodes table
+    rebuild_search_index(conn)
 
     # Commit the transaction
     conn.commit()
@@ -73,6 +97,174 @@ def clear_database(db_path):
     # Close the connection
     conn.close()
 
+    graph_cache.invalidate(db_path)
+
+def load_mapping(path):
+    """
+    Read old -> new node names from a CSV or JSON file.
+
+    CSV files hold one ``old,new`` pair per row (an ``old,new`` header row is
+    skipped). JSON files hold either an object ``{"old": "new"}`` or a list of
+    ``[old, new]`` pairs.
+
+    :param path: Path of the mapping file; the format follows the extension.
+    :return: List of (old, new) tuples.
+    """
+    if os.path.splitext(path)[1].lower() == '.json':
+        with open(path, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        pairs = data.items() if isinstance(data, dict) else data
+    else:
+        with open(path, 'r', encoding='utf-8', newline='') as file:
+            pairs = [row[:2] for row in csv.reader(file) if len(row) >= 2]
+        if pairs and [cell.strip().lower() for cell in pairs[0]] == ['old', 'new']:
+            pairs = pairs[1:]
+    return [(str(old).strip(), str(new).strip()) for old, new in pairs]
+
+def _move_node_rows(c, table, drop):
+    # Rows keyed by node name: delete those of the old names that ``drop`` selects from
+    # rename_rows, then rename the rest in two steps like the nodes themselves
+    c.execute(f"DELETE FROM {table} WHERE node IN (SELECT old FROM rename_rows WHERE {drop})")
+    c.execute(f"UPDATE {table} SET node = char(0) || node WHERE node IN (SELECT old FROM rename_rows)")
+    c.execute(f'''UPDATE OR REPLACE {table} SET node = (SELECT new FROM rename_rows WHERE char(0) || old = {table}.node)
+                  WHERE node IN (SELECT char(0) || old FROM rename_rows)''')
+
+def _has_table(c, name):
+    return c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+def bulk_rename_nodes(db_path, mapping, weight_rule='min', dry_run=False):
+    """
+    Rename many nodes at once, merging nodes that end up with the same name.
+
+    All renames apply simultaneously (``a -> b`` and ``b -> c`` move ``a`` to ``b`` and
+    ``b`` to ``c``) in one transaction, driven by a temp mapping table joined against
+    the indexed ``nodes`` and ``links`` tables. When several nodes get the same name
+    they become one node: their edges are moved over, edges that now connect the same
+    pair are combined with ``weight_rule`` and edges between merged nodes are dropped.
+    Cached layout positions, community memberships and stored node metrics follow the
+    rename; the metrics of merged nodes and of the nodes around them are recomputed.
+
+    Databases older than the current schema version are upgraded first.
+
+    :param db_path: Path to the SQLite database file.
+    :param mapping: Dict or iterable of (old, new) names, e.g. from :func:`load_mapping`.
+    :param weight_rule: 'min', 'max' or 'sum'.
+    :param dry_run: Compute the report, then roll everything back.
+    :return: Dict with the number of mappings, unknown old names, renamed nodes,
+        merged (removed) nodes, combined edges and dropped self-loops.
+    """
+    if weight_rule not in WEIGHT_RULES:
+        raise ValueError(f"weight_rule must be one of {sorted(WEIGHT_RULES)}, not {weight_rule!r}")
+    pairs = mapping.items() if isinstance(mapping, dict) else mapping
+    # A later mapping for the same old name wins; identity mappings do nothing
+    pairs = {old: new for old, new in pairs}
+    pairs = [(old, new) for old, new in pairs.items() if old != new]
+
+    upgrade_database(db_path)
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    report = {'mappings': len(pairs)}
+    try:
+        c.execute("CREATE TEMP TABLE rename_map (old TEXT PRIMARY KEY, new TEXT NOT NULL)")
+        c.executemany("INSERT INTO rename_map VALUES (?, ?)", pairs)
+        c.execute("CREATE INDEX temp.rename_map_new ON rename_map(new)")
+
+        # Final name of every node touched by the rename: the renamed nodes themselves
+        # and the existing nodes that already carry one of the new names
+        c.execute('''CREATE TEMP TABLE rename_node AS
+                     SELECT n.id AS id, COALESCE(m.new, n.name) AS name
+                     FROM nodes n LEFT JOIN rename_map m ON m.old = n.name
+                     WHERE m.old IS NOT NULL OR n.name IN (SELECT new FROM rename_map)''')
+        # Nodes that share a final name merge into the one with the lowest id
+        c.execute('''CREATE TEMP TABLE rename_keep AS
+                     SELECT r.id AS id, k.keep_id AS keep_id, r.name AS name
+                     FROM rename_node r
+                     JOIN (SELECT name, MIN(id) AS keep_id FROM rename_node GROUP BY name) k
+                       ON k.name = r.name''')
+        c.execute("CREATE UNIQUE INDEX temp.rename_keep_id ON rename_keep(id)")
+
+        report['unknown'] = c.execute('''SELECT COUNT(*) FROM rename_map
+                                         WHERE old NOT IN (SELECT name FROM nodes)''').fetchone()[0]
+        report['renamed'] = c.execute('''SELECT COUNT(*) FROM rename_keep k JOIN nodes n ON n.id = k.id
+                                         WHERE k.id = k.keep_id AND n.name != k.name''').fetchone()[0]
+        report['merged'] = c.execute("SELECT COUNT(*) FROM rename_keep WHERE id != keep_id").fetchone()[0]
+
+        # Old and final name of every touched node, for the tables keyed by name
+        c.execute('''CREATE TEMP TABLE rename_rows AS
+                     SELECT n.name AS old, k.name AS new, k.id = k.keep_id AS kept,
+                            (SELECT COUNT(*) FROM rename_keep g WHERE g.keep_id = k.keep_id) > 1 AS merged
+                     FROM rename_keep k JOIN nodes n ON n.id = k.id''')
+
+        # Re-point the edges of every touched node; edges that now connect the same
+        # pair (including ones the kept node already had) collapse into one, stored in
+        # canonical order (lower id first)
+        c.execute(f'''CREATE TEMP TABLE rename_links AS
+                      SELECT min(COALESCE(s.keep_id, l.source_id), COALESCE(t.keep_id, l.target_id)) AS source_id,
+                             max(COALESCE(s.keep_id, l.source_id), COALESCE(t.keep_id, l.target_id)) AS target_id,
+                             {WEIGHT_RULES[weight_rule]}(l.weight) AS weight,
+                             COUNT(*) AS combined
+                      FROM links l
+                      LEFT JOIN rename_keep s ON s.id = l.source_id
+                      LEFT JOIN rename_keep t ON t.id = l.target_id
+                      WHERE s.id IS NOT NULL OR t.id IS NOT NULL
+                      GROUP BY 1, 2''')
+        c.execute('''DELETE FROM links
+                     WHERE source_id IN (SELECT id FROM rename_keep)
+                        OR target_id IN (SELECT id FROM rename_keep)''')
+        c.execute('''INSERT INTO links (source_id, target_id, weight)
+                     SELECT source_id, target_id, weight FROM rename_links
+                     WHERE source_id != target_id''')
+        report['edges_combined'] = c.execute('''SELECT COALESCE(SUM(combined) - COUNT(*), 0) FROM rename_links
+                                                WHERE source_id != target_id''').fetchone()[0]
+        # Edges between nodes that merged into one would become self-loops
+        report['self_loops_dropped'] = c.execute('''SELECT COALESCE(SUM(combined), 0) FROM rename_links
+                                                    WHERE source_id = target_id''').fetchone()[0]
+
+        # Remove merged nodes, then rename the kept ones in two steps so that swaps
+        # (a -> b, b -> a) never hit the UNIQUE constraint halfway
+        c.execute("DELETE FROM nodes WHERE id IN (SELECT id FROM rename_keep WHERE id != keep_id)")
+        c.execute('''UPDATE nodes SET name = char(0) || id
+                     WHERE id IN (SELECT id FROM rename_keep WHERE id = keep_id)''')
+        c.execute('''UPDATE nodes SET name = (SELECT name FROM rename_keep WHERE rename_keep.id = nodes.id)
+                     WHERE id IN (SELECT id FROM rename_keep WHERE id = keep_id)''')
+
+        # Layout positions are a cache keyed by name; stale ones are detected by signature.
+        # Merged nodes keep the position of the one they merge into
+        if _has_table(c, 'positions'):
+            _move_node_rows(c, 'positions', "NOT kept")
+        # Merged nodes take the community of the one they merge into
+        if _has_table(c, 'community_members'):
+            _move_node_rows(c, 'community_members', "NOT kept")
+            c.execute('''UPDATE communities SET label = (SELECT new FROM rename_rows WHERE old = communities.label)
+                         WHERE label IN (SELECT old FROM rename_rows)''')
+        # Metrics depend on the edges only, so renamed nodes keep theirs; merged ones are
+        # dropped here and recomputed with their surroundings once the rename is committed
+        changed = []
+        if _has_table(c, 'node_metrics'):
+            _move_node_rows(c, 'node_metrics', "merged")
+            changed = [name for (name,) in c.execute('''
+                WITH merged AS (SELECT DISTINCT keep_id AS id FROM rename_keep WHERE id != keep_id)
+                SELECT name FROM nodes
+                WHERE id IN (SELECT id FROM merged
+                             UNION SELECT target_id FROM links WHERE source_id IN merged
+                             UNION SELECT source_id FROM links WHERE target_id IN merged)''')]
+
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    if not dry_run:
+        graph_cache.invalidate(db_path)
+        if changed:
+            node_metrics.update_metrics(changed, db_path)
+    return report
+
 def main():
     db_path = 'graph_data.db'
     
@@ -80,6 +272,9 @@ def main():
     old_string = 'whitespace character \s \s'
     new_string = 'whitespace character \s'
     replace_text_in_db(db_path, old_string, new_string)
+
+    # Example usage of bulk_rename_nodes with a CSV or JSON file of old -> new names
+    # print(bulk_rename_nodes(db_path, load_mapping('renames.csv'), weight_rule='min', dry_run=True))
     
     # Example usage of clear_database
     clear_database(db_path)
@@ -0,0 +1,258 @@
+import sqlite3
+from array import array
+from heapq import heappush, heappop
+from itertools import count
+import numpy as np
+import networkx as nx
+import instrumentation
+from database import DB_PATH, get_schema_version
+
+class GraphSnapshot:
+    """
+    Read-only, integer-indexed copy of the graph in CSR form.
+
+    Node names are interned once in ``names`` (position = node id) and adjacency is
+    kept in three flat arrays: the neighbors of node ``i`` are
+    ``indices[indptr[i]:indptr[i + 1]]`` with matching ``weights``. Neighbors keep the
+    order in which their edge is first read from the database, which is the same
+    order ``nx.Graph`` would use, so traversals return identical results.
+
+    The class answers the subset of the ``nx.Graph`` API the rest of the project
+    uses (``in``, ``nodes()``, ``neighbors``, ``degree``, ``has_edge``, ``G[u][v]``,
+    ``edges(data=True)``); call :meth:`to_networkx` when a layout function needs a
+    real networkx graph.
+    """
+
+    def __init__(self, names, indptr, indices, weights):
+        self.names = names
+        self.index = {name: i for i, name in enumerate(names)}
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+
+    @classmethod
+    def from_edges(cls, names, sources, targets, weights):
+        """
+        Build a snapshot from parallel arrays of node ids.
+
+        Rows are read as an undirected edge list: repeated pairs (including the
+        reverse direction) keep the weight of the last row, as ``nx.Graph.add_edge``
+        would.
+        """
+        n = len(names)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float64)
+        m = len(sources)
+
+        if m:
+            lo = np.minimum(sources, targets)
+            hi = np.maximum(sources, targets)
+            keys = lo * n + hi
+            # Position of each pair is its first row, its weight comes from its last row
+            _, first = np.unique(keys, return_index=True)
+            _, last_reversed = np.unique(keys[::-1], return_index=True)
+            last = m - 1 - last_reversed
+            order = np.argsort(first, kind='stable')
+            first = first[order]
+            last = last[order]
+            edge_u = sources[first]
+            edge_v = targets[first]
+            edge_w = weights[last]
+        else:
+            edge_u = edge_v = np.zeros(0, dtype=np.int64)
+            edge_w = np.zeros(0, dtype=np.float64)
+
+        # Expand to both directions (a self-loop is stored once, like networkx)
+        not_loop = edge_u != edge_v
+        position = np.arange(len(edge_u))
+        src = np.concatenate([edge_u, edge_v[not_loop]])
+        dst = np.concatenate([edge_v, edge_u[not_loop]])
+        w = np.concatenate([edge_w, edge_w[not_loop]])
+        position = np.concatenate([position, position[not_loop]])
+
+        order = np.lexsort((position, src))
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+
+        return cls(names, indptr, dst[order].astype(np.int32), w[order])
+
+    @classmethod
+    def from_networkx(cls, G):
+        names = list(G.nodes())
+        index = {name: i for i, name in enumerate(names)}
+        sources, targets, weights = array('i'), array('i'), array('d')
+        for u, v, data in G.edges(data=True):
+            sources.append(index[u])
+            targets.append(index[v])
+            weights.append(data.get('weight', 1.0))
+        return cls.from_edges(names, sources, targets, weights)
+
+    # networkx-compatible read API
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __getitem__(self, name):
+        i = self.index[name]
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return {self.names[j]: {'weight': float(w)}
+                for j, w in zip(self.indices[start:end].tolist(), self.weights[start:end].tolist())}
+
+    def nodes(self):
+        return self.index.keys()
+
+    def number_of_nodes(self):
+        return len(self.names)
+
+    def number_of_edges(self):
+        return len(self.edge_weights())
+
+    def neighbors(self, name):
+        i = self.index[name]
+        return (self.names[j] for j in self.neighbor_ids(i).tolist())
+
+    def degree(self, name):
+        i = self.index[name]
+        row = self.neighbor_ids(i)
+        # A self-loop counts twice, as in networkx
+        return len(row) + int(np.count_nonzero(row == i))
+
+    def has_node(self, name):
+        return name in self.index
+
+    def has_edge(self, u, v):
+        i = self.index.get(u)
+        j = self.index.get(v)
+        if i is None or j is None:
+            return False
+        return bool(np.any(self.neighbor_ids(i) == j))
+
+    def edges(self, data=False):
+        for i, name in enumerate(self.names):
+            start, end = self.indptr[i], self.indptr[i + 1]
+            for j, w in zip(self.indices[start:end].tolist(), self.weights[start:end].tolist()):
+                if j >= i:
+                    yield (name, self.names[j], {'weight': w}) if data else (name, self.names[j])
+
+    # Array API
+
+    def neighbor_ids(self, i):
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def neighbor_weights(self, i):
+        return self.weights[self.indptr[i]:self.indptr[i + 1]]
+
+    def edge_weights(self):
+        """Weights of each undirected edge once."""
+        rows = np.repeat(np.arange(len(self.names)), np.diff(self.indptr))
+        return self.weights[self.indices >= rows]
+
+    def nbytes(self):
+        return self.indptr.nbytes + self.indices.nbytes + self.weights.nbytes
+
+    def to_networkx(self, nodes=None):
+        """
+        Return an ``nx.Graph`` of the whole snapshot, or of the subgraph induced by ``nodes``.
+        """
+        G = nx.Graph()
+        if nodes is None:
+            ids = range(len(self.names))
+        else:
+            ids = [self.index[name] for name in nodes if name in self.index]
+        keep = set(ids)
+        for i in ids:
+            G.add_node(self.names[i])
+        for i in ids:
+            start, end = self.indptr[i], self.indptr[i + 1]
+            for j, w in zip(self.indices[start:end].tolist(), self.weights[start:end].tolist()):
+                if j in keep:
+                    G.add_edge(self.names[i], self.names[j], weight=w)
+        return G
+
+@instrumentation.traced('load_snapshot')
+def load_snapshot(db_path=DB_PATH):
+    """
+    Build a :class:`GraphSnapshot` from the ``nodes`` and ``links`` tables (``edges`` before
+    schema version 2).
+
+    :param db_path: Path to the SQLite database file.
+    """
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+
+    if get_schema_version(conn) >= 2:
+        # Integer-keyed links: no name lookups, every endpoint is a row of nodes
+        ids, names = [], []
+        for node_id, name in c.execute("SELECT id, name FROM nodes ORDER BY id"):
+            ids.append(node_id)
+            names.append(name)
+        ids = np.array(ids, dtype=np.int64)
+        links = np.array(c.execute("SELECT source_id, target_id, weight FROM links").fetchall(),
+                         dtype=np.float64).reshape(-1, 3)
+        conn.close()
+        instrumentation.count('rows_read', len(names) + len(links))
+        sources = np.searchsorted(ids, links[:, 0].astype(np.int64))
+        targets = np.searchsorted(ids, links[:, 1].astype(np.int64))
+        return GraphSnapshot.from_edges(names, sources, targets, links[:, 2])
+
+    names = [row[0] for row in c.execute("SELECT name FROM nodes ORDER BY id")]
+    index = {name: i for i, name in enumerate(names)}
+
+    sources, targets, weights = array('i'), array('i'), array('d')
+    for source, target, weight in c.execute("SELECT source, target, weight FROM edges"):
+        # Edges may reference names that were never inserted into nodes
+        i = index.get(source)
+        if i is None:
+            i = index[source] = len(names)
+            names.append(source)
+        j = index.get(target)
+        if j is None:
+            j = index[target] = len(names)
+            names.append(target)
+        sources.append(i)
+        targets.append(j)
+        weights.append(weight)
+
+    conn.close()
+    instrumentation.count('rows_read', len(weights))
+    return GraphSnapshot.from_edges(names, sources, targets, weights)
+
+def single_source_dijkstra_path_length(G, source, cutoff=None):
+    """
+    Shortest weighted distances from ``source``, for a snapshot or an ``nx.Graph``.
+
+    For snapshots this follows networkx's own Dijkstra step by step (same tie-breaking
+    counter, same neighbor order), so the returned dict has the same contents and
+    order as ``nx.single_source_dijkstra_path_length``.
+    """
+    if not isinstance(G, GraphSnapshot):
+        return nx.single_source_dijkstra_path_length(G, source, cutoff=cutoff)
+
+    indptr, indices, weights, names = G.indptr, G.indices, G.weights, G.names
+    start = G.index[source]
+    dist = {}
+    seen = {start: 0}
+    c = count()
+    fringe = [(0, next(c), start)]
+    while fringe:
+        d, _, v = heappop(fringe)
+        if v in dist:
+            continue
+        dist[v] = d
+        lo, hi = indptr[v], indptr[v + 1]
+        for u, cost in zip(indices[lo:hi].tolist(), weights[lo:hi].tolist()):
+            vu_dist = d + cost
+            if cutoff is not None and vu_dist > cutoff:
+                continue
+            if u not in dist and (u not in seen or vu_dist < seen[u]):
+                seen[u] = vu_dist
+                heappush(fringe, (vu_dist, next(c), u))
+
+    return {names[v]: d for v, d in dist.items()}
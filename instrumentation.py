@@ -0,0 +1,234 @@
+import atexit
+import cProfile
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+# Opt-in timing spans and counters for the hot paths (loading, queries, layout, drawing).
+#
+#   GRAPH_VIEW_TRACE=1            log every span and write graph_view_trace.json at exit
+#   GRAPH_VIEW_TRACE=run.json     same, with the Chrome trace written to run.json
+#   GRAPH_VIEW_PROFILE=dir        also dump a cProfile file for each profiled operation
+#
+# The trace file opens in chrome://tracing or https://ui.perfetto.dev. When tracing is
+# off, span(), start() and count() return after a single flag check.
+
+DEFAULT_TRACE_PATH = 'graph_view_trace.json'
+
+logger = logging.getLogger(__name__)
+
+_enabled = False
+_trace_path = None
+_profile_dir = None
+_profile_next = False
+_events = []
+_events_lock = threading.Lock()
+_local = threading.local()
+_origin = time.perf_counter()
+
+class Span:
+    """One timed stage. Counters added while it is the innermost open span end up in its args."""
+
+    __slots__ = ('name', 'args', 'start', 'parent')
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.parent = None
+        self.start = None
+
+    def count(self, key, n=1):
+        self.args[key] = self.args.get(key, 0) + n
+
+    def open(self):
+        stack = _stack()
+        self.parent = stack[-1] if stack else None
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def end(self, **counters):
+        duration = time.perf_counter() - self.start
+        self.args.update(counters)
+        stack = _stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        elif self in stack:
+            stack.remove(self)
+        _record(self, duration)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc_info):
+        self.end()
+        return False
+
+class _NullSpan:
+    # Shared stand-in while tracing is off
+    __slots__ = ()
+
+    def count(self, key, n=1):
+        pass
+
+    def end(self, **counters):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+NULL_SPAN = _NullSpan()
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+def _record(span, duration):
+    event = {
+        'name': span.name,
+        'ph': 'X',
+        'ts': (span.start - _origin) * 1e6,
+        'dur': duration * 1e6,
+        'pid': os.getpid(),
+        'tid': threading.get_ident(),
+        'args': span.args,
+    }
+    with _events_lock:
+        _events.append(event)
+    depth = len(_stack())
+    details = ', '.join(f"{key}={value}" for key, value in span.args.items())
+    logger.info("%s%s %.1f ms%s", '  ' * depth, span.name, duration * 1000, f" ({details})" if details else "")
+
+def is_enabled():
+    return _enabled
+
+def enable(trace_path=None, profile_dir=None):
+    """Start recording spans; the trace goes to ``trace_path`` (default graph_view_trace.json)."""
+    global _enabled, _trace_path, _profile_dir
+    _enabled = True
+    _trace_path = trace_path or _trace_path or DEFAULT_TRACE_PATH
+    if profile_dir is not None:
+        _profile_dir = profile_dir
+    if not logger.handlers and not logging.getLogger().handlers:
+        logging.basicConfig(level=logging.INFO, format='[trace] %(message)s')
+    logger.setLevel(logging.INFO)
+
+def disable():
+    """Stop recording and write what was recorded so far; returns the trace path or None."""
+    global _enabled
+    _enabled = False
+    return write_trace()
+
+def span(name, **args):
+    """Context manager timing the enclosed block as ``name``, with optional static args."""
+    if not _enabled:
+        return NULL_SPAN
+    return Span(name, args)
+
+def start(name, **args):
+    """Open a span without a ``with`` block; call ``.end(**counters)`` on the result."""
+    if not _enabled:
+        return NULL_SPAN
+    return Span(name, args).open()
+
+def count(key, n=1):
+    """Add ``n`` to counter ``key`` of the innermost open span of this thread."""
+    if not _enabled:
+        return
+    stack = _stack()
+    if stack:
+        stack[-1].count(key, n)
+
+def traced(name=None):
+    """Decorator wrapping every call of the function in a span."""
+    def decorate(fn):
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with Span(label, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def profile_next():
+    """Profile the next operation wrapped in :func:`profile` or :func:`profiled`, once."""
+    global _profile_next
+    _profile_next = True
+
+class profile:
+    """
+    Context manager that runs the block under cProfile and dumps ``<name>-<time>.prof``.
+
+    Active when ``force`` is true, GRAPH_VIEW_PROFILE is set, or :func:`profile_next` was
+    called; open the dump with ``python -m pstats`` or snakeviz.
+    """
+
+    def __init__(self, name, force=False, directory=None):
+        global _profile_next
+        self.name = name
+        self.directory = directory or _profile_dir or '.'
+        self.profiler = None
+        if force or _profile_dir or _profile_next:
+            _profile_next = False
+            self.profiler = cProfile.Profile()
+
+    def __enter__(self):
+        if self.profiler is not None:
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.profiler is not None:
+            self.profiler.disable()
+            path = os.path.join(self.directory, f"{self.name}-{time.strftime('%Y%m%d-%H%M%S')}.prof")
+            self.profiler.dump_stats(path)
+            logger.warning("cProfile data for %s written to %s", self.name, path)
+        return False
+
+def profiled(name=None):
+    """Decorator tracing every call as a span and profiling it when :class:`profile` is active."""
+    def decorate(fn):
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not (_enabled or _profile_dir or _profile_next):
+                return fn(*args, **kwargs)
+            with profile(label), span(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def write_trace(path=None):
+    """Write the recorded spans as Chrome trace JSON; returns the path, or None if empty."""
+    path = path or _trace_path
+    with _events_lock:
+        events = list(_events)
+    if not events or not path:
+        return None
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file, default=str)
+    return path
+
+def reset():
+    with _events_lock:
+        _events.clear()
+
+_trace_setting = os.environ.get('GRAPH_VIEW_TRACE')
+if _trace_setting:
+    enable(None if _trace_setting.lower() in ('1', 'true', 'yes') else _trace_setting,
+           os.environ.get('GRAPH_VIEW_PROFILE'))
+elif os.environ.get('GRAPH_VIEW_PROFILE'):
+    _profile_dir = os.environ['GRAPH_VIEW_PROFILE']
+atexit.register(lambda: _enabled and write_trace())
@@ -0,0 +1,623 @@
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from heapq import heappush, heappop, heapreplace
+from itertools import count
+import numpy as np
+import graph_cache
+import instrumentation
+from database import DB_PATH
+from snapshot_file import ALIGN, database_stamp, decode_names, encode_names
+from tasks import checkpoint
+
+# Landmark distance oracle (ALT). The exact distance from a few landmark nodes to every
+# node is computed once and stored; by the triangle inequality, for any landmark L
+#
+#   |d(L, s) - d(L, t)|  <=  d(s, t)  <=  d(L, s) + d(L, t)
+#
+# so every pair of nodes gets a lower and an upper bound in O(landmarks). The lower
+# bound is the A* heuristic of exact point-to-point queries, and the upper bound alone
+# is the length of a real path through a landmark, so an approximate distance comes
+# with its own error bound.
+#
+# Distances are float32 to halve the file. Every bound is widened by REL_TOL of the
+# distances involved, which covers the rounding, so lower bounds stay admissible.
+#
+# File layout (little-endian): header, then 64-byte aligned blocks
+#   landmarks     int32[L]       node ids of the landmarks
+#   distances     float32[n, L]  row v holds d(landmark, v) for every landmark; inf if
+#                                unreachable
+#   name_offsets  int64[n + 1]
+#   names         node names the ids refer to, as in snapshot_file
+# The names let a stale file be remapped onto a changed graph and repaired.
+
+MAGIC = b'GVLMRK\x00\x00'
+FORMAT_VERSION = 2
+SUFFIX = '.landmarks'
+LANDMARKS = 16
+# Relative slack of all bounds and of the repair checks
+REL_TOL = 1e-6
+# Neighbor lists longer than this are filtered against the k-nearest cutoff in NumPy
+WIDE_ROW = 64
+# Components smaller than this get no landmark; a search explores them quickly anyway
+MIN_COMPONENT = 64
+
+# magic, version, flags, n, landmarks, graph version stamp, 4 block offsets, names length
+HEADER = struct.Struct('<8sIIQQq4QQ')
+
+class LandmarkOracle:
+    """
+    Landmark distances of one graph snapshot and the queries built on them.
+
+    :param snapshot: The :class:`~graph_snapshot.GraphSnapshot` the distances belong to.
+    :param landmarks: Node ids of the landmarks.
+    :param distances: ``float32[n, len(landmarks)]`` array; row ``v`` holds the
+        distances from every landmark to node ``v``.
+    """
+
+    def __init__(self, snapshot, landmarks, distances, stamp=None):
+        self.snapshot = snapshot
+        self.landmarks = np.asarray(landmarks, dtype=np.int32)
+        self.distances = distances
+        self.stamp = stamp
+
+    def _id(self, name):
+        i = self.snapshot.index.get(name)
+        if i is None:
+            raise KeyError(f"Node '{name}' not found in the graph.")
+        return i
+
+    def node_bounds(self, s, t):
+        """Lower and upper bound of the distance between node ids ``s`` and ``t``."""
+        if s == t:
+            return 0.0, 0.0
+        a = self.distances[s].astype(np.float64)
+        b = self.distances[t].astype(np.float64)
+        return float(_lower(a, b).max(initial=0.0)), float(_upper(a, b).min(initial=np.inf))
+
+    def bounds(self, source, target):
+        """
+        Bounds of the distance between two nodes, in O(landmarks) without a search.
+
+        :return: ``(lower, upper)``; ``lower`` is inf when the nodes are provably not
+            connected, ``upper`` is inf when no landmark reaches both.
+        """
+        return self.node_bounds(self._id(source), self._id(target))
+
+    def distance(self, source, target, exact=True):
+        """
+        Distance between two nodes.
+
+        :param exact: Run an A* search guided by the landmark bounds. Otherwise return
+            the upper bound, the length of a path through a landmark, without a search;
+            when no landmark reaches both nodes the search runs anyway.
+        :return: ``(distance, error)``: the true distance lies in
+            ``[distance - error, distance]``; ``error`` is 0 for exact answers.
+        """
+        s, t = self._id(source), self._id(target)
+        lower, upper = self.node_bounds(s, t)
+        if not exact and upper < np.inf:
+            return upper, upper - lower
+        if lower == np.inf:
+            return np.inf, 0.0
+        return self.astar(s, t)[0], 0.0
+
+    def astar(self, s, t):
+        """
+        A* search from node id ``s`` to ``t`` with the landmark lower bound as heuristic.
+
+        :return: ``(distance, path)`` with ``path`` a list of node names, or
+            ``(inf, [])`` when ``t`` is unreachable.
+        """
+        indptr, indices, weights = self.snapshot.indptr, self.snapshot.indices, self.snapshot.weights
+        distances = self.distances
+        target = distances[t].astype(np.float64)
+
+        # The slack keeps the heuristic admissible but not strictly consistent, so a
+        # node may be expanded again when a shorter path to it turns up
+        best = {s: 0.0}
+        parent = {s: None}
+        expanded = 0
+        c = count()
+        fringe = [(0.0, next(c), 0.0, s)]
+        while fringe:
+            _, _, d, v = heappop(fringe)
+            if d > best[v]:
+                continue
+            if v == t:
+                instrumentation.count('expanded', expanded)
+                path = []
+                while v is not None:
+                    path.append(self.snapshot.names[v])
+                    v = parent[v]
+                return d, path[::-1]
+            expanded += 1
+            lo, hi = indptr[v], indptr[v + 1]
+            neighbors = indices[lo:hi]
+            # Heuristic of all neighbors in one call
+            h = _lower(distances[neighbors].astype(np.float64), target).max(axis=1, initial=0.0)
+            for u, cost, hu in zip(neighbors.tolist(), weights[lo:hi].tolist(), h.tolist()):
+                du = d + cost
+                if du < best.get(u, np.inf):
+                    best[u] = du
+                    parent[u] = v
+                    heappush(fringe, (du + hu, next(c), du, u))
+        return np.inf, []
+
+    def k_nearest(self, source, k):
+        """
+        Same result as :func:`nearest.k_nearest`, from a search that stops pushing
+        nodes that cannot be among the ``k`` nearest.
+
+        Every distinct node with a known upper bound on its distance (the landmarks,
+        with their exact stored distances, and each node when the search first reaches
+        it) narrows the distance of the k-th nearest node to the k-th smallest such
+        bound. Neighbors farther than that are never pushed, which is what a search
+        from a hub otherwise spends most of its time on.
+        """
+        s = self._id(source)
+        if k <= 0:
+            return []
+        indptr, indices, weights = self.snapshot.indptr, self.snapshot.indices, self.snapshot.weights
+        names = self.snapshot.names
+
+        # Max-heap (negated) of the k smallest upper bounds of distinct nodes
+        bounds = []
+        bounded = set()
+
+        def bound(u, d):
+            if len(bounds) < k:
+                heappush(bounds, -d)
+            elif d < -bounds[0]:
+                heapreplace(bounds, -d)
+            else:
+                return
+            bounded.add(u)
+
+        for landmark, d in zip(self.landmarks.tolist(), _upper(self.distances[s].astype(np.float64), 0.0).tolist()):
+            if landmark != s and d < np.inf:
+                bound(landmark, d)
+
+        result = []
+        settled = set()
+        seen = {s: 0}
+        c = count()
+        fringe = [(0, next(c), s)]
+        while fringe and len(result) < k:
+            d, _, v = heappop(fringe)
+            if v in settled:
+                continue
+            settled.add(v)
+            if v != s:
+                result.append((names[v], d))
+            lo, hi = indptr[v], indptr[v + 1]
+            if hi - lo > max(WIDE_ROW, k):
+                # Hub: bound by its k closest neighbors and drop the rest in NumPy
+                ids = indices[lo:hi]
+                through = d + weights[lo:hi]
+                closest = np.argpartition(through, k - 1)[:k]
+                for u, vu_dist in zip(ids[closest].tolist(), through[closest].tolist()):
+                    if u != s and u not in seen and u not in bounded:
+                        bound(u, vu_dist)
+                keep = np.flatnonzero(through <= (-bounds[0] if len(bounds) == k else np.inf))
+                row = zip(ids[keep].tolist(), through[keep].tolist())
+            else:
+                row = ((u, d + cost) for u, cost in zip(indices[lo:hi].tolist(), weights[lo:hi].tolist()))
+            cutoff = -bounds[0] if len(bounds) == k else np.inf
+            for u, vu_dist in row:
+                if vu_dist > cutoff:
+                    continue
+                if u not in settled and (u not in seen or vu_dist < seen[u]):
+                    if u not in seen and u not in bounded and u != s:
+                        bound(u, vu_dist)
+                        cutoff = -bounds[0] if len(bounds) == k else np.inf
+                    seen[u] = vu_dist
+                    heappush(fringe, (vu_dist, next(c), u))
+        instrumentation.count('pushed', len(seen))
+        return result
+
+def _lower(a, b):
+    """Per-landmark lower bounds ``|a - b|`` with rounding slack; inf where exactly one is inf."""
+    with np.errstate(invalid='ignore'):
+        diff = np.abs(a - b) - REL_TOL * (a + b)
+    return np.where(np.isfinite(a) & np.isfinite(b), diff, np.where(np.isinf(a) ^ np.isinf(b), np.inf, 0.0))
+
+def _upper(a, b):
+    """Per-landmark upper bounds ``a + b`` with rounding slack."""
+    return (a + b) * (1 + REL_TOL)
+
+def shortest_distances(snapshot, source):
+    """Dijkstra from node id ``source`` over the whole graph; ``float64[n]``, inf if unreachable."""
+    return _dijkstra(snapshot, np.full(len(snapshot.names), np.inf), [(0.0, source)])
+
+def _dijkstra(snapshot, dist, seeds):
+    """
+    Settle nodes from ``seeds`` (``(distance, node)`` pairs), lowering ``dist`` in place.
+
+    With ``dist`` all inf this is a plain single-source search; with the distances of
+    a previous graph it only visits the nodes whose distance went down.
+    """
+    indptr = snapshot.indptr.tolist()
+    indices = snapshot.indices
+    weights = snapshot.weights
+    # Plain lists: indexing a NumPy array per relaxation costs several times more
+    best = dist.tolist()
+    fringe = []
+    for d, v in seeds:
+        best[v] = d
+        heappush(fringe, (d, v))
+    settled = 0
+    while fringe:
+        d, v = heappop(fringe)
+        if d > best[v]:
+            continue
+        settled += 1
+        lo, hi = indptr[v], indptr[v + 1]
+        for u, cost in zip(indices[lo:hi].tolist(), weights[lo:hi].tolist()):
+            du = d + cost
+            if du < best[u] - REL_TOL * du:
+                best[u] = du
+                heappush(fringe, (du, u))
+    instrumentation.count('settled', settled)
+    dist[:] = best
+    return dist
+
+def _row_min(snapshot, values):
+    """Minimum of ``values`` (one per adjacency entry) over each node's neighbors."""
+    indptr = snapshot.indptr
+    result = np.full(len(snapshot.names), np.inf)
+    nonempty = indptr[:-1] < indptr[1:]
+    if len(values):
+        result[nonempty] = np.minimum.reduceat(values, indptr[:-1][nonempty])
+    return result
+
+def _is_valid(snapshot, dist, landmark):
+    """
+    Whether ``dist`` are the exact distances from ``landmark`` (within REL_TOL).
+
+    They are when no edge can lower any of them and every other reached node has a
+    neighbor it is reached through. With positive weights, following those neighbors
+    always ends at the landmark, so every distance is the length of a real path.
+    """
+    through = _row_min(snapshot, dist[snapshot.indices] + snapshot.weights)
+    tol = REL_TOL * np.maximum(np.where(np.isfinite(dist), dist, 0.0), 1.0)
+    reached = np.isfinite(dist)
+    reached[landmark] = False
+    if dist[landmark] != 0 or np.any(through < dist - tol):
+        return False
+    return bool(np.all(np.abs(through[reached] - dist[reached]) <= tol[reached]))
+
+def _components(snapshot):
+    """Component label of every node: the smallest node id in its component."""
+    n = len(snapshot.names)
+    labels = np.arange(n)
+    rows = np.repeat(labels, np.diff(snapshot.indptr))
+    while True:
+        # Every round takes the smallest label among the neighbors, then jumps along labels
+        updated = labels.copy()
+        np.minimum.at(updated, rows, labels[snapshot.indices])
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+def _farthest(covered, spread):
+    """Node whose distance to the chosen landmarks (and batch) is largest, or None."""
+    score = np.minimum(covered, spread)
+    score[~np.isfinite(covered)] = -1.0
+    best = int(np.argmax(score))
+    return best if score[best] > 0 else None
+
+# Worker side of the parallel build; the snapshot arrives once through the initializer
+_worker_snapshot = None
+
+def _init_worker(snapshot):
+    global _worker_snapshot
+    _worker_snapshot = snapshot
+
+def _worker_distances(source):
+    return shortest_distances(_worker_snapshot, source).astype(np.float32)
+
+def _run_searches(snapshot, sources, processes):
+    if processes <= 1 or len(sources) < 2:
+        return [shortest_distances(snapshot, source).astype(np.float32) for source in sources]
+    with ProcessPoolExecutor(max_workers=min(processes, len(sources)), initializer=_init_worker,
+                             initargs=(snapshot,)) as pool:
+        return list(pool.map(_worker_distances, sources))
+
+def _node_major(rows, n):
+    """Stack per-landmark distance rows into the ``float32[n, L]`` layout."""
+    return np.ascontiguousarray(np.array(rows, dtype=np.float32).reshape(len(rows), n).T)
+
+@instrumentation.traced('build_landmarks')
+def build_oracle(snapshot, landmarks=LANDMARKS, processes=None, seed=0):
+    """
+    Select landmarks and compute their distances to every node.
+
+    Every component of at least :data:`MIN_COMPONENT` nodes gets a random first
+    landmark. The rest are chosen in rounds of ``processes`` by the farthest-point
+    rule: the node farthest from all landmarks so far, where nodes picked in the same
+    round also count, through their landmark lower bounds, so a round spreads out. The
+    searches of a round run in parallel.
+
+    :param processes: Worker processes, defaults to the CPU count.
+    """
+    n = len(snapshot.names)
+    processes = processes or os.cpu_count() or 1
+    rng = np.random.default_rng(seed)
+    labels = _components(snapshot)
+    sizes = np.bincount(labels, minlength=n)
+    roots = [int(r) for r in np.argsort(-sizes, kind='stable') if sizes[r] >= MIN_COMPONENT][:landmarks]
+
+    chosen = [int(rng.choice(np.flatnonzero(labels == root))) for root in roots]
+    rows = _run_searches(snapshot, chosen, processes)
+    checkpoint(len(chosen), landmarks, 'landmarks')
+    covered = np.min(rows, axis=0).astype(np.float64) if rows else np.full(n, np.inf)
+    while len(chosen) < landmarks and rows:
+        distances = np.array(rows)
+        batch = []
+        spread = np.full(n, np.inf)
+        for _ in range(min(processes, landmarks - len(chosen))):
+            candidate = _farthest(covered, spread)
+            if candidate is None or candidate in chosen or candidate in batch:
+                break
+            batch.append(candidate)
+            # Lower bounds of the distance to the new pick, from the finished landmarks
+            spread = np.minimum(spread, _lower(distances.astype(np.float64),
+                                               distances[:, candidate:candidate + 1].astype(np.float64)).max(axis=0))
+        if not batch:
+            break
+        new_rows = _run_searches(snapshot, batch, processes)
+        chosen += batch
+        rows += new_rows
+        covered = np.minimum(covered, np.min(new_rows, axis=0))
+        checkpoint(len(chosen), landmarks, 'landmarks')
+
+    return LandmarkOracle(snapshot, chosen, _node_major(rows, n))
+
+@instrumentation.traced('update_landmarks')
+def update_oracle(oracle, snapshot, processes=None):
+    """
+    Carry an oracle over to a changed graph, mostly without full searches.
+
+    The old distances are mapped onto the new node ids by name. New edges and lowered
+    weights can only shorten distances, so a search seeded at the nodes they improve
+    repairs each landmark locally. Removed edges or nodes and raised weights can make
+    old distances too short; a landmark whose repaired distances fail the exactness
+    check is recomputed from scratch, as is a landmark whose node was deleted.
+
+    :return: ``(oracle, stats)`` with the number of landmarks repaired and recomputed.
+    """
+    old = oracle.snapshot
+    n = len(snapshot.names)
+    new_ids = np.array([snapshot.index.get(name, -1) for name in old.names], dtype=np.int64)
+    present = new_ids >= 0
+
+    landmarks = []
+    rows = []
+    recompute = []
+    stats = {'repaired': 0, 'recomputed': 0}
+    positive = not len(snapshot.weights) or snapshot.weights.min() > REL_TOL
+    for done, (landmark, old_row) in enumerate(zip(oracle.landmarks.tolist(), oracle.distances.T)):
+        checkpoint(done, len(oracle.landmarks), 'landmarks')
+        new_landmark = int(new_ids[landmark])
+        if new_landmark < 0:
+            # The landmark node was deleted; its replacement is chosen below
+            continue
+        landmarks.append(new_landmark)
+        dist = np.full(n, np.inf)
+        dist[new_ids[present]] = old_row[present]
+        if not positive:
+            recompute.append(len(rows))
+            rows.append(None)
+            continue
+        improved = dist[snapshot.indices] + snapshot.weights
+        through = _row_min(snapshot, improved)
+        seeds = np.flatnonzero(through * (1 + REL_TOL) < dist)
+        _dijkstra(snapshot, dist, zip(through[seeds].tolist(), seeds.tolist()))
+        if _is_valid(snapshot, dist, new_landmark):
+            rows.append(dist.astype(np.float32))
+            stats['repaired'] += 1
+        else:
+            recompute.append(len(rows))
+            rows.append(None)
+
+    processes = processes or os.cpu_count() or 1
+    for i, row in zip(recompute, _run_searches(snapshot, [landmarks[i] for i in recompute], processes)):
+        rows[i] = row
+    stats['recomputed'] = len(recompute)
+
+    if not rows:
+        # Every landmark node was deleted
+        oracle = build_oracle(snapshot, len(oracle.landmarks), processes)
+        stats['recomputed'] = len(oracle.landmarks)
+        return oracle, stats
+
+    # Replace deleted landmarks by the nodes farthest from the remaining ones
+    missing = len(oracle.landmarks) - len(landmarks)
+    if missing:
+        covered = np.min(rows, axis=0).astype(np.float64)
+        for _ in range(missing):
+            candidate = _farthest(covered, np.full(n, np.inf))
+            if candidate is None or candidate in landmarks:
+                break
+            row = shortest_distances(snapshot, candidate).astype(np.float32)
+            landmarks.append(candidate)
+            rows.append(row)
+            covered = np.minimum(covered, row)
+            stats['recomputed'] += 1
+
+    return LandmarkOracle(snapshot, landmarks, _node_major(rows, n)), stats
+
+def oracle_path(db_path=DB_PATH):
+    return db_path + SUFFIX
+
+def _aligned(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+def write_oracle(oracle, path, stamp=0):
+    """Write ``oracle`` and the node names it refers to; replaced atomically like snapshot files."""
+    name_offsets, names_blob, flags = encode_names(oracle.snapshot.names)
+    blocks = [
+        np.ascontiguousarray(oracle.landmarks, dtype='<i4'),
+        np.ascontiguousarray(oracle.distances, dtype='<f4'),
+        name_offsets,
+        names_blob,
+    ]
+    offsets = []
+    position = _aligned(HEADER.size)
+    for block in blocks:
+        offsets.append(position)
+        position = _aligned(position + (block.nbytes if isinstance(block, np.ndarray) else len(block)))
+
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, flags, len(oracle.snapshot.names), len(oracle.landmarks),
+                         stamp, *offsets, len(names_blob))
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as file:
+        file.write(header)
+        for offset, block in zip(offsets, blocks):
+            file.write(b'\x00' * (offset - file.tell()))
+            file.write(memoryview(block) if isinstance(block, np.ndarray) else block)
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        os.remove(tmp_path)
+        raise
+
+def read_oracle(path, snapshot=None):
+    """
+    Map an oracle file.
+
+    :param snapshot: Snapshot to attach when the caller knows it matches the file (same
+        stamp); otherwise one is built from the stored names with no edges, which is
+        enough for :func:`update_oracle`.
+    :return: ``(oracle, stamp)``
+    :raises ValueError: If the file is not an oracle file of this format version.
+    """
+    with open(path, 'rb') as file:
+        data = file.read(HEADER.size)
+        fields = HEADER.unpack(data) if len(data) == HEADER.size else None
+        if fields is None or fields[0] != MAGIC or fields[1] != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a landmark file (format {FORMAT_VERSION})")
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    flags, n, count_, stamp = fields[2], fields[3], fields[4], fields[5]
+    landmarks_at, distances_at, name_offsets_at, names_at = fields[6:10]
+    landmarks = np.frombuffer(mapped, dtype='<i4', count=count_, offset=landmarks_at)
+    distances = np.frombuffer(mapped, dtype='<f4', count=n * count_, offset=distances_at).reshape(n, count_)
+    if snapshot is None:
+        from graph_snapshot import GraphSnapshot
+        blob = mapped[names_at:names_at + fields[10]]
+        names = decode_names(blob, n, flags, np.frombuffer(mapped, dtype='<i8', count=n + 1, offset=name_offsets_at))
+        snapshot = GraphSnapshot.from_edges(names, [], [], [])
+    return LandmarkOracle(snapshot, landmarks, distances, stamp), stamp
+
+def read_stamp(path):
+    with open(path, 'rb') as file:
+        data = file.read(HEADER.size)
+    if len(data) < HEADER.size:
+        return None
+    fields = HEADER.unpack(data)
+    return fields[5] if fields[0] == MAGIC and fields[1] == FORMAT_VERSION else None
+
+def load_oracle(db_path=DB_PATH, snapshot=None):
+    """
+    Return the oracle of ``db_path``, or None if it was never built.
+
+    An oracle file written for an older graph version (see :func:`database.get_graph_version`)
+    is carried over with :func:`update_oracle` and rewritten; writes that leave nodes and
+    links alone keep the file as it is.
+
+    :param snapshot: Current snapshot of the database, by default from the graph cache.
+    """
+    path = oracle_path(db_path)
+    if not os.path.exists(path):
+        return None
+    # Taken before the snapshot, as in snapshot_file.load_cached_snapshot
+    stamp = database_stamp(db_path)
+    snapshot = snapshot if snapshot is not None else graph_cache.get_snapshot(db_path)
+    if read_stamp(path) == stamp:
+        return read_oracle(path, snapshot)[0]
+    oracle, stats = update_oracle(read_oracle(path)[0], snapshot)
+    oracle.stamp = stamp
+    try:
+        write_oracle(oracle, path, stamp)
+    except OSError as e:
+        print(f"Could not write landmark file {path}: {e}")
+    return oracle
+
+# Oracle per database, kept while the graph cache returns the same snapshot
+_oracles = {}
+
+def get_oracle(db_path=DB_PATH):
+    """Cached :func:`load_oracle` for the current snapshot of ``db_path``, or None."""
+    snapshot = graph_cache.get_snapshot(db_path)
+    cached = _oracles.get(db_path)
+    if cached is not None and cached.snapshot is snapshot:
+        return cached
+    oracle = load_oracle(db_path, snapshot)
+    if oracle is None:
+        _oracles.pop(db_path, None)
+    else:
+        _oracles[db_path] = oracle
+    return oracle
+
+def refresh_oracle(db_path=DB_PATH):
+    """
+    Bring the oracle file of ``db_path`` up to date after a write.
+
+    Does nothing until :func:`build_oracle` has been run for this database.
+
+    :return: The update stats, or None.
+    """
+    path = oracle_path(db_path)
+    if not os.path.exists(path):
+        return None
+    # Only node and link changes move the stamp; positions or metrics writes keep the file
+    stamp = database_stamp(db_path)
+    if read_stamp(path) == stamp:
+        return None
+    oracle, stats = update_oracle(read_oracle(path)[0], graph_cache.get_snapshot(db_path))
+    write_oracle(oracle, path, stamp)
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the landmark distance oracle of a database.")
+    parser.add_argument('command', choices=['build', 'update', 'query'])
+    parser.add_argument('nodes', nargs='*', help="query: a source, and a target for a distance query")
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--landmarks', type=int, default=LANDMARKS)
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--k', type=int, default=20)
+    parser.add_argument('--approx', action='store_true', help="distance queries: answer from the bounds without searching")
+    args = parser.parse_intermixed_args(argv)
+
+    started = time.perf_counter()
+    if args.command == 'build':
+        stamp = database_stamp(args.db)
+        oracle = build_oracle(graph_cache.get_snapshot(args.db), args.landmarks, args.processes)
+        write_oracle(oracle, oracle_path(args.db), stamp)
+        print(f"{len(oracle.landmarks)} landmarks written to {oracle_path(args.db)} "
+              f"in {time.perf_counter() - started:.1f}s")
+    elif args.command == 'update':
+        print(refresh_oracle(args.db) or "Landmark file is current or missing")
+    else:
+        if not args.nodes:
+            parser.error("query needs a source node")
+        oracle = load_oracle(args.db)
+        if oracle is None:
+            parser.error(f"no landmark file for {args.db}; run the build command first")
+        started = time.perf_counter()
+        if len(args.nodes) > 1:
+            distance, error = oracle.distance(args.nodes[0], args.nodes[1], exact=not args.approx)
+            print(f"{distance:.4f} (error <= {error:.4f})")
+        else:
+            for i, (node, distance) in enumerate(oracle.k_nearest(args.nodes[0], args.k)):
+                print(f"{i + 1}. {node}: {distance}")
+        print(f"{(time.perf_counter() - started) * 1000:.2f} ms")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+import numpy as np
+from tasks import checkpoint
+
+def close_pairs(P, threshold):
+    """
+    Find all node pairs closer than ``threshold`` on both axes, using a neighbor grid.
+
+    :param P: (n, 2) array of positions.
+    :param threshold: Cell size and per-axis distance limit.
+    :return: Two index arrays ``(a, b)`` with ``a < b`` for every close pair.
+    """
+    n = len(P)
+    if n < 2:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+
+    cells = np.floor(P / threshold).astype(np.int64)
+    cells -= cells.min(axis=0)
+    # Shift y by one so the -1 neighbor offset never wraps into the previous column
+    width = int(cells[:, 1].max()) + 3
+    keys = cells[:, 0] * width + cells[:, 1] + 1
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+
+    first, second = [], []
+    # Own cell plus half of the 8 neighbors, so every pair of cells is visited once
+    for ox, oy in ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1)):
+        target = keys + ox * width + oy
+        lo = np.searchsorted(sorted_keys, target, side='left')
+        hi = np.searchsorted(sorted_keys, target, side='right')
+        counts = hi - lo
+        total = int(counts.sum())
+        if not total:
+            continue
+        i = np.repeat(np.arange(n), counts)
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        j = order[np.repeat(lo, counts) + offsets]
+        if (ox, oy) == (0, 0):
+            keep = i < j
+            i, j = i[keep], j[keep]
+        first.append(i)
+        second.append(j)
+
+    if not first:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    i = np.concatenate(first)
+    j = np.concatenate(second)
+    a = np.minimum(i, j)
+    b = np.maximum(i, j)
+    close = np.all(np.abs(P[a] - P[b]) < threshold, axis=1)
+    return a[close], b[close]
+
+def refine_layout(pos, G, max_iterations=50, threshold=0.1, push_step=0.02,
+                  target_distance=0.4, long_weight=7, long_step=0.1,
+                  short_weight=3, short_step=0.03, fixed=()):
+    """
+    Spread overlapping nodes and stretch or shrink edges by weight, in place.
+
+    Array version of the post-processing in ``plot_combined_local_graph_2D``. Each
+    iteration pushes every node that sits within ``threshold`` of an earlier node by
+    ``push_step`` away from it, then pushes apart the ends of heavy edges
+    (``weight > long_weight``) shorter than ``target_distance`` and pulls together the
+    ends of light edges (``weight < short_weight``) longer than it. All moves of an
+    iteration are applied at once. It stops as soon as an iteration finds no
+    overlapping nodes, or after ``max_iterations``.
+
+    Nodes in ``fixed`` never move: of an overlapping pair the other node is pushed, and
+    pairs of two fixed nodes are left as they are.
+
+    :param pos: Dict of node -> (x, y); updated in place.
+    :param G: Graph whose edges carry a 'weight' attribute.
+    :param fixed: Nodes to keep in place, e.g. the ones restored from the position cache.
+    :return: Number of iterations used.
+    """
+    nodes = list(G.nodes())
+    if not nodes:
+        return 0
+    index = {node: i for i, node in enumerate(nodes)}
+    P = np.array([pos[node] for node in nodes], dtype=np.float64)
+
+    edges = list(G.edges(data='weight'))
+    u = np.array([index[e[0]] for e in edges], dtype=np.int64)
+    v = np.array([index[e[1]] for e in edges], dtype=np.int64)
+    w = np.array([e[2] for e in edges], dtype=np.float64)
+    long_edges = w > long_weight
+    short_edges = w < short_weight
+    free = np.array([node not in fixed for node in nodes], dtype=bool)
+
+    iterations = 0
+    for iterations in range(1, max_iterations + 1):
+        checkpoint(iterations - 1, max_iterations, 'refine')
+        # Push one node of every overlapping pair away from the other
+        a, b = close_pairs(P, threshold)
+        movable = free[a] | free[b]
+        a, b = a[movable], b[movable]
+        # b is the node that moves; swap the pair when only a is free
+        a, b = np.where(free[b], a, b), np.where(free[b], b, a)
+        if len(a):
+            np.add.at(P, b, np.where(P[b] > P[a], push_step, -push_step))
+
+        # Check edge weights and node distances
+        if len(u):
+            sign = np.where(P[v] > P[u], 1.0, -1.0)
+            distance = np.hypot(*(P[u] - P[v]).T)
+            push = (long_edges & (distance < target_distance))[:, None]
+            pull = (short_edges & (distance > target_distance))[:, None]
+            move_u = np.where(push, -long_step * sign, 0.0) + np.where(pull, short_step * sign, 0.0)
+            np.add.at(P, u, move_u * free[u, None])
+            np.add.at(P, v, -move_u * free[v, None])
+
+        if not len(a):
+            break
+
+    for node, i in index.items():
+        pos[node] = (P[i, 0], P[i, 1])
+    return iterations
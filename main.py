@@ -1,25 +1,72 @@
-from visualization import find_and_plot_multiple_nodes
+import time
+STARTED = time.perf_counter()
+
 import tkinter as tk
 import os
+import sys
 import sqlite3
+import threading
+import instrumentation
+import tasks
 # from database import initialize_database, DB_PATH
+from database import upgrade_database
 
 # Specify the database file path
 DB_PATH = os.path.join(os.path.dirname(__file__), 'graph_data.db')
 
+# `python main.py --timing` reports where startup time goes; for a per-module
+# breakdown of the imports use `python -X importtime main.py`
+TIMING = '--timing' in sys.argv
+
+def report_timing(label):
+    if TIMING:
+        print(f"[startup] {label}: {time.perf_counter() - STARTED:.3f}s after start")
+
 def connect_to_database():
     if not os.path.exists(DB_PATH):
         raise FileNotFoundError(f"Database file not found at {DB_PATH}")
+    # Migrate databases written with an older schema in place
+    upgrade_database(DB_PATH)
     conn = sqlite3.connect(DB_PATH)
     return conn
 
+def preload():
+    # Runs on a background thread while the window draws, so the first click does not
+    # pay for numpy/networkx, the graph snapshot or the visualization module
+    import graph_cache
+    graph_cache.get_snapshot(DB_PATH)
+    report_timing("graph snapshot loaded")
+    import visualization
+    report_timing("visualization module loaded")
+
+def compare_nodes(root):
+    # Heavy modules are imported on first use; usually preload() already did it
+    from visualization import find_and_plot_multiple_nodes
+    find_and_plot_multiple_nodes(root)
+
+def vault_overview(root):
+    from overview import open_overview
+    open_overview(root)
+
+def toggle_tracing(enabled):
+    # Same as starting with GRAPH_VIEW_TRACE=1; the trace file is written when switched off
+    if enabled:
+        instrumentation.enable()
+    else:
+        path = instrumentation.disable()
+        if path:
+            print(f"Trace written to {path}")
+
 def main():
     conn = connect_to_database()
     print(f"Connected to database at {DB_PATH}")
-    
+    report_timing("database ready")
+
+    threading.Thread(target=preload, name="preload", daemon=True).start()
+
     root = tk.Tk()
     root.title("Graph Builder")
-    root.geometry("500x200")  # Set window size root.geometry("500x350")
+    root.geometry("500x280")  # Set window size root.geometry("500x350")
 
     style = {
         'font': ('Montserrat', 15),
@@ -28,13 +75,34 @@ def main():
         'bg': '#2B7396',
         'fg': 'lightgreen',
     }
-    
-    multiple_nodes_button = tk.Button(root, text="Compare 5 Nodes", command=lambda: find_and_plot_multiple_nodes(root), **style)
+
+    multiple_nodes_button = tk.Button(root, text="Compare Nodes", command=lambda: compare_nodes(root), **style)
     multiple_nodes_button.pack(pady=10)
 
+    # Whole vault as a graph of communities; the hierarchy is built on first use
+    overview_button = tk.Button(root, text="Vault Overview", command=lambda: vault_overview(root), **style)
+    overview_button.pack(pady=(0, 10))
+
+    # Profiling toggles: span timings go to the console and a Chrome trace file, and the
+    # next 2D/3D plot can be run under cProfile
+    trace_var = tk.BooleanVar(value=instrumentation.is_enabled())
+    tools_frame = tk.Frame(root)
+    tools_frame.pack()
+    tk.Checkbutton(tools_frame, text="Trace timings", variable=trace_var,
+                   command=lambda: toggle_tracing(trace_var.get())).pack(side=tk.LEFT, padx=5)
+    tk.Button(tools_frame, text="Profile next plot", command=instrumentation.profile_next).pack(side=tk.LEFT, padx=5)
+
     conn.close()
-    
+
+    # Heavy work runs on the task pool; stop it at the next checkpoint on exit
+    scheduler = tasks.get_scheduler(root)
+    def close():
+        scheduler.cancel_all()
+        root.destroy()
+    root.protocol("WM_DELETE_WINDOW", close)
+
+    root.after_idle(report_timing, "window shown")
     root.mainloop()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
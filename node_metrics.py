@@ -0,0 +1,302 @@
+import argparse
+import sqlite3
+import sys
+import time
+from heapq import heappush, heappop
+import graph_cache
+from database import DB_PATH
+from nearest import multi_source_k_nearest
+
+# Columns that can be sorted and filtered on. dist5/10/20 are the average distances to
+# the 5/10/20 nearest other nodes (as in analysis.calculate_node_metrics) and radius is
+# the distance to the 20th nearest node, NULL when fewer than 20 nodes are reachable.
+METRIC_COLUMNS = ('degree', 'dist5', 'dist10', 'dist20', 'radius')
+K = 20
+
+# Below this many nodes a recompute runs in-process instead of starting a worker pool
+SERIAL_LIMIT = 200
+
+def create_metrics_table(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS node_metrics
+                    (node TEXT PRIMARY KEY, degree INTEGER, dist5 REAL, dist10 REAL,
+                     dist20 REAL, radius REAL)''')
+    for column in METRIC_COLUMNS[:4]:
+        # Sorting by (column, node) is read straight from the index
+        conn.execute(f"CREATE INDEX IF NOT EXISTS node_metrics_{column} ON node_metrics({column}, node)")
+
+def _has_metrics_table(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'node_metrics'").fetchone() is not None
+
+def _average(lengths, n):
+    lengths = lengths[:n]
+    return sum(lengths) / len(lengths) if lengths else None
+
+def compute_metrics(G, nodes, processes=None):
+    """
+    Compute the metric rows of ``nodes`` on the snapshot ``G``.
+
+    :return: List of ``(node, degree, dist5, dist10, dist20, radius)`` tuples.
+    """
+    nodes = [node for node in nodes if node in G]
+    if len(nodes) < SERIAL_LIMIT:
+        processes = 1
+    nearest_by_node, _ = multi_source_k_nearest(G, nodes, K, processes=processes,
+                                                chunksize=max(1, min(500, len(nodes) // 64)))
+    rows = []
+    for node in nodes:
+        lengths = [d for _, d in nearest_by_node[node]]
+        radius = lengths[K - 1] if len(lengths) >= K else None
+        rows.append((node, G.degree(node), _average(lengths, 5), _average(lengths, 10),
+                     _average(lengths, 20), radius))
+    return rows
+
+def _write_rows(rows, db_path, clear=False):
+    def write(conn):
+        create_metrics_table(conn)
+        if clear:
+            conn.execute("DELETE FROM node_metrics")
+        conn.executemany("INSERT OR REPLACE INTO node_metrics VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    # Derived data: written through the graph cache's connection so the graph stays loaded
+    graph_cache.side_write(write, db_path)
+
+def rebuild_metrics(db_path=DB_PATH, processes=None, batch_size=20000, progress=None):
+    """
+    Fill ``node_metrics`` for every node of the graph, in parallel batches.
+
+    :param processes: Worker processes, defaults to the CPU count.
+    :param batch_size: Nodes computed and committed per batch.
+    :param progress: Optional ``progress(stage, done, total, elapsed)`` callback, as in
+        :func:`bulk_ingest.bulk_ingest`.
+    :return: Number of nodes written.
+    """
+    G = graph_cache.get_snapshot(db_path)
+    nodes = list(G.nodes())
+    start = time.perf_counter()
+    _write_rows([], db_path, clear=True)
+    for i in range(0, len(nodes), batch_size):
+        _write_rows(compute_metrics(G, nodes[i:i + batch_size], processes), db_path)
+        if progress:
+            progress("metrics", min(i + batch_size, len(nodes)), len(nodes), time.perf_counter() - start)
+    return len(nodes)
+
+def _distances_to(G, sources, cutoff):
+    # Multi-source Dijkstra: distance from every node within ``cutoff`` to the closest source
+    indptr, indices, weights, names = G.indptr, G.indices, G.weights, G.names
+    dist = {}
+    fringe = [(0.0, G.index[source]) for source in sources if source in G]
+    while fringe:
+        d, v = heappop(fringe)
+        if v in dist:
+            continue
+        dist[v] = d
+        lo, hi = indptr[v], indptr[v + 1]
+        for u, w in zip(indices[lo:hi].tolist(), weights[lo:hi].tolist()):
+            du = d + w
+            if u not in dist and (cutoff is None or du <= cutoff):
+                heappush(fringe, (du, u))
+    return {names[v]: d for v, d in dist.items()}
+
+def _in_changed_components(G, nodes, changed):
+    # Subset of ``nodes`` that share a connected component with a node of ``changed``.
+    # Each search stops at the first changed node it meets, so the small components of
+    # nodes with fewer than K reachable nodes are all it visits
+    indptr, indices, index = G.indptr, G.indices, G.index
+    targets = {index[node] for node in changed if node in G}
+    answer = {}
+    for node in nodes:
+        if node not in G or index[node] in answer:
+            continue
+        start = index[node]
+        seen, stack, found = {start}, [start], start in targets
+        while stack and not found:
+            v = stack.pop()
+            for u in indices[indptr[v]:indptr[v + 1]].tolist():
+                if u not in seen:
+                    seen.add(u)
+                    stack.append(u)
+                    if u in targets:
+                        found = True
+                        break
+        answer.update(dict.fromkeys(seen, found))
+    return {node for node in nodes if node in G and answer[index[node]]}
+
+def affected_nodes(G, changed, db_path=DB_PATH):
+    """
+    Nodes whose stored metrics may be out of date after edges at ``changed`` nodes changed.
+
+    A node's 20 nearest neighbors can only change if a changed edge lies within its
+    stored ``radius``. Both ends of a changed edge are in ``changed``, so it suffices that
+    the node's distance to the closest changed node is at most its radius. That distance
+    is the same before and after the change: the shortest path to the closest changed
+    node never crosses a changed edge. Nodes with no stored row count as having an
+    infinite radius.
+
+    Nodes with fewer than 20 reachable nodes have no radius; they are affected when their
+    component holds a changed node, which is checked separately so that the search from
+    the changed nodes stays bounded by the largest stored radius.
+
+    :param G: Current snapshot.
+    :param changed: Endpoint names of the added, reweighted or removed edges.
+    """
+    conn = sqlite3.connect(db_path)
+    if not _has_metrics_table(conn):
+        conn.close()
+        return set()
+    (max_radius,) = conn.execute("SELECT MAX(radius) FROM node_metrics").fetchone()
+    unbounded = [node for (node,) in conn.execute("SELECT node FROM node_metrics WHERE radius IS NULL")]
+    distances = _distances_to(G, changed, 0.0 if max_radius is None else max_radius)
+
+    radius = {}
+    candidates = list(distances)
+    # Stay below SQLite's bound-parameter limit
+    for i in range(0, len(candidates), 500):
+        chunk = candidates[i:i + 500]
+        rows = conn.execute(f"SELECT node, radius FROM node_metrics WHERE node IN ({','.join('?' * len(chunk))})", chunk)
+        radius.update((node, r) for node, r in rows if r is not None)
+    conn.close()
+    affected = {node for node, d in distances.items() if d <= radius.get(node, float('inf'))}
+    return affected | _in_changed_components(G, unbounded, changed)
+
+def update_metrics(changed, db_path=DB_PATH, processes=None):
+    """
+    Recompute the metrics of the nodes affected by edge changes at ``changed`` nodes.
+
+    Does nothing until :func:`rebuild_metrics` has created the table. Rows of changed
+    nodes that are no longer in the graph are removed.
+
+    :param changed: Both endpoints of every added, reweighted or removed edge.
+
+    :return: Number of nodes recomputed.
+    """
+    conn = sqlite3.connect(db_path)
+    materialized = _has_metrics_table(conn)
+    conn.close()
+    if not materialized:
+        return 0
+
+    G = graph_cache.get_snapshot(db_path)
+    changed = list(dict.fromkeys(changed))
+    stale = set(affected_nodes(G, changed, db_path))
+    rows = compute_metrics(G, sorted(stale), processes)
+    removed = [(node,) for node in changed if node not in G]
+
+    def write(conn):
+        conn.executemany("DELETE FROM node_metrics WHERE node = ?", removed)
+        conn.executemany("INSERT OR REPLACE INTO node_metrics VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    graph_cache.side_write(write, db_path)
+    return len(rows)
+
+def get_metrics(nodes, db_path=DB_PATH):
+    """
+    Return the stored metrics of ``nodes`` as ``{node: {column: value}}``.
+
+    Nodes without a stored row are left out.
+    """
+    conn = sqlite3.connect(db_path)
+    if not _has_metrics_table(conn):
+        conn.close()
+        return {}
+    nodes = list(nodes)
+    metrics = {}
+    for i in range(0, len(nodes), 500):
+        chunk = nodes[i:i + 500]
+        rows = conn.execute(f"SELECT node, {', '.join(METRIC_COLUMNS)} FROM node_metrics "
+                            f"WHERE node IN ({','.join('?' * len(chunk))})", chunk)
+        for node, *values in rows:
+            metrics[node] = dict(zip(METRIC_COLUMNS, values))
+    conn.close()
+    return metrics
+
+def query_metrics(order_by='dist20', descending=True, limit=50, offset=0, filters=None, db_path=DB_PATH):
+    """
+    Sort and filter the stored metrics, e.g. the most isolated notes first with the defaults.
+
+    :param order_by: One of :data:`METRIC_COLUMNS` or 'node'.
+    :param descending: Sort order; NULL values come last. Ties are sorted by node name
+        in the same direction.
+    :param limit: Maximum number of rows, or None for all.
+    :param filters: Optional dict of column -> ``(low, high)``; either bound may be None.
+    :return: List of ``(node, degree, dist5, dist10, dist20, radius)`` tuples.
+    """
+    columns = ('node',) + METRIC_COLUMNS
+    if order_by not in columns:
+        raise ValueError(f"order_by must be one of {columns}, not {order_by!r}")
+    conditions, params = [], []
+    for column, (low, high) in (filters or {}).items():
+        if column not in columns:
+            raise ValueError(f"Unknown metric column {column!r}")
+        if low is not None:
+            conditions.append(f"{column} >= ?")
+            params.append(low)
+        if high is not None:
+            conditions.append(f"{column} <= ?")
+            params.append(high)
+
+    query = f"SELECT {', '.join(columns)} FROM node_metrics"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    if descending:
+        # SQLite sorts NULL first ascending and last descending, so this walks the index
+        query += f" ORDER BY {order_by} DESC" + (", node DESC" if order_by != 'node' else "")
+    else:
+        query += f" ORDER BY {order_by} ASC NULLS LAST" + (", node ASC" if order_by != 'node' else "")
+    if limit is not None:
+        query += " LIMIT ? OFFSET ?"
+        params += [limit, offset]
+
+    conn = sqlite3.connect(db_path)
+    if not _has_metrics_table(conn):
+        conn.close()
+        return []
+    rows = conn.execute(query, params).fetchall()
+    conn.close()
+    return rows
+
+def _parse_filter(text):
+    # "column:low:high", either bound may be left empty
+    column, _, bounds = text.partition(':')
+    low, _, high = bounds.partition(':')
+    try:
+        return column, (float(low) if low else None, float(high) if high else None)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected column:low:high, not {text!r}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the stored node metrics of a database.")
+    parser.add_argument('command', choices=['build', 'query'])
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--order-by', default='dist20', choices=('node',) + METRIC_COLUMNS)
+    parser.add_argument('--ascending', action='store_true')
+    parser.add_argument('--filter', type=_parse_filter, action='append', default=[],
+                        help="column:low:high, e.g. degree:1:1 or dist20:30: (repeatable)")
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--offset', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        def progress(stage, done, total, elapsed):
+            print(f"{done}/{total} nodes in {elapsed:.1f}s", file=sys.stderr)
+
+        started = time.perf_counter()
+        count = rebuild_metrics(args.db, args.processes, progress=progress)
+        print(f"Metrics of {count} nodes written to {args.db} in {time.perf_counter() - started:.1f}s")
+    else:
+        conn = sqlite3.connect(args.db)
+        materialized = _has_metrics_table(conn)
+        conn.close()
+        if not materialized:
+            parser.error(f"no node_metrics table in {args.db}; run the build command first")
+        try:
+            rows = query_metrics(args.order_by, not args.ascending, args.limit, args.offset,
+                                 dict(args.filter), args.db)
+        except ValueError as error:
+            parser.error(str(error))
+        print('\t'.join(('node',) + METRIC_COLUMNS))
+        for node, *values in rows:
+            print('\t'.join([node] + ['' if value is None else f"{value:g}" for value in values]))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+import sqlite3
+import graph_cache
+from database import DB_PATH, get_schema_version
+
+# FTS5 with the trigram tokenizer indexes every 3-character substring of a name, so
+# infix searches (LIKE '%kw%') become index lookups instead of table scans
+MIN_TRIGRAM_LENGTH = 3
+
+def create_search_index(conn):
+    """
+    Create the ``nodes_fts`` index over ``nodes.name`` and the triggers that keep it in sync.
+
+    The index is an external-content table: it stores only the trigrams and reads the
+    names back from ``nodes``. A newly created index is filled from the existing nodes.
+    """
+    c = conn.cursor()
+    exists = c.execute("SELECT 1 FROM sqlite_master WHERE name = 'nodes_fts'").fetchone()
+    c.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS nodes_fts
+                 USING fts5(name, content='nodes', content_rowid='id', tokenize='trigram')''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS nodes_fts_insert AFTER INSERT ON nodes BEGIN
+                     INSERT INTO nodes_fts (rowid, name) VALUES (NEW.id, NEW.name);
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS nodes_fts_delete AFTER DELETE ON nodes BEGIN
+                     INSERT INTO nodes_fts (nodes_fts, rowid, name) VALUES ('delete', OLD.id, OLD.name);
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS nodes_fts_update AFTER UPDATE ON nodes BEGIN
+                     INSERT INTO nodes_fts (nodes_fts, rowid, name) VALUES ('delete', OLD.id, OLD.name);
+                     INSERT INTO nodes_fts (rowid, name) VALUES (NEW.id, NEW.name);
+                 END''')
+    if not exists:
+        rebuild_search_index(conn)
+
+def rebuild_search_index(conn):
+    """Rebuild ``nodes_fts`` from the ``nodes`` table, if the index exists."""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'nodes_fts'").fetchone():
+        conn.execute("INSERT INTO nodes_fts (nodes_fts) VALUES ('rebuild')")
+
+def _connect(db_path):
+    conn = sqlite3.connect(db_path)
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'nodes_fts'").fetchone():
+        # Built once through the graph cache's connection, so the cached graph stays loaded
+        graph_cache.side_write(create_search_index, db_path)
+    return conn
+
+def _phrase(keyword):
+    # A quoted FTS5 phrase of trigrams matches the keyword as a substring
+    return '"' + keyword.replace('"', '""') + '"'
+
+def _hits_query(keyword):
+    """
+    SQL and parameters selecting ``(id, name, rank)`` of the nodes whose name contains
+    ``keyword``. Rank 1 is the best match: exact name, then prefix, then shortest name.
+    """
+    if len(keyword) >= MIN_TRIGRAM_LENGTH:
+        source = "SELECT rowid AS id, name FROM nodes_fts WHERE nodes_fts MATCH ?"
+        params = [_phrase(keyword)]
+    else:
+        # Too short to form a trigram; fall back to scanning the node names once
+        escaped = keyword.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        source = "SELECT id, name FROM nodes WHERE name LIKE ? ESCAPE '\\'"
+        params = [f'%{escaped}%']
+    query = f'''SELECT id, name, row_number() OVER (
+                    ORDER BY lower(name) = lower(?) DESC, substr(lower(name), 1, ?) = lower(?) DESC,
+                             length(name), name) AS rank
+                FROM ({source})'''
+    return query, [keyword, len(keyword), keyword] + params
+
+def _edges_query(conn, keyword):
+    # SQL and parameters selecting the (source, target, weight) rows touching a hit
+    hits, params = _hits_query(keyword)
+    version = get_schema_version(conn)
+    if version >= 3:
+        # Each pair is stored once; list it in both directions like the edges view. Rows
+        # leaving a hit come first, then rows from other nodes into a hit
+        query = f'''WITH hits AS ({hits})
+                    SELECT s.name, t.name, l.weight
+                    FROM (SELECT h.rank, l.source_id, l.target_id, l.weight
+                          FROM hits h JOIN links l ON l.source_id = h.id
+                          UNION ALL
+                          SELECT h.rank, l.target_id, l.source_id, l.weight
+                          FROM hits h JOIN links l ON l.target_id = h.id
+                          WHERE l.source_id != l.target_id
+                          UNION ALL
+                          SELECT h.rank, l.source_id, l.target_id, l.weight
+                          FROM hits h JOIN links l ON l.target_id = h.id
+                          WHERE l.source_id NOT IN (SELECT id FROM hits)
+                          UNION ALL
+                          SELECT h.rank, l.target_id, l.source_id, l.weight
+                          FROM hits h JOIN links l ON l.source_id = h.id
+                          WHERE l.target_id NOT IN (SELECT id FROM hits)) l
+                    JOIN nodes s ON s.id = l.source_id
+                    JOIN nodes t ON t.id = l.target_id
+                    ORDER BY l.rank, s.name, t.name'''
+    elif version == 2:
+        # Both directions come from indexes: the links primary key for the source side,
+        # links_target for the target side
+        query = f'''WITH hits AS ({hits})
+                    SELECT s.name, t.name, l.weight
+                    FROM (SELECT h.rank, l.source_id, l.target_id, l.weight
+                          FROM hits h JOIN links l ON l.source_id = h.id
+                          UNION ALL
+                          SELECT h.rank, l.source_id, l.target_id, l.weight
+                          FROM hits h JOIN links l ON l.target_id = h.id
+                          WHERE l.source_id NOT IN (SELECT id FROM hits)) l
+                    JOIN nodes s ON s.id = l.source_id
+                    JOIN nodes t ON t.id = l.target_id
+                    ORDER BY l.rank, s.name, t.name'''
+    else:
+        query = f'''WITH hits AS ({hits})
+                    SELECT source, target, weight FROM edges
+                    WHERE source IN (SELECT name FROM hits) OR target IN (SELECT name FROM hits)
+                    ORDER BY source, target'''
+    return query, params
+
+def search_nodes(keyword, db_path=DB_PATH, limit=50, offset=0):
+    """
+    Find the nodes whose name contains ``keyword`` (case-insensitive), best match first.
+
+    :param keyword: Substring to search for.
+    :param db_path: Path to the SQLite database file.
+    :param limit: Maximum number of names to return, or None for all.
+    :param offset: Number of hits to skip, for paging.
+    :return: List of node names.
+    """
+    if not keyword:
+        return []
+    hits, params = _hits_query(keyword)
+    query = f"SELECT name FROM ({hits}) ORDER BY rank"
+    if limit is not None:
+        query += " LIMIT ? OFFSET ?"
+        params += [limit, offset]
+    conn = _connect(db_path)
+    names = [row[0] for row in conn.execute(query, params)]
+    conn.close()
+    return names
+
+def iter_search_edges(keyword, db_path=DB_PATH, batch_size=1000):
+    """
+    Stream the edges with an endpoint whose name contains ``keyword``.
+
+    Every edge is yielded once as (source, target, weight), grouped by matching node
+    in ranking order. Rows are fetched ``batch_size`` at a time, so huge result sets
+    never sit in memory.
+    """
+    if not keyword:
+        return
+    conn = _connect(db_path)
+    query, params = _edges_query(conn, keyword)
+    cursor = conn.execute(query, params)
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        conn.close()
+
+def search_edges(keyword, db_path=DB_PATH, limit=None, offset=0):
+    """
+    Return the edges with an endpoint whose name contains ``keyword``, one page at a time.
+
+    :param limit: Maximum number of edges to return, or None for all.
+    :param offset: Number of edges to skip, for paging.
+    :return: List of (source, target, weight) tuples.
+    """
+    if not keyword:
+        return []
+    conn = _connect(db_path)
+    query, params = _edges_query(conn, keyword)
+    if limit is not None or offset:
+        query += " LIMIT ? OFFSET ?"
+        params += [-1 if limit is None else limit, offset]
+    rows = conn.execute(query, params).fetchall()
+    conn.close()
+    return rows
@@ -0,0 +1,186 @@
+import argparse
+import sys
+import numpy as np
+import networkx as nx
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+import communities
+import instrumentation
+import tasks
+from database import DB_PATH
+from force_layout import barnes_hut_layout
+from render2d import EDGE_COLOR, FIGSIZE, NODE_COLOR, NODE_FONT_SIZE, LabelLayer
+
+# Whole-vault overview on top of the community hierarchy. The view starts at the top
+# level and expands the largest supernodes while the drawing stays under VIEW_SIZE
+# items; clicking a supernode replaces it by its members, right-clicking an item folds
+# it and its siblings back into their parent. Edges between the items on screen are
+# the summed note links between them, so a graph of any size is drawn with a few
+# hundred points. Every change warm-starts the layout from the current positions, so
+# the rest of the picture stays in place.
+
+VIEW_SIZE = 300
+LAYOUT_ITERATIONS = 60
+CLUSTER_COLOR = '#2B7396'
+# Spread of the members of an expanded supernode around its position, in layout units
+EXPAND_RADIUS = 0.05
+
+class OverviewView:
+    """Items of a :class:`communities.Hierarchy` on screen, with their layout."""
+
+    def __init__(self, hierarchy, view_size=VIEW_SIZE, seed=0):
+        self.hierarchy = hierarchy
+        self.rng = np.random.default_rng(seed)
+        self.seed = seed
+        self.items = hierarchy.top()
+        self.pos = {}
+        self.edges = {}
+        # Start from the top level, opened up until it fills the view
+        while True:
+            candidates = [item for item in self.items if item[0] > 0]
+            if not candidates:
+                break
+            largest = max(candidates, key=hierarchy.size)
+            if len(self.items) - 1 + len(hierarchy.children(largest)) > view_size:
+                break
+            self.expand(largest)
+        self.layout()
+
+    def expand(self, item):
+        """Replace supernode ``item`` by its members; return whether anything changed."""
+        children = self.hierarchy.children(item)
+        if item not in self.items or not children:
+            return False
+        self.items.remove(item)
+        self.items.extend(children)
+        center = self.pos.pop(item, None)
+        if center is not None:
+            for child in children:
+                self.pos[child] = center + self.rng.normal(scale=EXPAND_RADIUS, size=2)
+        return True
+
+    def _within(self, item, ancestor):
+        while item is not None and item[0] < ancestor[0]:
+            item = self.hierarchy.parent(item)
+        return item == ancestor
+
+    def collapse(self, item):
+        """Fold ``item`` and everything else inside its parent into the parent."""
+        parent = self.hierarchy.parent(item)
+        if parent is None or item not in self.items:
+            return False
+        inside = [other for other in self.items if self._within(other, parent)]
+        self.items = [other for other in self.items if other not in set(inside)] + [parent]
+        placed = [self.pos.pop(other) for other in inside if other in self.pos]
+        if placed:
+            self.pos[parent] = np.mean(placed, axis=0)
+        return True
+
+    @instrumentation.traced('overview_layout')
+    def layout(self):
+        """Sum the edges between the items on screen and lay them out."""
+        self.edges = self.hierarchy.edges(self.items)
+        G = nx.Graph()
+        G.add_nodes_from(self.items)
+        # Attraction grows with the log of the summed affinity, or a few large
+        # supernodes would pull everything into one spot
+        G.add_edges_from((a, b, {'weight': 1.0 / np.log1p(strength)}) for (a, b), (_, strength) in self.edges.items())
+        # Unconnected groups would be pushed to the edge of the view by the repulsion
+        # of everything else; tie each to the largest item as strongly as the closest pair
+        largest = max(self.items, key=self.hierarchy.size)
+        closest = min((w for _, _, w in G.edges(data='weight')), default=1.0)
+        for component in list(nx.connected_components(G)):
+            if largest not in component:
+                G.add_edge(largest, max(component, key=self.hierarchy.size), weight=closest)
+        self.pos = barnes_hut_layout(G, dim=2, pos=self.pos or None, iterations=LAYOUT_ITERATIONS, seed=self.seed)
+        instrumentation.count('nodes', len(self.items))
+        instrumentation.count('edges', len(self.edges))
+
+    def draw(self, ax):
+        """
+        Draw the items into ``ax``: supernodes sized by their number of notes, edges
+        thicker the more note links they stand for.
+
+        :return: The node scatter, whose point ``i`` is ``self.items[i]``.
+        """
+        hierarchy = self.hierarchy
+        index = {item: i for i, item in enumerate(self.items)}
+        xy = np.array([self.pos[item] for item in self.items], dtype=np.float64).reshape(-1, 2)
+        sizes = np.array([hierarchy.size(item) for item in self.items], dtype=np.float64)
+
+        if self.edges:
+            ends = np.array([(index[a], index[b]) for a, b in self.edges], dtype=np.int64)
+            links = np.log1p(np.array([links for links, _ in self.edges.values()], dtype=np.float64))
+            ax.add_collection(LineCollection(xy[ends], linewidths=0.5 + 5 * links / links.max(),
+                                             colors=EDGE_COLOR, alpha=0.5, zorder=1))
+
+        is_note = np.array([item[0] == 0 for item in self.items], dtype=bool)
+        scatter = ax.scatter(xy[:, 0], xy[:, 1], s=40 + 1200 * np.sqrt(sizes / sizes.max()),
+                             c=np.where(is_note, NODE_COLOR, CLUSTER_COLOR), alpha=0.85, zorder=2, picker=True)
+
+        order = np.argsort(-sizes, kind='stable')
+        ax.add_artist(LabelLayer(xy[order], [hierarchy.label(self.items[i]) for i in order.tolist()],
+                                 [NODE_FONT_SIZE] * len(order), ['black'] * len(order)))
+        ax.set_title(f"Vault overview: {len(self.items)} items of {hierarchy.notes} notes "
+                     f"(click to expand, right-click to collapse)")
+        ax.autoscale_view()
+        ax.set_axis_off()
+        return scatter
+
+def prepare_overview(db_path=DB_PATH, view_size=VIEW_SIZE):
+    """Load the hierarchy of ``db_path``, building it first if needed, and lay out the first view."""
+    hierarchy = communities.load_hierarchy(db_path)
+    if hierarchy is None:
+        communities.build_communities(db_path)
+        hierarchy = communities.load_hierarchy(db_path)
+    return OverviewView(hierarchy, view_size)
+
+def show_overview(view):
+    """Open the interactive overview window of ``view``."""
+    import matplotlib.pyplot as plt
+    fig = plt.figure(figsize=FIGSIZE)
+    ax = fig.gca()
+    state = {'scatter': view.draw(ax)}
+
+    def on_pick(event):
+        if event.artist is not state['scatter'] or not len(event.ind):
+            return
+        item = view.items[event.ind[0]]
+        changed = view.collapse(item) if event.mouseevent.button == 3 else view.expand(item)
+        if changed:
+            view.layout()
+            ax.clear()
+            state['scatter'] = view.draw(ax)
+            fig.canvas.draw_idle()
+
+    fig.canvas.mpl_connect('pick_event', on_pick)
+    # Called from a task callback inside the Tk main loop; a blocking show would start a
+    # nested loop and hold up the other tasks until the window is closed
+    plt.show(block=False)
+
+def open_overview(root, db_path=DB_PATH):
+    """Prepare the overview on the task pool and open it when done ("Vault Overview" button)."""
+    from tkinter import messagebox
+    tasks.get_scheduler(root).submit(
+        "Vault overview", prepare_overview, db_path, on_done=show_overview,
+        on_error=lambda error: messagebox.showerror("Error", error.args[0] if error.args else str(error)))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show the whole vault as a graph of communities.")
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--output', help="write the first view to this image file instead of opening a window")
+    parser.add_argument('--view-size', type=int, default=VIEW_SIZE, help="items the first view opens up to")
+    args = parser.parse_args(argv)
+
+    view = prepare_overview(args.db, args.view_size)
+    if args.output:
+        fig = Figure(figsize=FIGSIZE)
+        view.draw(fig.add_subplot())
+        fig.tight_layout()
+        fig.savefig(args.output)
+        print(args.output)
+    else:
+        show_overview(view)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import hashlib
+import sqlite3
+import graph_cache
+from database import DB_PATH
+
+def create_positions_table(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS positions
+                    (node TEXT, view TEXT, x REAL, y REAL, z REAL, signature TEXT,
+                     PRIMARY KEY(node, view))''')
+
+def neighborhood_signature(G, node):
+    """
+    Short fingerprint of the edges of ``node`` in the full graph ``G``.
+
+    A stored position stays valid for as long as the signature is unchanged.
+    """
+    if node not in G:
+        return ''
+    items = sorted((str(neighbor), data['weight']) for neighbor, data in G[node].items())
+    return hashlib.sha1(repr(items).encode('utf-8')).hexdigest()[:16]
+
+def load_positions(nodes, view, db_path=DB_PATH):
+    """
+    Return ``{node: (coords, signature)}`` for the nodes of ``nodes`` stored under ``view``.
+
+    :param view: '2d' or '3d'.
+    """
+    conn = sqlite3.connect(db_path)
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'positions'").fetchone():
+        conn.close()
+        return {}
+    nodes = list(nodes)
+    dim = 3 if view == '3d' else 2
+    stored = {}
+    # Stay below SQLite's bound-parameter limit
+    for i in range(0, len(nodes), 500):
+        chunk = nodes[i:i + 500]
+        rows = conn.execute(f"SELECT node, x, y, z, signature FROM positions "
+                            f"WHERE view = ? AND node IN ({','.join('?' * len(chunk))})",
+                            (view, *chunk))
+        for node, x, y, z, signature in rows:
+            stored[node] = ((x, y, z)[:dim], signature)
+    conn.close()
+    return stored
+
+def save_positions(pos, view, G, db_path=DB_PATH):
+    """
+    Store ``pos`` under ``view`` together with each node's neighborhood signature in ``G``.
+
+    Goes through the graph cache's own connection so saving a layout does not force
+    the cached graph to reload.
+    """
+    rows = []
+    for node, coords in pos.items():
+        coords = [float(c) for c in coords]
+        z = coords[2] if len(coords) > 2 else None
+        rows.append((node, view, coords[0], coords[1], z, neighborhood_signature(G, node)))
+
+    def write(conn):
+        create_positions_table(conn)
+        conn.executemany("INSERT OR REPLACE INTO positions (node, view, x, y, z, signature) "
+                         "VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    graph_cache.side_write(write, db_path)
+
+def warm_start(local_G, view, G, db_path=DB_PATH):
+    """
+    Look up stored positions for the nodes of ``local_G``.
+
+    :param G: Full graph used to check whether a node's neighborhood changed.
+    :return: ``(pos, stale)`` where ``pos`` holds the stored positions and ``stale`` is
+        the set of nodes that are new or whose neighborhood changed since they were stored.
+    """
+    stored = load_positions(local_G.nodes(), view, db_path)
+    pos = {}
+    stale = set()
+    for node in local_G.nodes():
+        entry = stored.get(node)
+        if entry is None:
+            stale.add(node)
+            continue
+        coords, signature = entry
+        pos[node] = coords
+        if signature != neighborhood_signature(G, node):
+            stale.add(node)
+    return pos, stale
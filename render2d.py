@@ -0,0 +1,259 @@
+import argparse
+import os
+import re
+import sys
+from collections import defaultdict
+import numpy as np
+from matplotlib.artist import Artist
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+from matplotlib.text import Text
+import instrumentation
+import tasks
+
+# Batched 2D renderer for local graphs. All edges are one LineCollection and all nodes
+# one scatter, so matplotlib issues a handful of draw calls however large the graph is.
+#
+# Node names and edge weights are candidate labels, placed at every draw in priority
+# order: center nodes, other nodes by degree, then the weights of the strongest edges.
+# A candidate is dropped when its anchor is outside the view, when it is an edge weight
+# and the edge is drawn shorter than the label, or when its box overlaps a label that
+# is already placed, tested against a uniform grid of the placed boxes in pixels.
+# Zooming in spreads the anchors apart, so more labels appear as room opens up.
+
+EDGE_COLOR = 'skyblue'
+EDGE_LABEL_COLOR = 'steelblue'
+NODE_COLOR = 'thistle'
+CENTER_COLOR = '#d97706'
+NODE_FONT_SIZE = 11
+EDGE_FONT_SIZE = 8
+FIGSIZE = (14, 8)
+# Average character width as a fraction of the font size
+CHAR_WIDTH = 0.6
+# Free space kept around every label, in pixels
+LABEL_PADDING = 2
+
+class LabelIndex:
+    """Uniform grid of placed label boxes ``(x0, y0, x1, y1)`` in display pixels."""
+
+    def __init__(self, cell_size):
+        self.cell_size = max(cell_size, 1.0)
+        self.cells = defaultdict(list)
+
+    def _cells(self, box):
+        x0, y0, x1, y1 = box
+        c = self.cell_size
+        return [(cx, cy) for cx in range(int(x0 // c), int(x1 // c) + 1)
+                for cy in range(int(y0 // c), int(y1 // c) + 1)]
+
+    def place(self, box):
+        """Add ``box`` unless it overlaps a placed box; return whether it was added."""
+        x0, y0, x1, y1 = box
+        cells = self._cells(box)
+        for cell in cells:
+            for a0, b0, a1, b1 in self.cells.get(cell, ()):
+                if x0 < a1 and a0 < x1 and y0 < b1 and b0 < y1:
+                    return False
+        for cell in cells:
+            self.cells[cell].append(box)
+        return True
+
+class LabelLayer(Artist):
+    """
+    Artist drawing the labels of a graph that fit at the current zoom level.
+
+    Placement runs inside :meth:`draw`, so it follows zooming, panning, resizing and
+    the resolution of ``savefig``. Text artists are created only for candidates that
+    are placed at least once and are reused afterwards.
+    """
+
+    zorder = 3
+
+    def __init__(self, anchors, texts, font_sizes, colors, edge_segments=None):
+        super().__init__()
+        self.anchors = np.asarray(anchors, dtype=np.float64).reshape(-1, 2)
+        self.texts = texts
+        self.font_sizes = np.asarray(font_sizes, dtype=np.float64)
+        self.colors = colors
+        # Endpoints of the edges whose weights are the last candidates, or None
+        self.segments = edge_segments
+        self.artists = {}
+        self.placed = []
+
+    def _text(self, i):
+        text = self.artists.get(i)
+        if text is None:
+            x, y = self.anchors[i]
+            text = Text(x, y, self.texts[i], fontsize=self.font_sizes[i], color=self.colors[i],
+                        ha='center', va='center')
+            text.set_figure(self.figure)
+            text.set_transform(self.axes.transData)
+            self.artists[i] = text
+        return text
+
+    def cull(self, renderer):
+        """Return the candidate indexes whose labels are drawn at the current view."""
+        if not len(self.anchors):
+            return []
+        xy = self.axes.transData.transform(self.anchors)
+        x0, y0, x1, y1 = self.axes.bbox.extents
+        pixels = renderer.points_to_pixels(self.font_sizes)
+        half_h = pixels / 2 + LABEL_PADDING
+        half_w = np.fromiter(map(len, self.texts), dtype=np.float64, count=len(self.texts)) * pixels * CHAR_WIDTH / 2 + LABEL_PADDING
+
+        keep = (xy[:, 0] >= x0) & (xy[:, 0] <= x1) & (xy[:, 1] >= y0) & (xy[:, 1] <= y1)
+        if self.segments is not None:
+            # An edge weight only shows once the edge is drawn longer than its label
+            a = self.axes.transData.transform(self.segments[:, 0])
+            b = self.axes.transData.transform(self.segments[:, 1])
+            edges = slice(len(keep) - len(self.segments), None)
+            keep[edges] &= np.hypot(*(a - b).T) > 2 * half_w[edges]
+
+        index = LabelIndex(float(np.median(half_w[keep])) * 2 if keep.any() else 1.0)
+        placed = []
+        for i in np.flatnonzero(keep).tolist():
+            x, y = xy[i]
+            if index.place((x - half_w[i], y - half_h[i], x + half_w[i], y + half_h[i])):
+                placed.append(i)
+        return placed
+
+    def draw(self, renderer):
+        if not self.get_visible():
+            return
+        self.placed = self.cull(renderer)
+        for i in self.placed:
+            self._text(i).draw(renderer)
+        self.stale = False
+
+def draw_graph_2d(ax, local_G, pos, center_nodes, edge_labels=True):
+    """
+    Draw ``local_G`` laid out at ``pos`` into ``ax``.
+
+    Edges are drawn thicker the lower their weight, nodes are sized by degree and the
+    center nodes are highlighted; labels are culled by :class:`LabelLayer`.
+
+    :return: The :class:`LabelLayer` of the plot.
+    """
+    centers = set(center_nodes)
+    nodes = list(local_G.nodes())
+    node_index = {node: i for i, node in enumerate(nodes)}
+    xy = np.array([pos[node] for node in nodes], dtype=np.float64).reshape(-1, 2)
+
+    edges = list(local_G.edges(data='weight'))
+    ends = np.array([(node_index[u], node_index[v]) for u, v, _ in edges], dtype=np.int64).reshape(-1, 2)
+    weights = np.array([w for _, _, w in edges], dtype=np.float64)
+    instrumentation.count('nodes', len(nodes))
+    instrumentation.count('edges', len(edges))
+
+    segments = xy[ends]
+    if len(weights):
+        # Scale to a 1-8 range, thickest for the lowest weight
+        max_weight = weights.max()
+        weight_range = max_weight - weights.min()
+        edge_widths = 1 + 7 * (1 + max_weight - weights) / (weight_range or 1.0)
+        ax.add_collection(LineCollection(segments, linewidths=edge_widths, colors=EDGE_COLOR,
+                                         alpha=0.6, zorder=1))
+
+    degree = np.bincount(ends.ravel(), minlength=len(nodes))
+    is_center = np.fromiter((node in centers for node in nodes), dtype=bool, count=len(nodes))
+    ax.scatter(xy[:, 0], xy[:, 1], s=50 + 100 * degree, c=np.where(is_center, CENTER_COLOR, NODE_COLOR),
+               zorder=2)
+
+    # Candidates in priority order: centers, then nodes by degree, then the strongest edges
+    node_order = np.lexsort((-degree, ~is_center))
+    anchors = [xy[node_order]]
+    texts = [str(nodes[i]) for i in node_order.tolist()]
+    font_sizes = [NODE_FONT_SIZE] * len(nodes)
+    colors = ['black'] * len(nodes)
+    edge_segments = None
+    if edge_labels and len(weights):
+        edge_order = np.argsort(weights, kind='stable')
+        edge_segments = segments[edge_order]
+        anchors.append(edge_segments.mean(axis=1))
+        texts += [f'{w:.2f}' for w in weights[edge_order].tolist()]
+        font_sizes += [EDGE_FONT_SIZE] * len(weights)
+        colors += [EDGE_LABEL_COLOR] * len(weights)
+    layer = LabelLayer(np.concatenate(anchors), texts, font_sizes, colors, edge_segments)
+    ax.add_artist(layer)
+
+    ax.autoscale_view()
+    ax.set_axis_off()
+    return layer
+
+def render_figure(center_nodes, pos, local_G, figsize=FIGSIZE):
+    """Render a local graph into a new :class:`Figure` that is not managed by pyplot."""
+    fig = Figure(figsize=figsize)
+    ax = fig.add_subplot()
+    draw_graph_2d(ax, local_G, pos, center_nodes)
+    ax.set_title(f'Combined Local Graph for {", ".join(center_nodes)}')
+    fig.tight_layout()
+    return fig
+
+def export_filename(i, center_nodes, fmt):
+    slug = re.sub(r'[^\w.-]+', '_', '_'.join(center_nodes)).strip('_')[:80]
+    return f'{i:03d}_{slug}.{fmt}'
+
+@instrumentation.traced('export_2d')
+def export_local_graphs(center_sets, out_dir, fmt='png', k=20, dpi=100, position_view='2d'):
+    """
+    Lay out and render the local graph of every center set to an image file.
+
+    Uses the same search and layout as the "Plot 2D Graph" button, including the stored
+    positions of ``position_view``, but draws on figures that no GUI backend ever shows.
+    Sets naming a node that is not in the graph are reported and skipped.
+
+    :param center_sets: Lists of center node names.
+    :param fmt: ``'png'``, ``'svg'`` or another format ``savefig`` supports.
+    :return: The paths of the written files.
+    """
+    # Imported here because visualization pulls in tkinter and the search modules
+    import visualization
+    os.makedirs(out_dir, exist_ok=True)
+    written = []
+    for i, center_nodes in enumerate(center_sets):
+        tasks.checkpoint(i, len(center_sets), 'export')
+        try:
+            _, nearest_pairs = visualization.find_nearest_for_nodes(center_nodes, k)
+        except KeyError as e:
+            print(f"Skipping {', '.join(center_nodes)}: {e.args[0]}")
+            continue
+        pos, local_G = visualization.layout_local_graph_2D(
+            center_nodes, list(nearest_pairs), 'spring_grid', {'k': 0.7, 'iterations': 50},
+            position_view=position_view)
+        path = os.path.join(out_dir, export_filename(i, center_nodes, fmt))
+        with instrumentation.span('render', nodes=len(local_G)):
+            render_figure(center_nodes, pos, local_G).savefig(path, format=fmt, dpi=dpi)
+        written.append(path)
+    return written
+
+def parse_center_sets(values):
+    """Split comma-separated center sets, dropping blanks and duplicates as the GUI does."""
+    sets = []
+    for value in values:
+        centers = list(dict.fromkeys(node.strip() for node in value.split(',') if node.strip()))
+        if centers:
+            sets.append(centers)
+    return sets
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export 2D local graph plots without opening a window.")
+    parser.add_argument('out_dir', help="directory for the image files")
+    parser.add_argument('centers', nargs='*', help="center sets, each a comma-separated list of nodes")
+    parser.add_argument('--input', help="file with one comma-separated center set per line")
+    parser.add_argument('--format', default='png', help="image format, for example png or svg")
+    parser.add_argument('--k', type=int, default=20, help="nearest nodes per center")
+    parser.add_argument('--dpi', type=int, default=100)
+    args = parser.parse_args(argv)
+
+    values = list(args.centers)
+    if args.input:
+        with open(args.input, encoding='utf-8') as file:
+            values += file.read().splitlines()
+    center_sets = parse_center_sets(values)
+    if not center_sets:
+        parser.error("no center sets given")
+    for path in export_local_graphs(center_sets, args.out_dir, args.format, args.k, args.dpi):
+        print(path)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+import argparse
+import base64
+import os
+import sys
+import webbrowser
+from pathlib import Path
+import numpy as np
+import instrumentation
+import tasks
+
+# 3D plots as standalone HTML files. Coordinates and marker sizes are written as base64
+# float32 typed arrays, which plotly.js decodes straight into buffers, instead of JSON
+# number lists, and all edges are one line trace with NaN gaps. The 4.8 MB plotly.js
+# bundle is written once per output directory and every HTML file there loads it with
+# a <script src>, rather than embedding a copy in each file as ``pio.show`` does.
+#
+# Text is the expensive part of a WebGL scene, so only a level-of-detail subset is
+# written as text: the center nodes and the best connected nodes, and the weights of
+# the strongest edges. Every node and edge still shows its name or weight on hover.
+
+PLOT_DIR = os.path.join(os.path.dirname(__file__), 'plots')
+EDGE_COLOR = 'skyblue'
+EDGE_LABEL_COLOR = 'steelblue'
+NODE_COLOR = 'thistle'
+CENTER_COLOR = '#d97706'
+# Labels written as text; the rest are hover only
+NODE_TEXT_LIMIT = 150
+EDGE_TEXT_LIMIT = 100
+
+def plotly_bundle(directory):
+    """
+    Return the file name of the plotly.js bundle in ``directory``, writing it if missing.
+
+    The name carries the plotly version, so upgrading plotly writes a new bundle next
+    to the old one instead of pairing new figures with an old library.
+    """
+    import plotly
+    name = f'plotly-{plotly.__version__}.min.js'
+    path = os.path.join(directory, name)
+    if not os.path.exists(path):
+        from plotly.offline import get_plotlyjs
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            file.write(get_plotlyjs())
+        os.replace(tmp_path, path)
+    return name
+
+def typed_array(values):
+    """Encode ``values`` as a plotly.js typed array spec of float32."""
+    data = np.ascontiguousarray(values, dtype='<f4')
+    return dict(dtype='f4', bdata=base64.b64encode(data).decode('ascii'))
+
+def _xyz(points):
+    return dict(x=typed_array(points[:, 0]), y=typed_array(points[:, 1]), z=typed_array(points[:, 2]))
+
+def build_figure_3d(center_nodes, pos, local_G, node_text_limit=NODE_TEXT_LIMIT, edge_text_limit=EDGE_TEXT_LIMIT):
+    """
+    Build the plotly figure of a laid out local graph as a plain dict.
+
+    :return: ``{'data': [...], 'layout': {...}}`` for ``plotly.io`` functions.
+    """
+    centers = set(center_nodes)
+    nodes = list(local_G.nodes())
+    node_index = {node: i for i, node in enumerate(nodes)}
+    xyz = np.array([pos[node] for node in nodes], dtype=np.float64).reshape(-1, 3)
+
+    edges = list(local_G.edges(data='weight'))
+    ends = np.array([(node_index[u], node_index[v]) for u, v, _ in edges], dtype=np.int64).reshape(-1, 2)
+    weights = np.array([w for _, _, w in edges], dtype=np.float64)
+    instrumentation.count('nodes', len(nodes))
+    instrumentation.count('edges', len(edges))
+
+    # One polyline for all edges: start, end, NaN gap
+    lines = np.full((len(edges), 3, 3), np.nan)
+    lines[:, 0] = xyz[ends[:, 0]]
+    lines[:, 1] = xyz[ends[:, 1]]
+    lines = lines.reshape(-1, 3)
+    midpoints = (xyz[ends[:, 0]] + xyz[ends[:, 1]]) / 2
+
+    degree = np.bincount(ends.ravel(), minlength=len(nodes))
+    is_center = np.fromiter((node in centers for node in nodes), dtype=bool, count=len(nodes))
+    names = [str(node) for node in nodes]
+
+    data = [
+        dict(type='scatter3d', **_xyz(lines), mode='lines',
+             line=dict(width=10, color=EDGE_COLOR), hoverinfo='none'),
+        # Edge weights on hover, from a marker in the middle of every edge
+        dict(type='scatter3d', **_xyz(midpoints), mode='markers',
+             marker=dict(size=3, color=EDGE_COLOR),
+             hovertext=[f'{names[u]} – {names[v]}: {w:.2f}' for (u, v), w in zip(ends.tolist(), weights.tolist())],
+             hoverinfo='text'),
+        dict(type='scatter3d', **_xyz(xyz), mode='markers',
+             marker=dict(size=typed_array(5 + 5 * degree), color=np.where(is_center, CENTER_COLOR, NODE_COLOR).tolist(),
+                         opacity=0.8),
+             hovertext=names, hoverinfo='text'),
+    ]
+
+    # Text layers: centers first, then by degree; the strongest (lowest weight) edges
+    labelled = np.lexsort((-degree, ~is_center))[:node_text_limit]
+    data.append(dict(type='scatter3d', **_xyz(xyz[labelled]), mode='text', text=[names[i] for i in labelled.tolist()], textposition='top center',
+                     hoverinfo='none'))
+    if len(weights):
+        labelled = np.argsort(weights, kind='stable')[:edge_text_limit]
+        data.append(dict(type='scatter3d', **_xyz(midpoints[labelled]), mode='text',
+                         text=[f'{w:.2f}' for w in weights[labelled].tolist()], textposition='middle center',
+                         textfont=dict(color=EDGE_LABEL_COLOR, size=12), hoverinfo='none'))
+
+    layout = dict(
+        title=dict(text=f'3D Combined Local Graph for {", ".join(center_nodes)}'),
+        showlegend=False,
+        margin=dict(b=20, l=5, r=5, t=40),
+        scene=dict(
+            xaxis=dict(showbackground=False),
+            yaxis=dict(showbackground=False),
+            zaxis=dict(showbackground=False),
+        ),
+    )
+    return dict(data=data, layout=layout)
+
+def write_html_3d(figure, path):
+    """Write ``figure`` to ``path`` as HTML loading the shared plotly.js of its directory."""
+    import plotly.io as pio
+    directory = os.path.dirname(os.path.abspath(path))
+    bundle = plotly_bundle(directory)
+    # The dict is built from known-good keys, so plotly's validation pass is skipped
+    pio.write_html(figure, path, include_plotlyjs=bundle, validate=False, auto_open=False)
+    return path
+
+def show_3d(center_nodes, pos, local_G):
+    """
+    Write the plot of a local graph to :data:`PLOT_DIR` and open it in the browser.
+
+    The file is overwritten by the next plot; tabs already open keep their figure.
+    """
+    path = os.path.join(PLOT_DIR, 'local_graph_3d.html')
+    with instrumentation.span('write_html'):
+        write_html_3d(build_figure_3d(center_nodes, pos, local_G), path)
+    webbrowser.open(Path(path).as_uri())
+    return path
+
+@instrumentation.traced('export_3d')
+def export_local_graphs_3d(center_sets, out_dir, k=20, position_view='3d'):
+    """
+    3D counterpart of :func:`render2d.export_local_graphs`: lay out every center set
+    and write its plot to an HTML file in ``out_dir``.
+
+    :return: The paths of the written files.
+    """
+    import visualization
+    from render2d import export_filename
+    os.makedirs(out_dir, exist_ok=True)
+    written = []
+    for i, center_nodes in enumerate(center_sets):
+        tasks.checkpoint(i, len(center_sets), 'export')
+        try:
+            _, nearest_pairs = visualization.find_nearest_for_nodes(center_nodes, k)
+        except KeyError as e:
+            print(f"Skipping {', '.join(center_nodes)}: {e.args[0]}")
+            continue
+        pos, local_G = visualization.layout_local_graph_3D(center_nodes, list(nearest_pairs),
+                                                           position_view=position_view)
+        path = os.path.join(out_dir, export_filename(i, center_nodes, 'html'))
+        with instrumentation.span('write_html', nodes=len(local_G)):
+            write_html_3d(build_figure_3d(center_nodes, pos, local_G), path)
+        written.append(path)
+    return written
+
+def main(argv=None):
+    from render2d import parse_center_sets
+    parser = argparse.ArgumentParser(description="Export 3D local graph plots as HTML files.")
+    parser.add_argument('out_dir', help="directory for the HTML files and the shared plotly.js")
+    parser.add_argument('centers', nargs='*', help="center sets, each a comma-separated list of nodes")
+    parser.add_argument('--input', help="file with one comma-separated center set per line")
+    parser.add_argument('--k', type=int, default=20, help="nearest nodes per center")
+    args = parser.parse_args(argv)
+
+    values = list(args.centers)
+    if args.input:
+        with open(args.input, encoding='utf-8') as file:
+            values += file.read().splitlines()
+    center_sets = parse_center_sets(values)
+    if not center_sets:
+        parser.error("no center sets given")
+    for path in export_local_graphs_3d(center_sets, args.out_dir, args.k):
+        print(path)
+
+if __name__ == "__main__":
+    sys.exit(main())
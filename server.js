@@ -300,8 +300,6 @@ app.post('/add-node-and-edges', (req, res) => {
     const db = new sqlite3.Database(DB_PATH);
 
     db.serialize(() => {
-        const edgeSet = new Set();  // To keep track of inserted edges
-
         nodesInput.split('\n').forEach(line => {
             line = line.trim();
             if (!line) return;
@@ -324,16 +322,9 @@ app.post('/add-node-and-edges', (req, res) => {
 
                     db.run("INSERT OR IGNORE INTO nodes (name) VALUES (?)", [relatedNode]);
 
-                    // Insert the edge with its weight
+                    // Edges are undirected: the edges view stores the pair once and
+                    // lists it in both directions, so one insert covers both
                     db.run("INSERT OR REPLACE INTO edges (source, target, weight) VALUES (?, ?, ?)", [nodeName, relatedNode, weight]);
-
-                    // Check if reverse edge is already in the input or in the set
-                    if (!edgeSet.has(`${relatedNode}:${nodeName}`)) {
-                        db.run("INSERT OR REPLACE INTO edges (source, target, weight) VALUES (?, ?, ?)", [relatedNode, nodeName, weight]);
-                    }
-
-                    // Mark this edge as processed
-                    edgeSet.add(`${nodeName}:${relatedNode}`);
                 }
             } catch (err) {
                 return res.status(400).send(`Error processing line: ${line}. Error: ${err.message}`);
@@ -0,0 +1,233 @@
+import mmap
+import os
+import sqlite3
+import struct
+import sys
+import numpy as np
+import instrumentation
+from database import DB_PATH, get_graph_version
+from graph_snapshot import GraphSnapshot, load_snapshot
+
+# Binary snapshot file: the CSR arrays and the node-name table of a GraphSnapshot in one
+# file that is memory-mapped on load, so the arrays are used in place without parsing
+# and every process that maps the file shares the same pages of the OS page cache.
+#
+# Layout (little-endian): a fixed header, then each block starting on a 64-byte boundary:
+#   indptr        int64[n + 1]
+#   indices       int32[m]
+#   weights       float64[m]
+#   name_offsets  int64[n + 1]   byte range of name i is [off[i], off[i + 1] - 1)
+#   names         UTF-8 names, each followed by a NUL byte
+#
+# The header records the stamp of the database the file was built from: its
+# graph_version (schema version 4 on). A different stamp means the file is stale; writes
+# to other tables, such as layout positions or metrics, leave it current.
+
+MAGIC = b'GVSNAP\x00\x00'
+FORMAT_VERSION = 2
+ALIGN = 64
+SUFFIX = '.snapshot'
+
+# magic, version, flags, n, m, stamp, 5 block offsets, names length
+HEADER = struct.Struct('<8sIIQQq5QQ')
+# Set when no name contains a NUL byte, so the table can be split in one call
+FLAG_NUL_FREE = 1
+
+class MappedSnapshot(GraphSnapshot):
+    """
+    GraphSnapshot whose arrays are read-only views of a mapped snapshot file.
+
+    Pickling sends only the path, so worker processes (for example the k-nearest pool
+    on platforms that spawn) map the same file instead of receiving a copy.
+    """
+
+    def __init__(self, names, indptr, indices, weights, path, stamp):
+        super().__init__(names, indptr, indices, weights)
+        self.path = path
+        self.stamp = stamp
+
+    def __reduce__(self):
+        return (_reopen, (self.path,))
+
+def _reopen(path):
+    return read_snapshot_file(path)[0]
+
+def snapshot_path(db_path=DB_PATH):
+    return db_path + SUFFIX
+
+def database_stamp(db_path=DB_PATH):
+    """
+    Change stamp of the nodes and links of a database, as a signed 64-bit integer.
+
+    This is the ``graph_version`` value that triggers replace on every change to the
+    graph. Databases before schema version 4 have none; their stamp is a hash of the
+    file change counter, size and mtime of the database and its WAL, which any commit
+    changes.
+
+    :raises FileNotFoundError: If ``db_path`` does not exist.
+    """
+    st = os.stat(db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        version = get_graph_version(conn)
+    finally:
+        conn.close()
+    if version is not None:
+        return version
+
+    with open(db_path, 'rb') as file:
+        header = file.read(100)
+    counter = int.from_bytes(header[24:28], 'big') if len(header) >= 28 else 0
+    try:
+        wal = os.stat(db_path + '-wal')
+        wal_size, wal_mtime = wal.st_size, wal.st_mtime_ns
+    except FileNotFoundError:
+        wal_size = wal_mtime = 0
+    return hash((counter, st.st_size, st.st_mtime_ns, wal_size, wal_mtime))
+
+def _aligned(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+def encode_names(names):
+    """
+    Encode node names as a NUL-terminated UTF-8 table.
+
+    :return: ``(name_offsets, names_blob, flags)``; ``flags`` has :data:`FLAG_NUL_FREE`
+        set when the blob can be split on NUL bytes.
+    """
+    encoded = [name.encode('utf-8') for name in names]
+    lengths = np.fromiter((len(name) + 1 for name in encoded), dtype=np.int64, count=len(encoded))
+    name_offsets = np.zeros(len(encoded) + 1, dtype='<i8')
+    np.cumsum(lengths, out=name_offsets[1:])
+    names_blob = b'\x00'.join(encoded) + (b'\x00' if encoded else b'')
+    flags = FLAG_NUL_FREE if all(b'\x00' not in name for name in encoded) else 0
+    return name_offsets, names_blob, flags
+
+def decode_names(blob, n, flags, name_offsets):
+    """Inverse of :func:`encode_names`; ``name_offsets`` is only read without FLAG_NUL_FREE."""
+    if flags & FLAG_NUL_FREE:
+        return blob[:-1].decode('utf-8').split('\x00') if n else []
+    name_offsets = name_offsets.tolist()
+    return [blob[a:b - 1].decode('utf-8') for a, b in zip(name_offsets, name_offsets[1:])]
+
+def write_snapshot_file(snapshot, path, stamp=0):
+    """
+    Write ``snapshot`` to ``path`` in the binary snapshot format.
+
+    The file is written next to ``path`` and then renamed over it, so processes that
+    still map the previous version keep a consistent view.
+    """
+    name_offsets, names_blob, flags = encode_names(snapshot.names)
+
+    blocks = [
+        np.ascontiguousarray(snapshot.indptr, dtype='<i8'),
+        np.ascontiguousarray(snapshot.indices, dtype='<i4'),
+        np.ascontiguousarray(snapshot.weights, dtype='<f8'),
+        name_offsets,
+        names_blob,
+    ]
+    offsets = []
+    position = _aligned(HEADER.size)
+    for block in blocks:
+        offsets.append(position)
+        position = _aligned(position + (block.nbytes if isinstance(block, np.ndarray) else len(block)))
+
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, flags, len(snapshot.names), len(snapshot.indices),
+                         stamp, *offsets, len(names_blob))
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as file:
+        file.write(header)
+        for offset, block in zip(offsets, blocks):
+            file.write(b'\x00' * (offset - file.tell()))
+            file.write(memoryview(block) if isinstance(block, np.ndarray) else block)
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        # Windows refuses to replace a file another process still maps
+        os.remove(tmp_path)
+        raise
+
+def read_header(path):
+    """Return the header fields of a snapshot file as a dict, or None if it is not one."""
+    with open(path, 'rb') as file:
+        data = file.read(HEADER.size)
+    if len(data) < HEADER.size:
+        return None
+    fields = HEADER.unpack(data)
+    if fields[0] != MAGIC or fields[1] != FORMAT_VERSION:
+        return None
+    return {
+        'flags': fields[2],
+        'nodes': fields[3],
+        'entries': fields[4],
+        'stamp': fields[5],
+        'offsets': fields[6:11],
+        'names_length': fields[11],
+    }
+
+@instrumentation.traced('read_snapshot_file')
+def read_snapshot_file(path):
+    """
+    Map a snapshot file and wrap it in a :class:`MappedSnapshot` without copying the arrays.
+
+    :return: ``(snapshot, stamp)``
+    :raises ValueError: If the file is not a snapshot file of this format version.
+    """
+    header = read_header(path)
+    if header is None:
+        raise ValueError(f"{path} is not a graph snapshot file (format {FORMAT_VERSION})")
+    with open(path, 'rb') as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    n, m = header['nodes'], header['entries']
+    indptr_at, indices_at, weights_at, name_offsets_at, names_at = header['offsets']
+    indptr = np.frombuffer(mapped, dtype='<i8', count=n + 1, offset=indptr_at)
+    indices = np.frombuffer(mapped, dtype='<i4', count=m, offset=indices_at)
+    weights = np.frombuffer(mapped, dtype='<f8', count=m, offset=weights_at)
+
+    # The names have to become Python strings; everything else stays in the mapping
+    blob = mapped[names_at:names_at + header['names_length']]
+    name_offsets = np.frombuffer(mapped, dtype='<i8', count=n + 1, offset=name_offsets_at)
+    names = decode_names(blob, n, header['flags'], name_offsets)
+    instrumentation.count('nodes', n)
+
+    return MappedSnapshot(names, indptr, indices, weights, path, header['stamp']), header['stamp']
+
+def load_cached_snapshot(db_path=DB_PATH, path=None):
+    """
+    Return the snapshot of ``db_path``, from its snapshot file when that is current.
+
+    A missing or stale file (its stamp differs from :func:`database_stamp`) is rebuilt
+    from the database and rewritten. When the file cannot be written, for example in a
+    read-only directory, the snapshot built from the database is returned as is.
+
+    :param path: Snapshot file, defaults to ``db_path`` + ``.snapshot``.
+    """
+    path = path or snapshot_path(db_path)
+    # Taken before reading the database: a commit racing with the load leaves a stale
+    # stamp behind, so the next call rebuilds rather than trusting an old file
+    stamp = database_stamp(db_path)
+    try:
+        header = read_header(path)
+    except OSError:
+        header = None
+    if header is not None and header['stamp'] == stamp:
+        try:
+            return read_snapshot_file(path)[0]
+        except (OSError, ValueError):
+            pass
+
+    snapshot = load_snapshot(db_path)
+    try:
+        write_snapshot_file(snapshot, path, stamp)
+    except OSError as e:
+        print(f"Could not write snapshot file {path}: {e}")
+    return snapshot
+
+if __name__ == "__main__":
+    # Export: python snapshot_file.py [database] [output]
+    db = sys.argv[1] if len(sys.argv) > 1 else DB_PATH
+    output = sys.argv[2] if len(sys.argv) > 2 else snapshot_path(db)
+    stamp = database_stamp(db)
+    write_snapshot_file(load_snapshot(db), output, stamp)
+    print(f"Snapshot of {db} written to {output}")
@@ -0,0 +1,206 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Heavy work (graph loading, Dijkstra, layout, crossing removal) runs on a small thread
+# pool so Tk callbacks return at once. The GUI polls the futures with ``after()`` and
+# shows every queued or running task with a progress bar and a Cancel button. Long
+# loops call :func:`checkpoint`, which reports progress and raises :class:`Cancelled`
+# once the user cancelled; outside a task it does nothing. Tk is only imported by the
+# window code, so layout and search modules can call checkpoint() headless.
+
+# Comparisons that may run at the same time; further submissions wait in the queue
+MAX_WORKERS = 2
+POLL_MS = 100
+
+_local = threading.local()
+
+class Cancelled(Exception):
+    """Raised at a checkpoint of a task whose Cancel button was pressed."""
+
+class Task:
+    """A submitted job: its future, cancel flag and last reported progress."""
+
+    def __init__(self, label, on_done=None, on_error=None):
+        self.label = label
+        self.on_done = on_done
+        self.on_error = on_error
+        self.future = None
+        self.cancel_event = threading.Event()
+        self.stage = "queued"
+        self.done = 0
+        self.total = 0
+        self.started = None
+
+    def cancel(self):
+        self.cancel_event.set()
+        # A task still waiting in the queue never starts
+        if self.future is not None and self.future.cancel():
+            self.stage = "cancelled"
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def report(self, done=None, total=None, stage=None):
+        if stage is not None and stage != self.stage:
+            self.stage = stage
+            self.done, self.total = 0, 0
+        if total is not None:
+            self.total = total
+        if done is not None:
+            self.done = done
+
+    def fraction(self):
+        return min(1.0, self.done / self.total) if self.total else None
+
+def current_task():
+    """The task running on this thread, or None."""
+    return getattr(_local, 'task', None)
+
+def checkpoint(done=None, total=None, stage=None):
+    """
+    Cooperative cancellation point for long loops.
+
+    Records progress (``done`` out of ``total`` within ``stage``) for the running task
+    and raises :class:`Cancelled` if it was cancelled. Costs one attribute lookup when
+    called outside a task, so library code can call it unconditionally.
+    """
+    task = getattr(_local, 'task', None)
+    if task is None:
+        return
+    if task.cancel_event.is_set():
+        raise Cancelled(task.label)
+    task.report(done, total, stage)
+
+def _run(task, fn, args, kwargs):
+    _local.task = task
+    task.started = time.perf_counter()
+    task.report(stage="running")
+    try:
+        checkpoint()
+        return fn(*args, **kwargs)
+    finally:
+        _local.task = None
+
+class TaskScheduler:
+    """
+    Run functions on a thread pool and track them in a "Tasks" window.
+
+    :meth:`submit` returns at once; ``on_done(result)`` or ``on_error(exception)`` is
+    later called on the Tk main thread, where it is safe to open windows and draw.
+    """
+
+    def __init__(self, root, max_workers=MAX_WORKERS):
+        self.root = root
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="task")
+        self.tasks = []
+        self.rows = {}
+        self.window = None
+        self.polling = False
+
+    def submit(self, label, fn, *args, on_done=None, on_error=None, **kwargs):
+        task = Task(label, on_done, on_error)
+        task.future = self.executor.submit(_run, task, fn, args, kwargs)
+        self.tasks.append(task)
+        self._add_row(task)
+        if not self.polling:
+            self.polling = True
+            self.root.after(POLL_MS, self._poll)
+        return task
+
+    def cancel_all(self):
+        for task in self.tasks:
+            task.cancel()
+
+    def _poll(self):
+        for task in list(self.tasks):
+            if task.future.done():
+                self.tasks.remove(task)
+                self._remove_row(task)
+                self._finish(task)
+            else:
+                self._update_row(task)
+        if self.tasks:
+            self.root.after(POLL_MS, self._poll)
+        else:
+            self.polling = False
+
+    def _finish(self, task):
+        if task.future.cancelled():
+            return
+        error = task.future.exception()
+        if isinstance(error, Cancelled):
+            print(f"Cancelled: {task.label}")
+        elif error is not None:
+            if task.on_error is not None:
+                task.on_error(error)
+            else:
+                from tkinter import messagebox
+                messagebox.showerror("Error", f"{task.label} failed:\n{error}")
+        elif task.on_done is not None:
+            task.on_done(task.future.result())
+
+    def _ensure_window(self):
+        import tkinter as tk
+        if self.window is None or not self.window.winfo_exists():
+            self.window = tk.Toplevel(self.root)
+            self.window.title("Tasks")
+            self.window.geometry("460x60")
+            self.window.protocol("WM_DELETE_WINDOW", self.window.withdraw)
+            self.rows = {}
+        self.window.deiconify()
+        return self.window
+
+    def _add_row(self, task):
+        import tkinter as tk
+        from tkinter import ttk
+        window = self._ensure_window()
+        frame = tk.Frame(window)
+        frame.pack(fill='x', padx=8, pady=4)
+        tk.Label(frame, text=task.label, anchor='w', width=22).pack(side=tk.LEFT)
+        bar = ttk.Progressbar(frame, length=160, mode='indeterminate')
+        bar.pack(side=tk.LEFT, padx=4)
+        status = tk.Label(frame, text=task.stage, width=12, anchor='w')
+        status.pack(side=tk.LEFT)
+        tk.Button(frame, text="Cancel", command=task.cancel).pack(side=tk.LEFT)
+        bar.start(15)
+        self.rows[task] = (frame, bar, status)
+        window.geometry(f"460x{30 + 34 * len(self.rows)}")
+
+    def _update_row(self, task):
+        row = self.rows.get(task)
+        if row is None:
+            return
+        _, bar, status = row
+        fraction = task.fraction()
+        if fraction is None:
+            if str(bar['mode']) != 'indeterminate':
+                bar.configure(mode='indeterminate')
+                bar.start(15)
+        else:
+            if str(bar['mode']) != 'determinate':
+                bar.stop()
+                bar.configure(mode='determinate', maximum=1.0)
+            bar['value'] = fraction
+        status['text'] = "cancelling" if task.cancelled else task.stage
+
+    def _remove_row(self, task):
+        row = self.rows.pop(task, None)
+        if row is not None:
+            row[1].stop()
+            row[0].destroy()
+        if not self.rows and self.window is not None and self.window.winfo_exists():
+            self.window.withdraw()
+
+_scheduler = None
+
+def get_scheduler(root=None):
+    """Return the scheduler of the application, creating it for ``root`` on first use."""
+    global _scheduler
+    if _scheduler is None:
+        if root is None:
+            import tkinter as tk
+            root = tk._default_root
+        _scheduler = TaskScheduler(root)
+    return _scheduler
@@ -0,0 +1,49 @@
+import os
+import sqlite3
+import sys
+import pytest
+
+# The modules live at the top of the repository, next to this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generator import generate_vault, write_database
+from database import create_tables
+
+@pytest.fixture
+def v1_db(tmp_path):
+    """Return a function writing a schema version 1 database (text edges table) with the given rows."""
+    def make(edges, nodes=(), name='v1.db'):
+        path = str(tmp_path / name)
+        conn = sqlite3.connect(path)
+        conn.execute('''CREATE TABLE nodes
+                        (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE)''')
+        conn.execute('''CREATE TABLE edges
+                        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                         source TEXT, target TEXT, weight REAL,
+                         UNIQUE(source, target))''')
+        conn.executemany("INSERT INTO nodes (name) VALUES (?)", ((node,) for node in nodes))
+        conn.executemany("INSERT INTO edges (source, target, weight) VALUES (?, ?, ?)", edges)
+        conn.commit()
+        conn.close()
+        return path
+    return make
+
+@pytest.fixture
+def graph_db(tmp_path):
+    """Return a function writing a current-schema database with the given undirected edges."""
+    def make(edges, name='graph.db'):
+        path = str(tmp_path / name)
+        conn = sqlite3.connect(path)
+        create_tables(conn)
+        with conn:
+            conn.executemany("INSERT INTO edges (source, target, weight) VALUES (?, ?, ?)", edges)
+        conn.close()
+        return path
+    return make
+
+@pytest.fixture(scope='module')
+def vault_db(tmp_path_factory):
+    """A seeded synthetic vault of 600 notes in the current schema."""
+    path = str(tmp_path_factory.mktemp('vault') / 'vault.db')
+    write_database(path, *generate_vault(600, seed=3))
+    return path
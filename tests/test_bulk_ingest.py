@@ -0,0 +1,52 @@
+import sqlite3
+import pytest
+from benchmarks.generator import generate_vault, write_chunk_file
+from bulk_ingest import bulk_ingest, iter_file_edges, parse_line
+from graph_snapshot import load_snapshot
+
+def links(path):
+    conn = sqlite3.connect(path)
+    rows = {frozenset((s, t)): w for s, t, w in conn.execute("SELECT source, target, weight FROM edges")}
+    conn.close()
+    return rows
+
+def test_parse_line():
+    assert parse_line("A: B, 5, C, 1.5\n") == [('A', 'B', 5.0), ('A', 'C', 1.5)]
+    assert parse_line("no colon here") is None
+    with pytest.raises(ValueError):
+        parse_line("A: B, x")
+
+def test_dedupe_and_conflicts(tmp_path):
+    chunk = tmp_path / 'chunks.txt'
+    chunk.write_text("A: B, 5, C, 2\n"
+                     "B: A, 7\n"       # reverse direction, different weight: a conflict, last wins
+                     "C: A, 2\n"       # reverse direction, same weight
+                     "A: C, 3\n"       # same direction again: no conflict, last wins
+                     "broken: D, x\n"
+                     "just text\n"
+                     "D: D, 1\n", encoding='utf-8')
+    db = str(tmp_path / 'ingest.db')
+    stats = bulk_ingest(str(chunk), db, progress=None)
+    assert stats['lines'] == 7
+    assert stats['skipped'] == 1
+    assert stats['conflicts'] == 1
+    assert stats['nodes'] == 4
+    assert stats['edges'] == 3
+    assert links(db) == {frozenset('AB'): 7.0, frozenset('AC'): 3.0, frozenset('D'): 1.0}
+
+def test_parallel_parse_and_reingest(tmp_path):
+    names, u, v, w = generate_vault(400, seed=7)
+    chunk = str(tmp_path / 'vault.txt')
+    write_chunk_file(chunk, names, u, v, w)
+    assert list(iter_file_edges(chunk, workers=3)) == list(iter_file_edges(chunk))
+
+    db = str(tmp_path / 'vault.db')
+    stats = bulk_ingest(chunk, db, workers=2, batch_size=100, progress=None)
+    assert stats['edges'] == len(u) and stats['conflicts'] == 0
+    expected = {frozenset((names[a], names[b])): c for a, b, c in zip(u.tolist(), v.tolist(), w.tolist())}
+    assert links(db) == expected
+
+    # A second import of the same file changes nothing
+    bulk_ingest(chunk, db, progress=None)
+    assert links(db) == expected
+    assert load_snapshot(db).number_of_edges() == len(u)
@@ -0,0 +1,84 @@
+import shutil
+import numpy as np
+import pytest
+import communities
+import graph_cache
+from communities import _csr, build_hierarchy, label_propagation
+
+def cliques(count, size, bridge=0.01):
+    # ``count`` cliques of ``size`` nodes with affinity 1, chained by single weak edges
+    u, v, a = [], [], []
+    for c in range(count):
+        base = c * size
+        for i in range(size):
+            for j in range(i + 1, size):
+                u.append(base + i)
+                v.append(base + j)
+                a.append(1.0)
+        if c:
+            u.append(base - 1)
+            v.append(base)
+            a.append(bridge)
+    return _csr(count * size, np.array(u), np.array(v), np.array(a))
+
+def test_label_propagation_finds_cliques():
+    indptr, indices, (affinity,) = cliques(4, 6)
+    labels = label_propagation(indptr, indices, affinity, max_size=50, seed=1)
+    for c in range(4):
+        assert len(set(labels[c * 6:(c + 1) * 6].tolist())) == 1
+    assert len(set(labels.tolist())) == 4
+
+def test_label_propagation_respects_max_size():
+    indptr, indices, (affinity,) = cliques(2, 20, bridge=1.0)
+    for seed in range(3):
+        labels = label_propagation(indptr, indices, affinity, max_size=8, seed=seed)
+        assert np.bincount(labels).max() <= 8
+    # No edges, no changes
+    assert label_propagation(np.zeros(4, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)).tolist() == [0, 1, 2]
+
+@pytest.fixture(scope='module')
+def hierarchy_db(vault_db, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('communities') / 'communities.db')
+    shutil.copy(vault_db, path)
+    yield path
+    graph_cache.invalidate(path)
+
+def test_build_hierarchy_levels_are_consistent(hierarchy_db):
+    snapshot = graph_cache.get_snapshot(hierarchy_db)
+    levels = build_hierarchy(snapshot, top_size=20, max_children=30)
+    assert levels and len(levels[-1]['size']) <= 20
+    sizes = np.ones(len(snapshot.names), dtype=np.int64)
+    u, v = np.array([snapshot.index[a] for a, _ in snapshot.edges()]), np.array([snapshot.index[b] for _, b in snapshot.edges()])
+    for level in levels:
+        parent = level['parent']
+        assert len(parent) == len(sizes)
+        assert np.bincount(parent, minlength=len(level['size'])).max() <= 30
+        assert (np.bincount(parent, weights=sizes) == level['size']).all()
+        sizes = level['size']
+        # Supernode edges count every note link between different supernodes once
+        u, v = parent[u], parent[v]
+        crossing = u != v
+        assert level['links'].sum() == crossing.sum()
+        assert (level['u'] < level['v']).all()
+        u, v = u[crossing], v[crossing]
+    assert sizes.sum() == len(snapshot.names)
+
+def test_stored_hierarchy_round_trip(hierarchy_db):
+    counts = communities.build_communities(hierarchy_db, top_size=20, max_children=30)
+    hierarchy = communities.load_hierarchy(hierarchy_db)
+    assert hierarchy.levels == len(counts)
+    assert len(hierarchy.top()) == counts[-1] <= 20
+    assert hierarchy.notes == len(hierarchy.snapshot.names)
+
+    top = hierarchy.top()
+    assert sum(hierarchy.size(item) for item in top) == hierarchy.notes
+    item = max(top, key=hierarchy.size)
+    children = hierarchy.children(item)
+    assert all(hierarchy.parent(child) == item for child in children)
+    assert sum(hierarchy.size(child) for child in children) == hierarchy.size(item)
+
+    # Expanding one supernode keeps the number of note links between the shown items
+    edges = hierarchy.edges(top)
+    expanded = hierarchy.edges([other for other in top if other != item] + children)
+    inside = sum(links for (a, b), (links, _) in expanded.items() if a in children and b in children)
+    assert sum(links for links, _ in expanded.values()) - inside == sum(links for links, _ in edges.values())
@@ -0,0 +1,76 @@
+import itertools
+import numpy as np
+from crossings import CrossingIndex, segments_intersect
+
+def intersect(*points):
+    return bool(segments_intersect(*(np.array([p], dtype=np.float64) for p in points))[0])
+
+def brute_force(edges, pos):
+    found = set()
+    for (e, (u1, v1)), (f, (u2, v2)) in itertools.combinations(enumerate(edges), 2):
+        if len({u1, v1, u2, v2}) < 4:
+            continue
+        if intersect(pos[u1], pos[v1], pos[u2], pos[v2]):
+            found.add((e, f))
+    return found
+
+def random_graph(n=60, m=120, seed=0):
+    rng = np.random.default_rng(seed)
+    pos = {i: tuple(rng.random(2)) for i in range(n)}
+    edges = list({tuple(sorted(rng.choice(n, 2, replace=False).tolist())) for _ in range(m)})
+    return edges, pos
+
+def pairs(index):
+    return {tuple(sorted(pair)) for pair in index.crossing_pairs()}
+
+def test_segments_intersect():
+    assert intersect((0, 0), (1, 1), (0, 1), (1, 0))
+    assert not intersect((0, 0), (1, 0), (0, 1), (1, 1))
+    assert not intersect((0, 0), (1, 1), (2, 2), (3, 0))
+
+def test_matches_brute_force():
+    edges, pos = random_graph()
+    index = CrossingIndex(edges, pos)
+    assert pairs(index) == brute_force(edges, pos)
+    assert index.count_crossings() == len(brute_force(edges, pos))
+
+def test_stays_exact_after_moves():
+    edges, pos = random_graph(seed=1)
+    index = CrossingIndex(edges, pos, cell_size=0.05)
+    rng = np.random.default_rng(2)
+    for step in range(30):
+        node = int(rng.integers(len(pos)))
+        pos[node] = tuple(np.clip(np.add(pos[node], rng.normal(scale=0.2, size=2)), -0.5, 1.5))
+        if step % 3:
+            index.move_node(node, pos[node])
+        else:
+            index.sync(pos, [node])
+        if step % 5 == 0:
+            assert pairs(index) == brute_force(edges, pos)
+    assert pairs(index) == brute_force(edges, pos)
+
+def test_crossing_edges_names_the_ends():
+    pos = {'a': (0, 0), 'b': (1, 1), 'c': (0, 1), 'd': (1, 0), 'e': (5, 5)}
+    index = CrossingIndex([('a', 'b'), ('c', 'd'), ('b', 'e')], pos)
+    assert list(index.crossing_edges()) == [('a', 'b', 'c', 'd')]
+
+def test_remove_crossings_leaves_the_index_exact():
+    import networkx as nx
+    from visualization import remove_crossings
+    edges, pos = random_graph(n=30, m=45, seed=5)
+    G = nx.Graph(edges)
+    fixed = {0, 1, 2}
+    start = dict(pos)
+    before = len(brute_force(edges, pos))
+    passes, remaining = remove_crossings(pos, G, fixed=fixed)
+    assert 1 <= passes <= 50
+    assert remaining == len(brute_force(edges, pos)) < before
+    assert all(pos[node] == start[node] for node in fixed)
+
+def test_crossings_at_node():
+    edges, pos = random_graph()
+    index = CrossingIndex(edges, pos)
+    node = edges[0][0]
+    expected = sorted(crossing for crossing in index.crossing_edges() if node in crossing[:2] or node in crossing[2:])
+    assert sorted(index.crossings_at(node)) == expected
+    assert index.crossings_at('missing') == []
@@ -0,0 +1,150 @@
+import csv
+import sqlite3
+import pytest
+from database import (SCHEMA_VERSION, create_tables, get_graph_version, get_schema_version, migrate_to_v2,
+                      migrate_to_v3, upgrade_database)
+
+def edge_rows(path):
+    conn = sqlite3.connect(path)
+    rows = sorted(conn.execute("SELECT source, target, weight FROM edges"))
+    conn.close()
+    return rows
+
+def test_migrate_v1_to_v2_keeps_directed_rows(v1_db):
+    path = v1_db([('a', 'b', 5), ('b', 'a', 7), ('c', 'a', 2)], nodes=['a'])
+    conn = sqlite3.connect(path)
+    migrate_to_v2(conn)
+    assert get_schema_version(conn) == 2
+    # Endpoints missing from nodes are added in order of first appearance
+    assert conn.execute("SELECT name FROM nodes ORDER BY id").fetchall() == [('a',), ('b',), ('c',)]
+    rows = conn.execute('''SELECT s.name, t.name, l.weight FROM links l
+                           JOIN nodes s ON s.id = l.source_id JOIN nodes t ON t.id = l.target_id''').fetchall()
+    assert sorted(rows) == [('a', 'b', 5), ('b', 'a', 7), ('c', 'a', 2)]
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'edges_v1'").fetchone() is None
+    conn.close()
+
+def test_update_and_delete_through_view(graph_db):
+    path = graph_db([('a', 'b', 5), ('b', 'c', 2)])
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("UPDATE edges SET weight = 9 WHERE source = 'b' AND target = 'a'")
+        conn.execute("DELETE FROM edges WHERE source = 'c' AND target = 'b'")
+    conn.close()
+    assert edge_rows(path) == [('a', 'b', 9), ('b', 'a', 9)]
+
+def test_update_through_view_renames_an_endpoint(graph_db):
+    path = graph_db([('a', 'b', 5)])
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("UPDATE edges SET target = 'c' WHERE source = 'b' AND target = 'a'")
+    conn.close()
+    assert edge_rows(path) == [('b', 'c', 5), ('c', 'b', 5)]
+
+def test_insert_through_view_adds_nodes(graph_db):
+    path = graph_db([('a', 'b', 5)])
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("INSERT INTO edges (source, target, weight) VALUES ('c', 'a', 1)")
+    assert sorted(name for (name,) in conn.execute("SELECT name FROM nodes")) == ['a', 'b', 'c']
+    conn.close()
+    assert edge_rows(path) == [('a', 'b', 5), ('a', 'c', 1), ('b', 'a', 5), ('c', 'a', 1)]
+
+def test_upgrade_v1_stores_pairs_once(v1_db):
+    path = v1_db([('a', 'b', 5), ('b', 'a', 7), ('c', 'a', 2), ('b', 'c', 1), ('c', 'b', 1)])
+    assert upgrade_database(path)
+    conn = sqlite3.connect(path)
+    assert get_schema_version(conn) == SCHEMA_VERSION == 4
+    assert conn.execute("SELECT COUNT(*) FROM links WHERE source_id > target_id").fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM links").fetchone()[0] == 3
+    conn.close()
+    # The edges view lists every pair in both directions, with the minimum weight by default
+    assert edge_rows(path) == [('a', 'b', 5), ('a', 'c', 2), ('b', 'a', 5), ('b', 'c', 1),
+                               ('c', 'a', 2), ('c', 'b', 1)]
+    assert not upgrade_database(path)
+
+@pytest.mark.parametrize('rule, weight', [('min', 5), ('max', 7), ('avg', 6)])
+def test_upgrade_weight_rule(v1_db, rule, weight):
+    path = v1_db([('a', 'b', 5), ('b', 'a', 7)])
+    upgrade_database(path, weight_rule=rule)
+    assert edge_rows(path) == [('a', 'b', weight), ('b', 'a', weight)]
+
+def test_upgrade_lists_conflicts(v1_db):
+    path = v1_db([('a', 'b', 5), ('b', 'a', 7), ('a', 'c', 2), ('c', 'a', 2), ('d', 'a', 4)])
+    upgrade_database(path)
+    with open(path + '.v3-conflicts.csv', newline='', encoding='utf-8') as file:
+        rows = list(csv.reader(file))
+    assert rows == [['source', 'target', 'weight', 'reverse_weight'], ['a', 'b', '5.0', '7.0']]
+
+def test_upgrade_without_conflicts_writes_no_csv(v1_db, tmp_path):
+    path = v1_db([('a', 'b', 5), ('b', 'a', 5)])
+    upgrade_database(path)
+    assert not (tmp_path / 'v1.db.v3-conflicts.csv').exists()
+
+def test_invalid_weight_rule(v1_db):
+    path = v1_db([('a', 'b', 5)])
+    with pytest.raises(ValueError):
+        upgrade_database(path, weight_rule='median')
+    # The rule is checked before the version 3 transaction starts; the database stays
+    # at version 2 with its directed rows
+    conn = sqlite3.connect(path)
+    assert get_schema_version(conn) == 2
+    assert conn.execute("SELECT COUNT(*) FROM links").fetchone()[0] == 1
+    conn.close()
+
+def test_insert_through_view_addresses_the_pair(graph_db):
+    path = graph_db([('a', 'b', 5)])
+    conn = sqlite3.connect(path)
+    ids = dict(conn.execute("SELECT name, id FROM nodes"))
+    with conn:
+        # The reverse direction updates the same row; new names become nodes
+        conn.execute("INSERT OR REPLACE INTO edges (source, target, weight) VALUES ('b', 'a', 3)")
+        conn.execute("INSERT INTO edges (source, target, weight) VALUES ('c', 'a', 1)")
+    assert conn.execute("SELECT source_id, target_id, weight FROM links ORDER BY 1, 2").fetchall() == [
+        (ids['a'], ids['b'], 3), (ids['a'], conn.execute("SELECT id FROM nodes WHERE name = 'c'").fetchone()[0], 1)]
+    # OR REPLACE never replaced the nodes it touched
+    assert dict(conn.execute("SELECT name, id FROM nodes WHERE name IN ('a', 'b')")) == ids
+    conn.close()
+
+def test_create_tables_migrates_old_schema(v1_db):
+    path = v1_db([('a', 'b', 5), ('b', 'a', 7)])
+    conn = sqlite3.connect(path)
+    report = create_tables(conn, 'max')
+    assert report['rows_before'] == 2 and report['rows_after'] == 1
+    assert report['conflicts'] == [('a', 'b', 5, 7)]
+    conn.close()
+
+def test_graph_version_changes_with_nodes_and_links_only(graph_db):
+    path = graph_db([('a', 'b', 5)])
+    conn = sqlite3.connect(path)
+    version = get_graph_version(conn)
+    assert version is not None
+    with conn:
+        conn.execute("CREATE TABLE positions (node TEXT, x REAL)")
+        conn.execute("INSERT INTO positions VALUES ('a', 1)")
+    assert get_graph_version(conn) == version
+    for statement in ("INSERT INTO edges (source, target, weight) VALUES ('b', 'c', 1)",
+                      "UPDATE links SET weight = 2",
+                      "DELETE FROM edges WHERE source = 'c'",
+                      "UPDATE nodes SET name = 'x' WHERE name = 'a'"):
+        with conn:
+            conn.execute(statement)
+        assert get_graph_version(conn) != version, statement
+        version = get_graph_version(conn)
+    conn.close()
+
+def test_upgrade_v3_adds_the_graph_version(v1_db):
+    path = v1_db([('a', 'b', 5), ('b', 'a', 5)])
+    conn = sqlite3.connect(path)
+    migrate_to_v2(conn)
+    migrate_to_v3(conn)
+    assert get_schema_version(conn) == 3 and get_graph_version(conn) is None
+    conn.close()
+    assert upgrade_database(path)
+    conn = sqlite3.connect(path)
+    assert get_schema_version(conn) == 4
+    version = get_graph_version(conn)
+    with conn:
+        conn.execute("DELETE FROM links")
+    assert get_graph_version(conn) != version
+    conn.close()
+    assert edge_rows(path) == []
@@ -0,0 +1,111 @@
+import random
+import sqlite3
+import statistics
+import pytest
+import edge_stats
+from edge_stats import EdgeStats, TDigest
+
+def weights(n=2000, seed=0):
+    rng = random.Random(seed)
+    return [round(rng.lognormvariate(1.5, 0.6), 1) for _ in range(n)]
+
+def assert_same(stats, values):
+    assert stats.count == len(values)
+    assert stats.mean == pytest.approx(statistics.fmean(values))
+    assert stats.variance == pytest.approx(statistics.pvariance(values))
+    expected = {}
+    for x in values:
+        expected[stats._bin(x)] = expected.get(stats._bin(x), 0) + 1
+    assert stats.histogram == expected
+
+def test_merge_equals_one_stream():
+    values = weights()
+    merged = EdgeStats()
+    for i in range(0, len(values), 300):
+        part = EdgeStats()
+        part.update(values[i:i + 300])
+        merged.merge(part)
+    assert_same(merged, values)
+    assert (merged.min, merged.max) == (min(values), max(values))
+
+def test_merge_into_empty_and_with_empty():
+    values = weights(50)
+    stats = EdgeStats()
+    stats.update(values)
+    assert_same(EdgeStats().merge(stats), values)
+    assert_same(stats.merge(EdgeStats()), values)
+
+def test_remove_undoes_add():
+    values = weights()
+    stats = EdgeStats()
+    stats.update(values)
+    for x in values[:700]:
+        stats.remove(x)
+    assert_same(stats, values[700:])
+    assert stats.removed == 700
+
+def test_remove_of_an_extreme_marks_bounds_stale():
+    stats = EdgeStats()
+    stats.update([1.0, 2.0, 3.0])
+    stats.remove(2.0)
+    assert not stats.bounds_stale
+    stats.remove(3.0)
+    assert stats.bounds_stale
+
+def test_remove_last_value_resets():
+    stats = EdgeStats(bin_width=0.5)
+    stats.add(4.0)
+    stats.remove(4.0)
+    assert stats.count == 0 and stats.histogram == {} and stats.bin_width == 0.5
+    assert stats.summary()['mean'] is None
+
+def test_digest_quantiles_are_close():
+    values = sorted(weights(20000, seed=1))
+    digest = TDigest()
+    digest.update(values[::2])
+    other = TDigest()
+    other.update(values[1::2])
+    digest.merge(other)
+    for q in (0.01, 0.25, 0.5, 0.9, 0.99):
+        rank = values.index(min(values, key=lambda x: abs(x - digest.quantile(q)))) / len(values)
+        assert abs(rank - q) < 0.01, q
+    assert digest.quantile(0.0) == values[0] and digest.quantile(1.0) == values[-1]
+
+def test_exact_quantiles(graph_db):
+    values = weights(501, seed=2)
+    path = graph_db([(f"n{i}", f"n{i + 1}", w) for i, w in enumerate(values)])
+    result = edge_stats.exact_quantiles((0.0, 0.25, 0.5, 0.9, 1.0), path)
+    assert result[0.5] == statistics.median(values)
+    assert result[0.0] == min(values) and result[1.0] == max(values)
+    # Linear interpolation between ranks, like statistics.quantiles(method='inclusive')
+    quartiles = statistics.quantiles(values, n=4, method='inclusive')
+    assert result[0.25] == pytest.approx(quartiles[0])
+    assert result[0.9] == pytest.approx(statistics.quantiles(values, n=10, method='inclusive')[8])
+
+def test_exact_median_of_an_even_count(graph_db):
+    path = graph_db([('a', 'b', 1), ('b', 'c', 2), ('c', 'd', 6), ('d', 'e', 10)])
+    assert edge_stats.exact_quantiles((0.5,), path) == {0.5: 4.0}
+
+def test_exact_quantiles_of_an_empty_graph(graph_db):
+    assert edge_stats.exact_quantiles((0.5, 0.9), graph_db([])) == {0.5: None, 0.9: None}
+
+def test_compute_stats_counts_pairs_once(graph_db):
+    path = graph_db([('a', 'b', 1), ('b', 'a', 3), ('b', 'c', 5)])
+    stats = edge_stats.compute_stats(path)
+    assert stats.count == 2 and stats.mean == 4.0
+    summary = edge_stats.sql_summary(path)
+    assert (summary['count'], summary['mean'], summary['variance']) == (2, 4.0, 1.0)
+
+def test_get_stats_ignores_writes_outside_the_graph(graph_db):
+    path = graph_db([('a', 'b', 1), ('b', 'c', 5)])
+    stats = edge_stats.get_stats(path)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("CREATE TABLE positions (node TEXT, x REAL)")
+        conn.execute("INSERT INTO positions VALUES ('a', 0.5)")
+    assert edge_stats.get_stats(path) is stats
+    with conn:
+        conn.execute("INSERT INTO edges (source, target, weight) VALUES ('c', 'd', 3)")
+    conn.close()
+    assert edge_stats.get_stats(path).count == 3
+    edge_stats.invalidate(path)
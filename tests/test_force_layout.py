@@ -0,0 +1,51 @@
+import networkx as nx
+import numpy as np
+import pytest
+from force_layout import _repulsion, barnes_hut_layout
+from graph_snapshot import GraphSnapshot
+
+def exact_repulsion(P, k):
+    delta = P[:, None, :] - P[None, :, :]
+    dist2 = np.maximum((delta * delta).sum(axis=2), 1e-12)
+    np.fill_diagonal(dist2, np.inf)
+    return (delta * (k * k / dist2)[:, :, None]).sum(axis=1)
+
+@pytest.mark.parametrize('dim', [2, 3])
+def test_repulsion_with_theta_zero_is_exact(dim):
+    P = np.random.default_rng(0).random((80, dim))
+    assert _repulsion(P, 0.2, theta=0) == pytest.approx(exact_repulsion(P, 0.2))
+    # The approximation stays close
+    approx = _repulsion(P, 0.2, theta=0.5)
+    exact = exact_repulsion(P, 0.2)
+    assert np.linalg.norm(approx - exact) < 0.1 * np.linalg.norm(exact)
+
+def test_fixed_nodes_keep_their_position():
+    G = nx.les_miserables_graph()
+    nodes = list(G)
+    pos = nx.circular_layout(G)
+    pinned = set(nodes[:10])
+    result = barnes_hut_layout(G, pos=pos, fixed=pinned, iterations=30, seed=1)
+    for node in nodes:
+        if node in pinned:
+            assert np.array_equal(result[node], pos[node])
+        else:
+            assert not np.array_equal(result[node], pos[node])
+
+def test_nodes_without_a_start_position_are_not_pinned():
+    G = nx.path_graph(6)
+    pos = {i: (float(i), 0.0) for i in range(4)}
+    result = barnes_hut_layout(G, pos=pos, fixed=range(6), iterations=10, seed=1)
+    for i in range(4):
+        assert np.array_equal(result[i], pos[i])
+    assert all(np.isfinite(result[i]).all() for i in (4, 5))
+
+def test_snapshot_and_graph_layouts_agree():
+    G = nx.karate_club_graph()
+    snapshot = GraphSnapshot.from_networkx(G)
+    a = barnes_hut_layout(G, dim=3, iterations=20, seed=4)
+    b = barnes_hut_layout(snapshot, dim=3, iterations=20, seed=4)
+    assert set(a) == set(b)
+    for node in a:
+        assert a[node] == pytest.approx(b[node])
+    # Without pinned nodes the result is rescaled like nx.spring_layout
+    assert np.abs(np.array(list(a.values()))).max() == pytest.approx(1.0)
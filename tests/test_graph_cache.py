@@ -0,0 +1,44 @@
+import sqlite3
+import networkx as nx
+import graph_cache
+
+def test_cached_graph_and_snapshot_agree(vault_db):
+    G = graph_cache.get_graph(vault_db)
+    snapshot = graph_cache.get_snapshot(vault_db)
+    # The nx.Graph is built from links alone, so notes without links only appear in the snapshot
+    assert set(G) <= set(snapshot.nodes())
+    assert all(snapshot.degree(node) == 0 for node in set(snapshot.nodes()) - set(G))
+    assert nx.utils.edges_equal(snapshot.to_networkx(G).edges(data=True), G.edges(data=True))
+
+def test_reloads_only_after_another_connection_writes(graph_db):
+    path = graph_db([('a', 'b', 1.0), ('b', 'c', 2.0)])
+    G = graph_cache.get_graph(path)
+    snapshot = graph_cache.get_snapshot(path)
+    assert graph_cache.get_graph(path) is G
+    assert graph_cache.get_snapshot(path) is snapshot
+
+    # Writes through the cache's own connection keep the loaded graph
+    graph_cache.side_write(lambda conn: conn.execute("CREATE TABLE scratch (x)"), path)
+    assert graph_cache.get_graph(path) is G
+
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("INSERT INTO edges (source, target, weight) VALUES ('c', 'd', 3.0)")
+    conn.close()
+    reloaded = graph_cache.get_graph(path)
+    assert reloaded is not G and reloaded['c']['d']['weight'] == 3.0
+    assert graph_cache.get_snapshot(path).has_edge('d', 'c')
+    graph_cache.invalidate(path)
+
+def test_apply_edges_patches_without_reload(graph_db):
+    path = graph_db([('a', 'b', 1.0)])
+    G = graph_cache.get_graph(path)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("INSERT INTO edges (source, target, weight) VALUES ('b', 'c', 2.0)")
+    conn.close()
+    graph_cache.apply_edges([('b', 'c', 2.0)], path)
+    assert graph_cache.get_graph(path) is G
+    assert G['b']['c']['weight'] == 2.0
+    assert graph_cache.get_snapshot(path).has_edge('b', 'c')
+    graph_cache.invalidate(path)
@@ -0,0 +1,104 @@
+import sqlite3
+import pytest
+import communities
+import graph_replace
+import node_metrics
+from graph_replace import bulk_rename_nodes
+from position_cache import create_positions_table
+
+def edges(path):
+    conn = sqlite3.connect(path)
+    rows = sorted(conn.execute("SELECT source, target, weight FROM edges WHERE source < target"))
+    conn.close()
+    return rows
+
+def nodes(path):
+    conn = sqlite3.connect(path)
+    names = sorted(name for (name,) in conn.execute("SELECT name FROM nodes"))
+    conn.close()
+    return names
+
+def test_plain_rename(graph_db):
+    path = graph_db([('a', 'b', 1), ('b', 'c', 2)])
+    report = bulk_rename_nodes(path, {'a': 'x', 'missing': 'y', 'c': 'c'})
+    assert report == {'mappings': 2, 'unknown': 1, 'renamed': 1, 'merged': 0,
+                      'edges_combined': 0, 'self_loops_dropped': 0}
+    assert edges(path) == [('b', 'c', 2), ('b', 'x', 1)]
+
+def test_swap(graph_db):
+    path = graph_db([('a', 'c', 1), ('b', 'c', 2)])
+    bulk_rename_nodes(path, [('a', 'b'), ('b', 'a')])
+    assert edges(path) == [('a', 'c', 2), ('b', 'c', 1)]
+
+@pytest.mark.parametrize('rule, weight', [('min', 2), ('max', 5), ('sum', 7)])
+def test_merge_combines_parallel_edges(graph_db, rule, weight):
+    # a merges into b: a-c and b-c collapse into one edge, a-b would become a self-loop
+    path = graph_db([('a', 'c', 5), ('b', 'c', 2), ('a', 'b', 4), ('a', 'd', 1)])
+    report = bulk_rename_nodes(path, {'a': 'b'}, weight_rule=rule)
+    assert (report['merged'], report['edges_combined'], report['self_loops_dropped']) == (1, 1, 1)
+    assert nodes(path) == ['b', 'c', 'd']
+    assert edges(path) == [('b', 'c', weight), ('b', 'd', 1)]
+
+def test_several_nodes_merge_into_a_new_name(graph_db):
+    path = graph_db([('a', 'x', 1), ('b', 'x', 3), ('c', 'y', 2)])
+    report = bulk_rename_nodes(path, {'a': 'm', 'b': 'm', 'c': 'm'})
+    assert report['merged'] == 2 and report['renamed'] == 1
+    assert edges(path) == [('m', 'x', 1), ('m', 'y', 2)]
+
+def test_dry_run_changes_nothing(graph_db):
+    path = graph_db([('a', 'c', 5), ('b', 'c', 2)])
+    before = edges(path)
+    report = bulk_rename_nodes(path, {'a': 'b'}, dry_run=True)
+    assert report['merged'] == 1
+    assert edges(path) == before and nodes(path) == ['a', 'b', 'c']
+
+def test_invalid_weight_rule(graph_db):
+    with pytest.raises(ValueError):
+        bulk_rename_nodes(graph_db([('a', 'b', 1)]), {'a': 'b'}, weight_rule='avg')
+
+def test_load_mapping(tmp_path):
+    csv_path = tmp_path / 'renames.csv'
+    csv_path.write_text("old,new\na,b\nc,d\n", encoding='utf-8')
+    assert list(graph_replace.load_mapping(str(csv_path))) == [('a', 'b'), ('c', 'd')]
+
+def test_stored_metrics_follow_the_rename(graph_db):
+    path = graph_db([('a', 'b', 1), ('b', 'c', 2), ('p', 'q', 3), ('q', 'r', 1), ('r', 's', 2)])
+    node_metrics.rebuild_metrics(path, processes=1)
+    before = {row[0]: row[1:] for row in node_metrics.query_metrics(limit=None, db_path=path)}
+    bulk_rename_nodes(path, {'a': 'z', 's': 'r'})
+    after = {row[0]: row[1:] for row in node_metrics.query_metrics(limit=None, db_path=path)}
+    # A plain rename keeps the row; the merged node and its component are recomputed
+    assert after['z'] == before['a']
+    assert 'a' not in after and 's' not in after
+    snapshot = graph_replace.graph_cache.get_snapshot(path)
+    fresh = {row[0]: row[1:] for row in node_metrics.compute_metrics(snapshot, list(snapshot.nodes()), 1)}
+    assert after == fresh
+    assert after['r'] != before['r']
+
+def test_community_members_follow_the_rename(graph_db):
+    path = graph_db([('a', 'b', 1), ('b', 'c', 2), ('c', 'a', 1), ('d', 'e', 1)])
+    communities.build_communities(path)
+    conn = sqlite3.connect(path)
+    before = dict(conn.execute("SELECT node, community FROM community_members"))
+    conn.close()
+    bulk_rename_nodes(path, {'a': 'x', 'e': 'd'})
+    conn = sqlite3.connect(path)
+    after = dict(conn.execute("SELECT node, community FROM community_members"))
+    conn.close()
+    assert after == {'x': before['a'], 'b': before['b'], 'c': before['c'], 'd': before['d']}
+
+def test_positions_follow_a_swap_and_a_merge(graph_db):
+    path = graph_db([('a', 'c', 1), ('b', 'c', 2), ('d', 'e', 1)])
+    conn = sqlite3.connect(path)
+    create_positions_table(conn)
+    with conn:
+        conn.executemany("INSERT INTO positions (node, view, x, y) VALUES (?, ?, ?, ?)",
+                         [(node, view, float(i), 0.0) for i, node in enumerate('abcde') for view in ('2d', '3d')])
+    conn.close()
+    # d has the lower id, so e merges into it under d's name
+    bulk_rename_nodes(path, [('a', 'b'), ('b', 'a'), ('e', 'd')])
+    conn = sqlite3.connect(path)
+    rows = sorted(conn.execute("SELECT node, view, x FROM positions"))
+    conn.close()
+    assert rows == [(node, view, x) for node, x in (('a', 1.0), ('b', 0.0), ('c', 2.0), ('d', 3.0))
+                    for view in ('2d', '3d')]
@@ -0,0 +1,42 @@
+import networkx as nx
+import pytest
+from graph_snapshot import GraphSnapshot, load_snapshot, single_source_dijkstra_path_length
+
+EDGES = [('a', 'b', 1.0), ('b', 'c', 2.5), ('a', 'c', 4.0), ('c', 'd', 1.0),
+         ('d', 'd', 0.5), ('e', 'f', 3.0)]
+
+def test_from_edges_keeps_the_last_weight_and_first_position():
+    names = ['a', 'b', 'c']
+    snapshot = GraphSnapshot.from_edges(names, [0, 1, 1, 2], [1, 2, 0, 0], [1.0, 2.0, 5.0, 3.0])
+    G = nx.Graph()
+    G.add_weighted_edges_from([('a', 'b', 1.0), ('b', 'c', 2.0), ('b', 'a', 5.0), ('c', 'a', 3.0)])
+    assert snapshot.number_of_edges() == G.number_of_edges() == 3
+    assert snapshot['a'] == {n: {'weight': d['weight']} for n, d in G['a'].items()}
+    assert list(snapshot.neighbors('b')) == list(G.neighbors('b'))
+
+def test_loaded_snapshot_matches_networkx(graph_db, v1_db):
+    G = nx.Graph()
+    G.add_weighted_edges_from(EDGES)
+    for path in (graph_db(EDGES), v1_db(EDGES)):
+        snapshot = load_snapshot(path)
+        assert sorted(snapshot.nodes()) == sorted(G.nodes())
+        assert snapshot.number_of_edges() == G.number_of_edges()
+        for node in G:
+            assert sorted(snapshot.neighbors(node)) == sorted(G.neighbors(node))
+            assert snapshot.degree(node) == G.degree(node)
+        for u, v, data in G.edges(data=True):
+            assert snapshot.has_edge(u, v) and snapshot.has_edge(v, u)
+            assert snapshot[u][v]['weight'] == data['weight']
+        assert not snapshot.has_edge('a', 'f')
+        assert nx.utils.graphs_equal(snapshot.to_networkx(), G)
+
+def test_dijkstra_matches_networkx(vault_db):
+    snapshot = load_snapshot(vault_db)
+    G = snapshot.to_networkx()
+    for source in snapshot.names[::50]:
+        expected = nx.single_source_dijkstra_path_length(G, source)
+        result = single_source_dijkstra_path_length(snapshot, source)
+        assert list(result) == list(expected)
+        assert result == pytest.approx(expected)
+        assert single_source_dijkstra_path_length(snapshot, source, cutoff=2.0) == \
+            pytest.approx(nx.single_source_dijkstra_path_length(G, source, cutoff=2.0))
@@ -0,0 +1,41 @@
+import json
+import pytest
+import instrumentation
+import visualization
+
+@pytest.fixture
+def tracing(tmp_path):
+    instrumentation.reset()
+    instrumentation.enable(str(tmp_path / 'trace.json'))
+    yield tmp_path / 'trace.json'
+    instrumentation.disable()
+    instrumentation.reset()
+
+def test_spans_nest_and_record_counters(tracing):
+    with instrumentation.span('outer', kind='test') as outer:
+        instrumentation.count('rows', 3)
+        stage = instrumentation.start('inner')
+        instrumentation.count('rows', 2)
+        stage.end(done=1)
+        instrumentation.count('rows')
+    assert instrumentation._stack() == []
+    assert outer.args == {'kind': 'test', 'rows': 4}
+    assert instrumentation.write_trace() == str(tracing)
+    events = {event['name']: event for event in json.loads(tracing.read_text())['traceEvents']}
+    assert events['inner']['args'] == {'rows': 2, 'done': 1}
+    assert events['outer']['dur'] >= events['inner']['dur']
+
+def test_unknown_layout_type_leaves_no_open_span(tracing):
+    for layout in (visualization.layout_local_graph_2D, visualization.layout_local_graph_3D):
+        with pytest.raises(ValueError, match="Unknown layout type"):
+            layout(['a'], [], layout_type='no_such_layout')
+        assert instrumentation._stack() == []
+
+def test_traced_closes_its_span_on_error(tracing):
+    @instrumentation.traced('failing')
+    def failing():
+        raise KeyError('x')
+
+    with pytest.raises(KeyError):
+        failing()
+    assert instrumentation._stack() == []
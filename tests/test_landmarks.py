@@ -0,0 +1,76 @@
+import shutil
+import sqlite3
+import numpy as np
+import pytest
+import graph_cache
+import landmarks
+from nearest import iter_nearest, k_nearest
+from position_cache import save_positions
+from snapshot_file import database_stamp
+
+@pytest.fixture(scope='module')
+def oracle(vault_db):
+    return landmarks.build_oracle(graph_cache.get_snapshot(vault_db), landmarks=8, processes=1)
+
+def sources(snapshot, count=40):
+    # Hubs, where the pruning matters most, and a spread of ordinary notes
+    by_degree = np.argsort(np.diff(snapshot.indptr))[::-1]
+    picked = by_degree[:count // 2].tolist() + list(range(0, len(snapshot.names), len(snapshot.names) // (count // 2)))
+    return [snapshot.names[i] for i in dict.fromkeys(picked)]
+
+@pytest.mark.parametrize('k', [1, 5, 20, 100])
+def test_k_nearest_matches_dijkstra(oracle, k):
+    snapshot = oracle.snapshot
+    for source in sources(snapshot):
+        assert oracle.k_nearest(source, k) == k_nearest(snapshot, source, k), source
+
+def test_exact_distance_matches_dijkstra(oracle):
+    snapshot = oracle.snapshot
+    source = snapshot.names[0]
+    expected = dict(iter_nearest(snapshot, source))
+    for target in sources(snapshot):
+        distance, error = oracle.distance(source, target)
+        assert error == 0.0
+        assert distance == pytest.approx(expected.get(target, np.inf))
+
+def test_bounds_enclose_the_distance(oracle):
+    snapshot = oracle.snapshot
+    source = snapshot.names[1]
+    expected = dict(iter_nearest(snapshot, source))
+    for target in sources(snapshot):
+        lower, upper = oracle.bounds(source, target)
+        d = expected.get(target, np.inf)
+        assert lower <= d + 1e-4 and d <= upper + 1e-4
+        approx, error = oracle.distance(source, target, exact=False)
+        assert approx - error - 1e-4 <= d <= approx + 1e-4
+
+def test_file_round_trip(oracle, tmp_path):
+    path = str(tmp_path / 'oracle.landmarks')
+    landmarks.write_oracle(oracle, path)
+    loaded, _ = landmarks.read_oracle(path, oracle.snapshot)
+    assert loaded.landmarks.tolist() == oracle.landmarks.tolist()
+    assert np.array_equal(loaded.distances, oracle.distances)
+
+def test_unknown_node(oracle):
+    with pytest.raises(KeyError):
+        oracle.k_nearest('no such note', 5)
+
+def test_positions_write_keeps_the_oracle_file(vault_db, tmp_path):
+    path = str(tmp_path / 'vault.db')
+    shutil.copy(vault_db, path)
+    snapshot = graph_cache.get_snapshot(path)
+    landmarks.write_oracle(landmarks.build_oracle(snapshot, landmarks=4, processes=1),
+                           landmarks.oracle_path(path), database_stamp(path))
+    stamp = landmarks.read_stamp(landmarks.oracle_path(path))
+
+    save_positions({snapshot.names[0]: (0.0, 1.0)}, 'test', graph_cache.get_graph(path), path)
+    assert landmarks.refresh_oracle(path) is None
+    assert landmarks.read_stamp(landmarks.oracle_path(path)) == stamp
+
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("INSERT INTO edges (source, target, weight) VALUES (?, ?, 0.5)",
+                     (snapshot.names[0], snapshot.names[1]))
+    conn.close()
+    assert landmarks.refresh_oracle(path) is not None
+    assert landmarks.read_stamp(landmarks.oracle_path(path)) == database_stamp(path) != stamp
@@ -0,0 +1,47 @@
+import itertools
+import networkx as nx
+import numpy as np
+from layout_refine import close_pairs, refine_layout
+
+def brute_force(P, threshold):
+    return {(a, b) for a, b in itertools.combinations(range(len(P)), 2)
+            if np.all(np.abs(P[a] - P[b]) < threshold)}
+
+def test_close_pairs_matches_brute_force():
+    rng = np.random.default_rng(1)
+    for threshold in (0.05, 0.1, 0.3):
+        P = rng.random((300, 2)) * 2 - 1
+        a, b = close_pairs(P, threshold)
+        assert (a < b).all()
+        assert len(set(zip(a.tolist(), b.tolist()))) == len(a)
+        assert set(zip(a.tolist(), b.tolist())) == brute_force(P, threshold)
+
+def test_close_pairs_edge_cases():
+    assert [len(x) for x in close_pairs(np.zeros((1, 2)), 0.1)] == [0, 0]
+    a, b = close_pairs(np.zeros((3, 2)), 0.1)
+    assert set(zip(a.tolist(), b.tolist())) == {(0, 1), (0, 2), (1, 2)}
+    # Exactly the threshold apart is not close
+    a, _ = close_pairs(np.array([[0.0, 0.0], [0.1, 0.0]]), 0.1)
+    assert len(a) == 0
+
+def test_refine_layout_spreads_overlapping_nodes():
+    G = nx.Graph()
+    G.add_weighted_edges_from([('a', 'b', 5.0), ('b', 'c', 5.0), ('c', 'd', 5.0)])
+    pos = {'a': (0.0, 0.0), 'b': (0.01, 0.02), 'c': (0.5, 0.5), 'd': (0.52, 0.49)}
+    iterations = refine_layout(pos, G, max_iterations=50)
+    assert 1 < iterations < 50
+    P = np.array([pos[node] for node in G])
+    assert not brute_force(P, 0.1)
+
+def test_refine_layout_keeps_fixed_nodes_and_applies_weights():
+    G = nx.Graph()
+    G.add_weighted_edges_from([('a', 'b', 10.0), ('c', 'd', 1.0), ('a', 'e', 5.0)])
+    pos = {'a': (0.0, 0.0), 'b': (0.1, 0.0), 'c': (2.0, 0.0), 'd': (3.0, 0.0), 'e': (0.0, 0.05)}
+    start = dict(pos)
+    refine_layout(pos, G, max_iterations=1, fixed={'a'})
+    assert pos['a'] == start['a']
+    # The heavy short edge is stretched, the light long one shortened
+    assert pos['b'][0] > start['b'][0]
+    assert pos['d'][0] - pos['c'][0] < start['d'][0] - start['c'][0]
+    # Of the overlapping pair, the node that is not fixed moves
+    assert pos['e'] != start['e']
@@ -0,0 +1,65 @@
+import os
+from heapq import nsmallest
+import networkx as nx
+import pytest
+import graph_cache
+from graph_snapshot import load_snapshot
+from nearest import iter_nearest, k_nearest, multi_source_k_nearest, shutdown_pool
+
+def baseline(G, source, k, cutoff=None):
+    lengths = nx.single_source_dijkstra_path_length(G, source, cutoff=cutoff)
+    return nsmallest(k + 1, lengths.items(), key=lambda x: x[1])[1:]
+
+@pytest.mark.parametrize('k', [1, 3, 10, 50])
+def test_k_nearest_matches_the_full_dijkstra(vault_db, k):
+    snapshot = graph_cache.get_snapshot(vault_db)
+    G = snapshot.to_networkx()
+    for source in snapshot.names[::40]:
+        expected = baseline(G, source, k)
+        assert k_nearest(snapshot, source, k) == pytest.approx(expected)
+        assert k_nearest(G, source, k) == expected
+
+def test_ties_keep_the_dijkstra_order(graph_db):
+    # Every neighbor of the hub is at the same distance; the order is the edge order
+    edges = [('hub', f'n{i}', 1.0) for i in (3, 1, 4, 0, 2)] + [('n1', 'far', 1.0)]
+    snapshot = load_snapshot(graph_db(edges))
+    G = snapshot.to_networkx()
+    assert k_nearest(snapshot, 'hub', 3) == baseline(G, 'hub', 3) == [('n3', 1.0), ('n1', 1.0), ('n4', 1.0)]
+    assert k_nearest(snapshot, 'hub', 10) == baseline(G, 'hub', 10)
+    assert [node for node, _ in iter_nearest(snapshot, 'hub')][-1] == 'far'
+
+def test_cutoff_and_small_components(graph_db):
+    snapshot = load_snapshot(graph_db([('a', 'b', 1.0), ('b', 'c', 2.0), ('x', 'y', 1.0)]))
+    assert k_nearest(snapshot, 'a', 5) == [('b', 1.0), ('c', 3.0)]
+    assert k_nearest(snapshot, 'a', 5, cutoff=2.0) == [('b', 1.0)]
+    assert k_nearest(snapshot, 'a', 0) == []
+    with pytest.raises(KeyError):
+        k_nearest(snapshot, 'missing', 1)
+
+def test_pool_matches_serial(vault_db):
+    snapshot = graph_cache.get_snapshot(vault_db)
+    centers = snapshot.names[::25] + snapshot.names[:3]
+    serial, serial_all = multi_source_k_nearest(snapshot, centers, 8, processes=1)
+    try:
+        pooled, pooled_all = multi_source_k_nearest(snapshot, centers, 8, processes=2, chunksize=4)
+    finally:
+        shutdown_pool()
+    assert list(pooled) == list(serial) == list(dict.fromkeys(centers))
+    assert pooled == serial
+    assert pooled_all == serial_all
+    assert serial[centers[0]] == k_nearest(snapshot, centers[0], 8)
+
+def test_pool_maps_a_temporary_snapshot_file(vault_db):
+    import nearest
+    snapshot = load_snapshot(vault_db)
+    centers = snapshot.names[:6]
+    try:
+        pooled, _ = multi_source_k_nearest(snapshot, centers, 5, processes=2)
+        path = nearest._pool_file
+        assert path is not None and os.path.exists(path)
+        # The pool stays up for later queries on the same snapshot
+        assert nearest._pool_ready(snapshot, 2)
+    finally:
+        shutdown_pool()
+    assert not os.path.exists(path)
+    assert pooled == {center: k_nearest(snapshot, center, 5) for center in centers}
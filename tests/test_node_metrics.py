@@ -0,0 +1,60 @@
+import shutil
+import sqlite3
+import pytest
+import graph_cache
+import node_metrics
+
+@pytest.fixture
+def metrics_db(vault_db, tmp_path):
+    path = str(tmp_path / 'metrics.db')
+    shutil.copy(vault_db, path)
+    node_metrics.rebuild_metrics(path, processes=1)
+    yield path
+    graph_cache.invalidate(path)
+
+def stored(path):
+    return {row[0]: row[1:] for row in node_metrics.query_metrics(limit=None, db_path=path)}
+
+def recomputed(path):
+    snapshot = graph_cache.get_snapshot(path)
+    return {row[0]: row[1:] for row in node_metrics.compute_metrics(snapshot, list(snapshot.nodes()), 1)}
+
+def write_edges(path, edges, delete=()):
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO edges (source, target, weight) VALUES (?, ?, ?)", edges)
+        conn.executemany("DELETE FROM edges WHERE source = ? AND target = ?", delete)
+    conn.close()
+
+def test_update_matches_a_full_rebuild(metrics_db):
+    snapshot = graph_cache.get_snapshot(metrics_db)
+    names = snapshot.names
+    added = [(names[0], names[300], 0.5), (names[10], names[11], 1.0)]
+    u, v = next(iter(snapshot.edges()))
+    write_edges(metrics_db, added, delete=[(u, v)])
+    changed = [names[0], names[300], names[10], names[11], u, v]
+
+    affected = node_metrics.affected_nodes(graph_cache.get_snapshot(metrics_db), changed, metrics_db)
+    # Every changed node is at distance 0 from a change
+    assert set(changed) <= affected
+    assert len(affected) < len(names)
+
+    updated = node_metrics.update_metrics(changed, metrics_db, processes=1)
+    assert updated == len(affected)
+    assert stored(metrics_db) == recomputed(metrics_db)
+
+def test_unaffected_nodes_are_not_recomputed(metrics_db):
+    # A new component far from everything only affects itself
+    write_edges(metrics_db, [('island a', 'island b', 2.0)])
+    snapshot = graph_cache.get_snapshot(metrics_db)
+    assert node_metrics.affected_nodes(snapshot, ['island a', 'island b'], metrics_db) == {'island a', 'island b'}
+    assert node_metrics.update_metrics(['island a', 'island b'], metrics_db, processes=1) == 2
+    assert node_metrics.get_metrics(['island a'], metrics_db)['island a']['degree'] == 1
+    assert stored(metrics_db) == recomputed(metrics_db)
+
+def test_nothing_to_update_without_the_table(graph_db):
+    path = graph_db([('a', 'b', 1.0)])
+    assert node_metrics.affected_nodes(graph_cache.get_snapshot(path), ['a'], path) == set()
+    assert node_metrics.update_metrics(['a', 'b'], path) == 0
+    assert node_metrics.get_metrics(['a'], path) == {}
+    graph_cache.invalidate(path)
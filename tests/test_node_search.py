@@ -0,0 +1,40 @@
+import sqlite3
+import pytest
+from node_search import search_edges, search_nodes
+
+@pytest.fixture
+def notes(graph_db):
+    return graph_db([('Graph', 'graph theory', 1), ('graph theory', 'Paragraph', 2),
+                     ('photograph', 'Graphs', 3), ('Graphs', 'tree', 4), ('ab', 'cab', 5)])
+
+def test_exact_then_prefix_then_shortest(notes):
+    assert search_nodes('graph', notes) == ['Graph', 'Graphs', 'graph theory', 'Paragraph', 'photograph']
+
+def test_paging(notes):
+    assert search_nodes('graph', notes, limit=2, offset=2) == ['graph theory', 'Paragraph']
+
+def test_short_keyword_falls_back_to_like(notes):
+    # Shorter than a trigram; % and _ are matched literally
+    assert search_nodes('ab', notes) == ['ab', 'cab']
+    assert search_nodes('%', notes) == []
+
+def test_index_follows_new_and_renamed_nodes(notes):
+    assert search_nodes('tree', notes) == ['tree']
+    conn = sqlite3.connect(notes)
+    with conn:
+        conn.execute("UPDATE nodes SET name = 'oak tree' WHERE name = 'tree'")
+        conn.execute("INSERT INTO edges (source, target, weight) VALUES ('treehouse', 'ab', 1)")
+    conn.close()
+    assert search_nodes('tree', notes) == ['treehouse', 'oak tree']
+
+def test_edges_of_the_best_match_come_first(notes):
+    # Both directions of every edge at a hit, grouped by the rank of that hit
+    assert search_edges('graphs', notes) == [('Graphs', 'photograph', 3), ('Graphs', 'tree', 4),
+                                             ('photograph', 'Graphs', 3), ('tree', 'Graphs', 4)]
+    assert search_edges('graph', notes) == [
+        ('Graph', 'graph theory', 1),
+        ('Graphs', 'photograph', 3), ('Graphs', 'tree', 4), ('tree', 'Graphs', 4),
+        ('graph theory', 'Graph', 1), ('graph theory', 'Paragraph', 2),
+        ('Paragraph', 'graph theory', 2),
+        ('photograph', 'Graphs', 3)]
+    assert search_edges('graph', notes, limit=2, offset=1) == [('Graphs', 'photograph', 3), ('Graphs', 'tree', 4)]
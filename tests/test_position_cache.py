@@ -0,0 +1,49 @@
+import sqlite3
+import networkx as nx
+import graph_cache
+import position_cache
+
+def local_graph(snapshot, nodes):
+    return snapshot.to_networkx(nodes)
+
+def test_warm_start_marks_new_and_changed_nodes_stale(graph_db):
+    path = graph_db([('a', 'b', 1.0), ('b', 'c', 2.0), ('c', 'd', 1.0), ('x', 'y', 1.0)])
+    snapshot = graph_cache.get_snapshot(path)
+    local_G = local_graph(snapshot, ['a', 'b', 'c'])
+    position_cache.save_positions({'a': (0, 0), 'b': (1, 0), 'c': (1, 1)}, '2d', snapshot, path)
+
+    pos, stale = position_cache.warm_start(local_G, '2d', graph_cache.get_snapshot(path), path)
+    assert pos == {'a': (0.0, 0.0), 'b': (1.0, 0.0), 'c': (1.0, 1.0)}
+    assert stale == set()
+    # Positions are kept per view
+    assert position_cache.warm_start(local_G, '3d', snapshot, path) == ({}, {'a', 'b', 'c'})
+
+    # A new edge at c changes c's neighborhood only; d was never stored
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("INSERT INTO edges (source, target, weight) VALUES ('c', 'x', 4.0)")
+    conn.close()
+    snapshot = graph_cache.get_snapshot(path)
+    local_G = local_graph(snapshot, ['a', 'b', 'c', 'd', 'x'])
+    pos, stale = position_cache.warm_start(local_G, '2d', snapshot, path)
+    assert set(pos) == {'a', 'b', 'c'}
+    assert stale == {'c', 'd', 'x'}
+    graph_cache.invalidate(path)
+
+def test_weight_changes_change_the_signature():
+    G = nx.Graph()
+    G.add_edge('a', 'b', weight=1.0)
+    before = position_cache.neighborhood_signature(G, 'a')
+    G['a']['b']['weight'] = 2.0
+    assert position_cache.neighborhood_signature(G, 'a') != before
+    assert position_cache.neighborhood_signature(G, 'missing') == ''
+
+def test_saving_positions_keeps_the_cached_graph(graph_db):
+    path = graph_db([('a', 'b', 1.0)])
+    snapshot = graph_cache.get_snapshot(path)
+    position_cache.save_positions({'a': (0, 0, 1), 'b': (1, 0, 2)}, '3d', snapshot, path)
+    assert graph_cache.get_snapshot(path) is snapshot
+    assert position_cache.load_positions(['a', 'b', 'c'], '3d', path) == {
+        'a': ((0.0, 0.0, 1.0), position_cache.neighborhood_signature(snapshot, 'a')),
+        'b': ((1.0, 0.0, 2.0), position_cache.neighborhood_signature(snapshot, 'b'))}
+    graph_cache.invalidate(path)
@@ -0,0 +1,64 @@
+import itertools
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import networkx as nx
+import numpy as np
+from render2d import CHAR_WIDTH, LABEL_PADDING, LabelIndex, render_figure
+
+def overlaps(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+def test_label_index_matches_brute_force():
+    rng = np.random.default_rng(2)
+    corners = rng.random((400, 2)) * 500
+    sizes = rng.random((400, 2)) * 40 + 1
+    boxes = [tuple(c) + tuple(c + s) for c, s in zip(corners, sizes)]
+    index = LabelIndex(cell_size=20)
+    placed = []
+    for box in boxes:
+        expected = not any(overlaps(box, other) for other in placed)
+        assert index.place(box) == expected
+        if expected:
+            placed.append(box)
+    assert 0 < len(placed) < len(boxes)
+
+def test_touching_boxes_do_not_overlap():
+    index = LabelIndex(cell_size=10)
+    assert index.place((0, 0, 10, 10))
+    assert index.place((10, 0, 20, 10))
+    assert not index.place((5, 5, 15, 15))
+    # Boxes spanning many cells, and negative coordinates
+    assert index.place((-100, -100, -50, -1))
+    assert not index.place((-60, -20, -55, -10))
+
+def placed_boxes(layer, renderer):
+    xy = layer.axes.transData.transform(layer.anchors[layer.placed])
+    pixels = renderer.points_to_pixels(layer.font_sizes[layer.placed])
+    half_h = pixels / 2 + LABEL_PADDING
+    half_w = np.array([len(layer.texts[i]) for i in layer.placed]) * pixels * CHAR_WIDTH / 2 + LABEL_PADDING
+    return [(x - w, y - h, x + w, y + h) for (x, y), w, h in zip(xy, half_w, half_h)]
+
+def test_culling_keeps_placed_labels_apart_and_in_view():
+    G = nx.relabel_nodes(nx.random_geometric_graph(150, 0.15, seed=3), str)
+    nx.set_edge_attributes(G, {e: float(i % 9 + 1) for i, e in enumerate(G.edges())}, 'weight')
+    pos = nx.get_node_attributes(G, 'pos')
+    fig = render_figure(['0'], pos, G)
+    FigureCanvasAgg(fig)
+    layer = fig.axes[0].artists[-1]
+    fig.canvas.draw()
+    renderer = fig.canvas.get_renderer()
+    assert layer.placed and layer.placed[0] == 0  # the center comes first
+    assert len(layer.placed) < len(layer.texts)
+    for a, b in itertools.combinations(placed_boxes(layer, renderer), 2):
+        assert not overlaps(a, b)
+
+    # Zoomed in, labels outside the view are culled and more of the rest fit
+    ax = fig.axes[0]
+    ax.set_xlim(0.25, 0.5)
+    ax.set_ylim(0.25, 0.5)
+    fig.canvas.draw()
+    x0, y0, x1, y1 = ax.bbox.extents
+    xy = ax.transData.transform(layer.anchors[layer.placed])
+    assert ((xy[:, 0] >= x0) & (xy[:, 0] <= x1) & (xy[:, 1] >= y0) & (xy[:, 1] <= y1)).all()
+    inside = ax.transData.transform(layer.anchors)
+    visible = ((inside[:, 0] >= x0) & (inside[:, 0] <= x1) & (inside[:, 1] >= y0) & (inside[:, 1] <= y1)).sum()
+    assert len(layer.placed) > 0.3 * visible
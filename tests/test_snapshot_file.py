@@ -0,0 +1,42 @@
+import pickle
+import sqlite3
+import networkx as nx
+import numpy as np
+from graph_snapshot import GraphSnapshot
+from position_cache import save_positions
+from snapshot_file import (MappedSnapshot, database_stamp, load_cached_snapshot, read_header,
+                           read_snapshot_file, write_snapshot_file)
+
+def test_mapped_snapshot_round_trip(tmp_path):
+    snapshot = GraphSnapshot.from_edges(['a', 'b', 'ç', 'd'], [0, 1, 3], [1, 2, 0], [2.0, 0.5, 1.0])
+    path = str(tmp_path / 'graph.snapshot')
+    write_snapshot_file(snapshot, path, stamp=7)
+    mapped, stamp = read_snapshot_file(path)
+    assert isinstance(mapped, MappedSnapshot)
+    assert stamp == read_header(path)['stamp'] == 7
+    assert list(mapped.names) == list(snapshot.names)
+    for array in ('indptr', 'indices', 'weights'):
+        assert np.array_equal(getattr(mapped, array), getattr(snapshot, array))
+    # Pickles as its path, so pool workers map the same file
+    copy = pickle.loads(pickle.dumps(mapped))
+    assert copy.path == path
+    assert np.array_equal(copy.weights, snapshot.weights)
+
+def test_positions_write_keeps_the_snapshot(graph_db, tmp_path):
+    path = graph_db([('a', 'b', 2), ('b', 'c', 1)])
+    snapshot_file = str(tmp_path / 'graph.snapshot')
+    load_cached_snapshot(path, snapshot_file)
+    stamp = database_stamp(path)
+
+    save_positions({'a': (0.0, 1.0), 'b': (1.0, 0.0)}, 'test', nx.Graph([('a', 'b', {'weight': 2})]), path)
+    assert database_stamp(path) == stamp
+    assert isinstance(load_cached_snapshot(path, snapshot_file), MappedSnapshot)
+
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("INSERT INTO edges (source, target, weight) VALUES ('c', 'd', 3)")
+    conn.close()
+    assert database_stamp(path) != stamp
+    rebuilt = load_cached_snapshot(path, snapshot_file)
+    assert not isinstance(rebuilt, MappedSnapshot)
+    assert 'd' in rebuilt
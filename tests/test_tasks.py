@@ -0,0 +1,82 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import tasks
+from tasks import Cancelled, Task, TaskScheduler, checkpoint, current_task
+
+def loop(started, steps=1000):
+    started.set()
+    for i in range(steps):
+        checkpoint(i, steps, 'loop')
+        time.sleep(0.001)
+    return steps
+
+def test_checkpoint_outside_a_task_does_nothing():
+    assert current_task() is None
+    checkpoint(1, 2, 'stage')
+
+def test_checkpoint_reports_and_cancels():
+    task = Task('loop')
+    started = threading.Event()
+    with ThreadPoolExecutor(1) as pool:
+        task.future = pool.submit(tasks._run, task, loop, (started,), {})
+        started.wait()
+        time.sleep(0.05)
+        assert task.stage == 'loop' and task.total == 1000
+        assert 0 < task.fraction() < 1
+        task.cancel()
+        with pytest.raises(Cancelled):
+            task.future.result()
+    assert task.cancelled
+
+def test_cancel_before_start():
+    task = Task('queued')
+    release = threading.Event()
+    with ThreadPoolExecutor(1) as pool:
+        blocker = pool.submit(release.wait)
+        task.future = pool.submit(tasks._run, task, loop, (threading.Event(),), {})
+        task.cancel()
+        release.set()
+        blocker.result()
+    assert task.future.cancelled() and task.stage == 'cancelled'
+
+def test_report_resets_progress_on_a_new_stage():
+    task = Task('stages')
+    task.report(5, 10, 'first')
+    assert task.fraction() == 0.5
+    task.report(stage='second')
+    assert (task.done, task.total, task.fraction()) == (0, 0, None)
+
+@pytest.fixture
+def root():
+    tk = pytest.importorskip('tkinter')
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        pytest.skip("no display")
+    root.withdraw()
+    yield root
+    root.destroy()
+
+def run_until(root, condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        root.update()
+        time.sleep(0.01)
+
+def test_scheduler_delivers_results_and_cancels(root):
+    scheduler = TaskScheduler(root)
+    results, errors = [], []
+    scheduler.submit('double', lambda x: 2 * x, 21, on_done=results.append, on_error=errors.append)
+    started = threading.Event()
+    cancelled = scheduler.submit('loop', loop, started, on_done=results.append, on_error=errors.append)
+    started.wait(5)
+    cancelled.cancel()
+    run_until(root, lambda: not scheduler.tasks)
+    assert results == [42]
+    # A cancelled task calls neither callback
+    assert errors == []
+    scheduler.submit('fail', lambda: 1 / 0, on_error=errors.append)
+    run_until(root, lambda: errors)
+    assert isinstance(errors[0], ZeroDivisionError)
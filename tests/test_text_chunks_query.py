@@ -0,0 +1,67 @@
+import networkx as nx
+import pytest
+from graph_snapshot import load_snapshot
+from text_chunks_query import get_related_chunks
+
+def baseline(G, start, max_depth=3):
+    # The per-node traversal get_related_chunks replaced: the first edge read wins
+    related = {}
+    queue = [(start, 0)]
+    visited = set()
+    for depth in range(max_depth):
+        new_queue = []
+        for current, weight in queue:
+            if current != start:
+                related[current] = max(related.get(current, 0), weight)
+            for neighbor, data in (G[current].items() if current in G else ()):
+                if neighbor not in visited:
+                    new_queue.append((neighbor, data['weight']))
+                    visited.add(neighbor)
+        queue = new_queue
+    return related
+
+def max_rule(G, start, max_depth=3):
+    # Level by level, each newly reached chunk keeps its strongest edge from the level before
+    related = {}
+    seen = {start}
+    frontier = [start]
+    for depth in range(1, max_depth):
+        found = {}
+        for node in frontier:
+            for neighbor, data in G[node].items():
+                if neighbor not in seen:
+                    found[neighbor] = max(found.get(neighbor, data['weight']), data['weight'])
+        related.update(found)
+        seen.update(found)
+        frontier = list(found)
+    return related
+
+@pytest.fixture(scope='module')
+def vault(vault_db):
+    return load_snapshot(vault_db).to_networkx()
+
+@pytest.mark.parametrize('max_depth', [1, 2, 3, 4])
+def test_all_paths_follow_the_max_rule(vault_db, vault, v1_db, max_depth):
+    edges = [(u, v, w) for u, v, w in vault.edges(data='weight')]
+    old = v1_db(edges + [(v, u, w) for u, v, w in edges])
+    snapshot = load_snapshot(vault_db)
+    for start in list(vault)[::60]:
+        expected = max_rule(vault, start, max_depth)
+        assert dict(get_related_chunks(vault_db, start, max_depth)) == expected
+        assert dict(get_related_chunks(old, start, max_depth)) == expected
+        assert dict(get_related_chunks(None, start, max_depth, graph=snapshot)) == expected
+        assert dict(get_related_chunks(None, start, max_depth, graph=vault)) == expected
+
+def test_same_chunks_as_the_baseline_and_never_lower(vault_db, vault):
+    for start in list(vault)[::30]:
+        old = baseline(vault, start)
+        new = get_related_chunks(vault_db, start)
+        assert set(new) == set(old)
+        assert all(new[chunk] >= old[chunk] for chunk in old)
+
+def test_max_weight_among_parents(graph_db):
+    # d is reached from b (weight 2) and from c (weight 9) on the same level
+    path = graph_db([('a', 'b', 1.0), ('a', 'c', 1.0), ('b', 'd', 2.0), ('c', 'd', 9.0), ('d', 'e', 4.0)])
+    assert dict(get_related_chunks(path, 'a')) == {'b': 1.0, 'c': 1.0, 'd': 9.0}
+    assert dict(get_related_chunks(path, 'a', max_depth=4)) == {'b': 1.0, 'c': 1.0, 'd': 9.0, 'e': 4.0}
+    assert dict(get_related_chunks(path, 'missing')) == {}
@@ -1,57 +1,13 @@
 import sqlite3
 from collections import defaultdict
 import os
+from graph_snapshot import load_snapshot
+from bulk_ingest import bulk_ingest
+from database import get_schema_version
 
-def create_or_update_database(filename, db_name='text_chunks.db'):
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
-
-    # Create tables if they don't exist
-    cursor.execute('''CREATE TABLE IF NOT EXISTS nodes
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE)''')
-    cursor.execute('''CREATE TABLE IF NOT EXISTS edges
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  source TEXT, target TEXT, weight REAL,
-                  UNIQUE(source, target))''')
-
-    # Dictionary to store edges
-    edges = {}
-
-    # Read from file and insert or update database
-    with open(filename, 'r') as file:
-        for line in file:
-            parts = line.strip().split(':')
-            if len(parts) == 2:
-                source = parts[0].strip()
-                connections = parts[1].strip().split(',')
-
-                # Insert source node
-                cursor.execute('INSERT OR IGNORE INTO nodes (name) VALUES (?)', (source,))
-
-                for i in range(0, len(connections), 2):
-                    target = connections[i].strip()
-                    weight = float(connections[i+1].strip())
-
-                    # Insert target node
-                    cursor.execute('INSERT OR IGNORE INTO nodes (name) VALUES (?)', (target,))
-
-                    # Store edge in dictionary
-                    edges[(source, target)] = weight
-
-    # Insert edges and their reverse edges
-    for (source, target), weight in edges.items():
-        # Insert forward edge
-        cursor.execute('''INSERT OR REPLACE INTO edges (source, target, weight)
-                          VALUES (?, ?, ?)''', (source, target, weight))
-
-        # Insert reverse edge if not explicitly provided
-        if (target, source) not in edges:
-            cursor.execute('''INSERT OR REPLACE INTO edges (source, target, weight)
-                              VALUES (?, ?, ?)''', (target, source, weight))
-
-    # Commit changes and close connection
-    conn.commit()
-    conn.close()
+def create_or_update_database(filename, db_name='text_chunks.db', workers=1):
+    # Streaming parse, in-memory dedupe and batched inserts in a single transaction
+    return bulk_ingest(filename, db_name, workers=workers)
 
 def read_file(filename):
     graph = defaultdict(dict)
@@ -74,33 +30,96 @@ def read_file(filename):
 
     return graph
 
-def get_related_chunks(db_name, start_chunk, max_depth=3):
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
-
+def load_graph(db_name='text_chunks.db'):
+    # Compact in-memory copy of a chunks database, see get_related_chunks(graph=...)
+    return load_snapshot(db_name)
+
+def _expand_in_memory(graph, frontier, visited):
+    # Next BFS level: unvisited neighbors of the frontier with their strongest edge
+    found = {}
+    for node in frontier:
+        if node not in graph:
+            continue
+        for neighbor, data in graph[node].items():
+            if neighbor not in visited:
+                found[neighbor] = max(found.get(neighbor, data['weight']), data['weight'])
+    return found
+
+def get_related_chunks(db_name, start_chunk, max_depth=3, graph=None):
+    """
+    Collect the chunks reachable from ``start_chunk`` in fewer than ``max_depth`` steps.
+
+    The search runs level by level. Each newly reached chunk keeps the largest weight
+    among the edges that reach it from the previous level. Against the database every
+    level is a single set-based query over a temporary table, so a search costs
+    ``max_depth`` round trips whatever the size of the frontier.
+
+    :param graph: Optional loaded graph (GraphSnapshot or nx.Graph); neighbors are then
+        read from memory and the database is not opened.
+    :return: defaultdict of chunk -> weight.
+    """
     related = defaultdict(float)
-    queue = [(start_chunk, 0)]
-    visited = set()
-
-    for depth in range(max_depth):
-        new_queue = []
-        for current, current_weight in queue:
-            if current != start_chunk:
-                related[current] = max(related[current], current_weight)
-
-            cursor.execute('''SELECT target, weight FROM edges WHERE source = ?''', (current,))
-            for neighbor, edge_weight in cursor.fetchall():
-                if neighbor not in visited:
-                    new_queue.append((neighbor, edge_weight))
-                    visited.add(neighbor)
-
-        queue = new_queue
-        if not queue:
-            break
 
+    if graph is not None:
+        visited = {start_chunk}
+        frontier = [start_chunk]
+        for depth in range(1, max_depth):
+            found = _expand_in_memory(graph, frontier, visited)
+            if not found:
+                break
+            related.update(found)
+            visited.update(found)
+            frontier = list(found)
+        return related
+
+    conn = sqlite3.connect(db_name)
+    c = conn.cursor()
+    if get_schema_version(conn) >= 3:
+        related.update(_related_by_id(c, start_chunk, max_depth))
+        conn.close()
+        return related
+
+    # The whole traversal lives in one temp table: each level is inserted from the
+    # rows of the previous one, skipping chunks that were already reached
+    c.execute("CREATE TEMP TABLE related_visit (name TEXT PRIMARY KEY, depth INTEGER, weight REAL)")
+    c.execute("CREATE INDEX temp.related_visit_depth ON related_visit(depth)")
+    c.execute("INSERT INTO related_visit VALUES (?, 0, NULL)", (start_chunk,))
+    for depth in range(1, max_depth):
+        c.execute('''INSERT INTO related_visit (name, depth, weight)
+                     SELECT e.target, ?, MAX(e.weight)
+                     FROM related_visit f JOIN edges e ON e.source = f.name
+                     WHERE f.depth = ? AND e.target NOT IN (SELECT name FROM related_visit)
+                     GROUP BY e.target''', (depth, depth - 1))
+        if c.rowcount <= 0:
+            break
+    related.update(c.execute("SELECT name, weight FROM related_visit WHERE depth > 0"))
     conn.close()
     return related
 
+def _related_by_id(c, start_chunk, max_depth):
+    # Same traversal on the undirected links table (schema version 3): a pair is one row,
+    # so each level looks it up from both ends through the primary key and links_target.
+    # Joining the edges view instead would make SQLite materialize both directions.
+    c.execute("CREATE TEMP TABLE related_visit (id INTEGER PRIMARY KEY, depth INTEGER, weight REAL)")
+    c.execute("CREATE INDEX temp.related_visit_depth ON related_visit(depth)")
+    c.execute("INSERT INTO related_visit SELECT id, 0, NULL FROM nodes WHERE name = ?", (start_chunk,))
+    for depth in range(1, max_depth):
+        c.execute('''INSERT INTO related_visit (id, depth, weight)
+                     SELECT node, ?, MAX(weight)
+                     FROM (SELECT l.target_id AS node, l.weight AS weight
+                           FROM related_visit f JOIN links l ON l.source_id = f.id
+                           WHERE f.depth = ?
+                           UNION ALL
+                           SELECT l.source_id, l.weight
+                           FROM related_visit f JOIN links l ON l.target_id = f.id
+                           WHERE f.depth = ?)
+                     WHERE node NOT IN (SELECT id FROM related_visit)
+                     GROUP BY node''', (depth, depth - 1, depth - 1))
+        if c.rowcount <= 0:
+            break
+    return c.execute('''SELECT n.name, r.weight FROM related_visit r JOIN nodes n ON n.id = r.id
+                        WHERE r.depth > 0''').fetchall()
+
 def print_related_chunks(related):
     sorted_related = sorted(related.items(), key=lambda x: (x[1], x[0]))
     for chunk, weight in sorted_related:
@@ -108,28 +127,30 @@ def print_related_chunks(related):
 
 
 # Main execution
-filename = 'text_chunks_01.txt'
-db_name = 'text_chunks.db'
-# graph = read_file(filename)
-
-# Check if database exists, if not, create it
-if not os.path.exists(db_name):
-    print("Creating new database...")
-else:
-    print("Updating existing database...")
-
-# Create or update the database from the text file
-create_or_update_database(filename, db_name)
-
-while True:
-    start_chunk = input("Enter the starting chunk (or 'quit' to exit): ")
-    if start_chunk.lower() == 'quit':
-        break
+if __name__ == "__main__":
+    filename = 'text_chunks_01.txt'
+    db_name = 'text_chunks.db'
+    # graph = read_file(filename)
+
+    # Check if database exists, if not, create it
+    if not os.path.exists(db_name):
+        print("Creating new database...")
+    else:
+        print("Updating existing database...")
+
+    # Create or update the database from the text file
+    create_or_update_database(filename, db_name)
+    graph = load_graph(db_name)
+
+    while True:
+        start_chunk = input("Enter the starting chunk (or 'quit' to exit): ")
+        if start_chunk.lower() == 'quit':
+            break
 
-    related_chunks = get_related_chunks(db_name, start_chunk)
+        related_chunks = get_related_chunks(db_name, start_chunk, graph=graph)
 
-    print(f"\nChunks related to {start_chunk} (within 3 steps):")
-    print_related_chunks(related_chunks)
-    print()
+        print(f"\nChunks related to {start_chunk} (within 3 steps):")
+        print_related_chunks(related_chunks)
+        print()
 
-print("Goodbye!")
+    print("Goodbye!")
@@ -2,34 +2,35 @@ import tkinter as tk
 from tkinter import simpledialog, messagebox, font
 import sqlite3
 import networkx as nx
-import plotly.graph_objects as go
-import plotly.io as pio
-import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
 import statistics
+from collections import deque
 from heapq import nsmallest
 import os
 import shutil
 import random
+import analysis
+import graph_cache
+import instrumentation
+import position_cache
+import tasks
+from nearest import multi_source_k_nearest
+from crossings import CrossingIndex
+from layout_refine import refine_layout
+from force_layout import barnes_hut_layout
 
 DB_PATH = os.path.join(os.path.dirname(__file__), 'graph_data.db')
 
+# Accepted layout_type values; a dict of positions is accepted in 2D as well
+LAYOUT_TYPES_2D = ('spring', 'kamada_kawai', 'spectral', 'circular', 'shell', 'spring_grid', 'barnes_hut', 'custom')
+LAYOUT_TYPES_3D = ('spring', 'barnes_hut')
+
 def get_graph_from_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    G = nx.Graph()
-    
-    c.execute("SELECT source, target, weight FROM edges")
-    for row in c.fetchall():
-        G.add_edge(row[0], row[1], weight=row[2])
-    
-    conn.close()
-    return G 
+    return graph_cache.get_graph(DB_PATH)
 
+@instrumentation.traced('local_graph')
 def plot_combined_local_graph(center_nodes, nearest_nodes):
-    G = get_graph_from_db()
+    G = graph_cache.get_snapshot(DB_PATH)
     local_G = nx.Graph()
     
     # Add all center nodes and nearest nodes to the graph
@@ -37,19 +38,23 @@ def plot_combined_local_graph(center_nodes, nearest_nodes):
         local_G.add_node(node)
     for node, _ in nearest_nodes:
         local_G.add_node(node)
+    local_nodes = set(local_G.nodes())
     
     # Add edges between center nodes and their nearest neighbors
     for center_node in center_nodes:
+        adjacency = G[center_node]
         for node, distance in nearest_nodes:
-            if G.has_edge(center_node, node):
-                local_G.add_edge(center_node, node, weight=G[center_node][node]['weight'])
+            if node in adjacency:
+                local_G.add_edge(center_node, node, weight=adjacency[node]['weight'])
     
     # Add edges between nearest nodes and their neighbors
     for node, _ in nearest_nodes:
-        for neighbor in G.neighbors(node):
-            if neighbor in [n[0] for n in nearest_nodes] or neighbor in center_nodes:
-                local_G.add_edge(node, neighbor, weight=G[node][neighbor]['weight'])
+        for neighbor, data in G[node].items():
+            if neighbor in local_nodes:
+                local_G.add_edge(node, neighbor, weight=data['weight'])
     
+    instrumentation.count('nodes', local_G.number_of_nodes())
+    instrumentation.count('edges', local_G.number_of_edges())
     return local_G
 
 def line_intersection(line1, line2):
@@ -73,24 +78,62 @@ def adjust_node_position(pos, node, local_G, dx=None, dy=None):
         dy = random.uniform(-0.1, 0.1)
     pos[node] = (x + dx, y + dy)
 
-def adjust_for_crossing(pos, u1, v1, u2, v2, step=0.03, max_attempts=20):
-    original_positions = {node: pos[node] for node in [u1, v1, u2, v2]}
-    
-    for _ in range(max_attempts):
-        # Try small adjustments
-        for node in [u1, v1, u2, v2]:
-            x, y = pos[node]
-            for dx, dy in [(step, 0), (-step, 0), (0, step), (0, -step)]:
-                pos[node] = (x + dx, y + dy)
-                if not line_intersection((*pos[u1], *pos[v1]), (*pos[u2], *pos[v2])):
-                    return True  # Crossing resolved
-            pos[node] = (x, y)  # Reset if not resolved
-    
-    # If not resolved, revert to original positions
-    for node, position in original_positions.items():
-        pos[node] = position
+def adjust_for_crossing(pos, u1, v1, u2, v2, step=0.03, fixed=()):
+    # Try small adjustments of the ends not in ``fixed``. Every move that does not
+    # resolve the crossing is undone, so a second sweep would test exactly the same
+    # positions again
+    for node in [u1, v1, u2, v2]:
+        if node in fixed:
+            continue
+        x, y = pos[node]
+        for dx, dy in [(step, 0), (-step, 0), (0, step), (0, -step)]:
+            pos[node] = (x + dx, y + dy)
+            if not line_intersection((*pos[u1], *pos[v1]), (*pos[u2], *pos[v2])):
+                return True  # Crossing resolved
+        pos[node] = (x, y)  # Reset if not resolved
     return False  # Couldn't resolve crossing
 
+def remove_crossings(pos, G, fixed=(), max_iterations=50):
+    """
+    Nudge nodes of ``pos`` in place until no edge crossing can be resolved by a small move.
+
+    Each pass tries every crossing once. The crossings of the moved edges are re-read
+    after every move, so one created earlier in the pass is handled in the same pass;
+    passes repeat until one moves nothing or ``max_iterations`` is reached.
+
+    :param fixed: Nodes that are never moved.
+    :return: ``(passes, remaining_crossings)``
+    """
+    # Index the edges on a grid so only nearby edge pairs are tested for crossings
+    crossing_index = CrossingIndex(G.edges(), pos)
+    iteration_count = 0
+    while iteration_count < max_iterations:
+        tasks.checkpoint(iteration_count, max_iterations, 'crossings')
+        adjustments_made = False
+        pending = deque(crossing_index.crossing_edges())
+        queued = set(pending)
+        while pending:
+            tasks.checkpoint()
+            crossing = pending.popleft()
+            u1, v1, u2, v2 = crossing
+            # An earlier move in this pass may already have resolved the crossing
+            if line_intersection((*pos[u1], *pos[v1]), (*pos[u2], *pos[v2])):
+                if adjust_for_crossing(pos, u1, v1, u2, v2, fixed=fixed):
+                    adjustments_made = True
+                    # Queue the crossings the move created, so they are handled in this pass
+                    for node in crossing_index.sync(pos, crossing):
+                        for created in crossing_index.crossings_at(node):
+                            if created not in queued:
+                                queued.add(created)
+                                pending.append(created)
+
+        iteration_count += 1
+
+        if not adjustments_made:
+            break  # Exit the loop if no adjustments were made
+
+    return iteration_count, crossing_index.count_crossings()
+
 def nodes_too_close(pos, node1, node2, threshold=0.1):
     x1, y1 = pos[node1]
     x2, y2 = pos[node2]
@@ -101,7 +144,45 @@ def node_distance(pos, node1, node2):
     x2, y2 = pos[node2]
     return ((x1 - x2)**2 + (y1 - y2)**2)**0.5
 
-def plot_combined_local_graph_2D(center_nodes, nearest_nodes, layout_type='spring', layout_params=None, skip_crossing_checks=False):
+def cached_layout(local_G, position_view, dim):
+    """
+    Restore a layout for ``local_G`` from the positions table.
+
+    :return: ``(pos, fixed)``. ``pos`` is None when nothing usable is stored. ``fixed``
+        is the set of nodes placed exactly as stored; when some nodes are new or have
+        changed edges, only those were laid out, around the others.
+    """
+    if position_view is None:
+        return None, set()
+    stored_pos, stale = position_cache.warm_start(local_G, position_view, graph_cache.get_snapshot(DB_PATH), DB_PATH)
+    if not stored_pos:
+        return None, set()
+    fixed = set(stored_pos) - stale
+    if not stale:
+        return stored_pos, fixed
+    pos = barnes_hut_layout(local_G, dim=dim, pos=stored_pos, fixed=fixed, iterations=30)
+    return pos, fixed
+
+@instrumentation.traced('plot_2d')
+def plot_combined_local_graph_2D(center_nodes, nearest_nodes, layout_type='spring', layout_params=None, skip_crossing_checks=False, refine_iterations=50, position_view=None):
+    pos, local_G = layout_local_graph_2D(center_nodes, nearest_nodes, layout_type, layout_params, skip_crossing_checks, refine_iterations, position_view)
+    draw_local_graph_2D(center_nodes, pos, local_G)
+    # return pos  # Return the 2D coordinates
+    return pos, local_G  # Return both the positions and the graph
+
+@instrumentation.profiled('layout_2d')
+def layout_local_graph_2D(center_nodes, nearest_nodes, layout_type='spring', layout_params=None, skip_crossing_checks=False, refine_iterations=50, position_view=None):
+    """
+    Build the local graph and its 2D layout, without drawing anything.
+
+    Safe to run on a worker thread; it stops at the next :func:`tasks.checkpoint` when
+    the task is cancelled.
+
+    :return: ``(pos, local_G)``
+    """
+    # Checked before any work is done or a trace span is opened
+    if not isinstance(layout_type, dict) and layout_type not in LAYOUT_TYPES_2D:
+        raise ValueError(f"Unknown layout type: {layout_type}")
     local_G = plot_combined_local_graph(center_nodes, nearest_nodes)
 
     # Create a grid-based initial position
@@ -113,145 +194,75 @@ def plot_combined_local_graph_2D(center_nodes, nearest_nodes, layout_type='sprin
     if layout_params is None:
         layout_params = {}
 
-    if layout_type == 'custom':
-        pos = layout_params.get('pos', nx.spring_layout(local_G))
-    elif isinstance(layout_type, dict):
-        pos = layout_type
-    elif layout_type == 'spring':
-        pos = nx.spring_layout(local_G, pos=initial_pos, **layout_params)
-    elif layout_type == 'kamada_kawai':
-        pos = nx.kamada_kawai_layout(local_G, **layout_params)
-    elif layout_type == 'spectral':
-        pos = nx.spectral_layout(local_G, **layout_params)
-    elif layout_type == 'circular':
-        pos = nx.circular_layout(local_G, **layout_params)
-    elif layout_type == 'shell':
-        pos = nx.shell_layout(local_G, **layout_params)
-    elif layout_type == 'spring_grid':
-        pos = nx.spring_layout(local_G, pos=initial_pos, fixed=None, **layout_params)
-    else:
-        raise ValueError(f"Unknown layout type: {layout_type}")
-
-    if not skip_crossing_checks:
-        # Initialize variables
-        max_iterations = 50
-        iteration_count = 0
-
-        # Check for edge crossings
-        while iteration_count < max_iterations:
-            adjustments_made = False
-            edges = list(local_G.edges())
-            for i in range(len(edges)):
-                for j in range(i + 1, len(edges)):
-                    u1, v1 = edges[i]
-                    u2, v2 = edges[j]
-                    line1 = (*pos[u1], *pos[v1])
-                    line2 = (*pos[u2], *pos[v2])
-                    if line_intersection(line1, line2):
-                        adjustments_made = adjust_for_crossing(pos, u1, v1, u2, v2) or adjustments_made
-
-            iteration_count += 1
-
-            if not adjustments_made:
-                break  # Exit the loop if no adjustments were made
-
+    # Seed from the positions stored for this view, if any
+    with instrumentation.span('layout', layout=layout_type if isinstance(layout_type, str) else 'given') as span:
+        pos, fixed = cached_layout(local_G, position_view, dim=2) if layout_type != 'custom' else (None, set())
+        from_cache = len(fixed) == n
+        span.count('from_cache', int(from_cache))
+
+        if pos is not None:
+            pass
+        elif layout_type == 'custom':
+            pos = layout_params.get('pos', nx.spring_layout(local_G))
+        elif isinstance(layout_type, dict):
+            pos = layout_type
+        elif layout_type == 'spring':
+            pos = nx.spring_layout(local_G, pos=initial_pos, **layout_params)
+        elif layout_type == 'kamada_kawai':
+            pos = nx.kamada_kawai_layout(local_G, **layout_params)
+        elif layout_type == 'spectral':
+            pos = nx.spectral_layout(local_G, **layout_params)
+        elif layout_type == 'circular':
+            pos = nx.circular_layout(local_G, **layout_params)
+        elif layout_type == 'shell':
+            pos = nx.shell_layout(local_G, **layout_params)
+        elif layout_type == 'spring_grid':
+            pos = nx.spring_layout(local_G, pos=initial_pos, fixed=None, **layout_params)
+        elif layout_type == 'barnes_hut':
+            # O(N log N) per iteration; accepts pos (warm start) and fixed (pinned nodes)
+            pos = barnes_hut_layout(local_G, dim=2, **layout_params)
+
+    # A layout restored unchanged from the cache was already post-processed; after a
+    # partial restore only the newly placed nodes are moved
+    if not skip_crossing_checks and not from_cache:
+        with instrumentation.span('crossing_removal') as span:
+            max_iterations = 50
+            iteration_count, remaining_crossings = remove_crossings(pos, local_G, fixed, max_iterations)
+            span.count('iterations', iteration_count)
+            span.count('remaining', remaining_crossings)
         if iteration_count == max_iterations:
             print(f"Warning: Maximum iterations ({max_iterations}) reached. Some edge crossings may remain.")
+        if remaining_crossings:
+            print(f"{remaining_crossings} edge crossing(s) remain after {iteration_count} iteration(s).")
 
-        # Detect and resolve edge crossings
-        edges = list(local_G.edges())
-        nodes = list(local_G.nodes())
-        max_iterations = 50
-        for _ in range(max_iterations):
-            # crossings_found = False
-            close_nodes_found = False
-            
-            # Check for close nodes
-            for i in range(len(nodes)):
-                for j in range(i + 1, len(nodes)):
-                    if nodes_too_close(pos, nodes[i], nodes[j]):
-                        close_nodes_found = True
-                        # Push one node away from the other
-                        x1, y1 = pos[nodes[i]]
-                        x2, y2 = pos[nodes[j]]
-                        dx = 0.02 if x2 > x1 else -0.02
-                        dy = 0.02 if y2 > y1 else -0.02
-                        adjust_node_position(pos, nodes[j], local_G, dx, dy)
-            
-            # Check edge weights and node distances
-            for u, v in local_G.edges():
-                weight = local_G[u][v]['weight']
-                distance = node_distance(pos, u, v)
-                
-                if weight > 7 and distance < 0.4:
-                    adjustments_made = True
-                    # Push nodes apart
-                    x1, y1 = pos[u]
-                    x2, y2 = pos[v]
-                    dx = 0.1 if x2 > x1 else -0.1
-                    dy = 0.1 if y2 > y1 else -0.1
-                    adjust_node_position(pos, u, local_G, -dx, -dy)
-                    adjust_node_position(pos, v, local_G, dx, dy)
-                elif weight < 3 and distance > 0.4:
-                    adjustments_made = True
-                    # Pull nodes closer
-                    x1, y1 = pos[u]
-                    x2, y2 = pos[v]
-                    dx = 0.03 if x2 > x1 else -0.03
-                    dy = 0.03 if y2 > y1 else -0.03
-                    adjust_node_position(pos, u, local_G, dx, dy)
-                    adjust_node_position(pos, v, local_G, -dx, -dy)
-
-            if not (close_nodes_found): # if not (crossings_found or close_nodes_found):
-                break
-    
-    # Get edge weights
-    edge_weights = [local_G[u][v]['weight'] for u, v in local_G.edges()]
-
-    if edge_weights:
-        # Normalize edge weights for line width
-        max_weight = max(edge_weights)
-        min_weight = min(edge_weights)
-        weight_range = max_weight - min_weight
-        normalized_weights = [(1 + max_weight - w) / weight_range for w in edge_weights]
-        edge_widths = [1 + 7 * nw for nw in normalized_weights]  # Scale to 1-8 range
-    else:
-        edge_widths = []
+        # Spread close nodes and fix edge lengths by weight, as array operations
+        with instrumentation.span('refine') as span:
+            span.count('iterations', refine_layout(pos, local_G, max_iterations=refine_iterations, fixed=fixed))
+
+    if position_view is not None:
+        position_cache.save_positions(pos, position_view, graph_cache.get_snapshot(DB_PATH), DB_PATH)
+
+    return pos, local_G
+
+@instrumentation.profiled('draw_2d')
+def draw_local_graph_2D(center_nodes, pos, local_G):
+    """Draw a laid out local graph with matplotlib; call it from the Tk main thread."""
+    # Imported on first use so the GUI starts without loading matplotlib
+    import matplotlib.pyplot as plt
+    from render2d import FIGSIZE, draw_graph_2d
 
     # Set up the plot
-    plt.figure(figsize=(14, 8))
-    
-    # Draw edges
-    nx.draw_networkx_edges(local_G, pos, width=edge_widths, edge_color='skyblue', alpha=0.6)
-    
-    # Draw nodes
-    node_sizes = [50 + 100 * local_G.degree(node) for node in local_G.nodes()]  # Scale size based on degree
-    node_colors = ['#d97706' if node in center_nodes else 'thistle' for node in local_G.nodes()]
-    nx.draw_networkx_nodes(local_G, pos, node_size=node_sizes, node_color=node_colors)
-    
-    # Draw labels
-    nx.draw_networkx_labels(local_G, pos, font_size=11)
-
-    # Print edge weights at the center of each edge
-    for (u, v), width in zip(local_G.edges(), edge_weights):
-        x0, y0 = pos[u]
-        x1, y1 = pos[v]
-        mid_x = (x0 + x1) / 2
-        mid_y = (y0 + y1) / 2
-        plt.text(mid_x, mid_y, f'{width:.2f}', fontsize=8, ha='center', va='center', color='steelblue')
-    
+    plt.figure(figsize=FIGSIZE)
+
+    # Edges, nodes and the labels that fit at the current zoom level
+    draw_graph_2d(plt.gca(), local_G, pos, center_nodes)
+
     # Set title
     plt.title(f'Combined Local Graph for {", ".join(center_nodes)}')
-    
-    # Remove axis
-    plt.axis('off')
-    
+
     # Show the plot
     plt.tight_layout()
     plt.show(block=False)
-    
-    # return pos  # Return the 2D coordinates
-    return pos, local_G  # Return both the positions and the graph
 
 def adjust_coordinates(coordinates, result_window):
     adjust_window = tk.Toplevel(result_window)
@@ -284,127 +295,96 @@ def adjust_coordinates(coordinates, result_window):
 def update_plot(new_coordinates):
     global node_coordinates_2d, local_G, nodes, all_nearest_nodes
     node_coordinates_2d = new_coordinates
-    pos, updated_local_G = plot_combined_local_graph_2D(nodes, list(all_nearest_nodes), layout_type='custom', layout_params={'pos': new_coordinates}, skip_crossing_checks=True)
+    pos, updated_local_G = plot_combined_local_graph_2D(nodes, list(all_nearest_nodes), layout_type='custom', layout_params={'pos': new_coordinates}, skip_crossing_checks=True, position_view='2d')
     
     # If you need to update the global local_G
     local_G = updated_local_G
 
-def plot_combined_local_graph_3D(center_nodes, nearest_nodes):
+@instrumentation.traced('plot_3d')
+def plot_combined_local_graph_3D(center_nodes, nearest_nodes, layout_type='spring', layout_params=None, position_view=None):
+    pos, local_G = layout_local_graph_3D(center_nodes, nearest_nodes, layout_type, layout_params, position_view)
+    draw_local_graph_3D(center_nodes, pos, local_G)
+
+@instrumentation.profiled('layout_3d')
+def layout_local_graph_3D(center_nodes, nearest_nodes, layout_type='spring', layout_params=None, position_view=None):
+    """3D counterpart of :func:`layout_local_graph_2D`; returns ``(pos, local_G)``."""
+    if layout_type not in LAYOUT_TYPES_3D:
+        raise ValueError(f"Unknown layout type: {layout_type}")
     local_G = plot_combined_local_graph(center_nodes, nearest_nodes)
     
-    # Get the spring layout in 3D
-    pos = nx.spring_layout(local_G, dim=3)
-    
-    # Extract 3D coordinates for nodes
-    node_x = [pos[node][0] for node in local_G.nodes()]
-    node_y = [pos[node][1] for node in local_G.nodes()]
-    node_z = [pos[node][2] for node in local_G.nodes()]
-    
-    # Create the 3D scatter plot for nodes
-    node_trace = go.Scatter3d(
-        x=node_x, y=node_y, z=node_z,
-        mode='markers+text',
-        marker=dict(
-            size=[5 + 5 * local_G.degree(node) for node in local_G.nodes()],
-            color=['#d97706' if node in center_nodes else 'thistle' for node in local_G.nodes()],
-            opacity=0.8,
-        ),
-        text=list(local_G.nodes()),
-        hoverinfo='text',
-        textposition="top center"
-    )
-    
-    # Create the 3D plot for edges
-    edge_x = []
-    edge_y = []
-    edge_z = []
-    edge_text_x = []
-    edge_text_y = []
-    edge_text_z = []
-    edge_texts = []
-
-    edge_weights = [local_G[u][v]['weight'] for u, v in local_G.edges()]
-
-    for (u, v), weight in zip(local_G.edges(), edge_weights):
-        x0, y0, z0 = pos[u]
-        x1, y1, z1 = pos[v]
-        edge_x.extend([x0, x1, None])
-        edge_y.extend([y0, y1, None])
-        edge_z.extend([z0, z1, None])
-        
-        # Calculate the midpoint of the edge
-        mid_x = (x0 + x1) / 2
-        mid_y = (y0 + y1) / 2
-        mid_z = (z0 + z1) / 2
-        edge_text_x.append(mid_x)
-        edge_text_y.append(mid_y)
-        edge_text_z.append(mid_z)
-        edge_texts.append(f'{weight:.2f}')
-    
-    edge_trace = go.Scatter3d(
-        x=edge_x, y=edge_y, z=edge_z,
-        mode='lines',
-        line=dict(width=10, color='skyblue'),
-        hoverinfo='none'
-    )
-
-    edge_text_trace = go.Scatter3d(
-        x=edge_text_x, y=edge_text_y, z=edge_text_z,
-        mode='text',
-        text=edge_texts,
-        textposition='middle center',
-        hoverinfo='none',
-        textfont=dict(color='steelblue', size=12)
-    )
-    
-    # Set up the figure with nodes and edges
-    fig = go.Figure(data=[edge_trace, node_trace, edge_text_trace],
-                    layout=go.Layout(
-                        title=f'3D Combined Local Graph for {", ".join(center_nodes)}',
-                        showlegend=False,
-                        margin=dict(b=20, l=5, r=5, t=40),
-                        scene=dict(
-                            xaxis=dict(showbackground=False),
-                            yaxis=dict(showbackground=False),
-                            zaxis=dict(showbackground=False),
-                        )
-                    ))
-
-    # Show the 3D plot
-    pio.show(fig)
+    if layout_params is None:
+        layout_params = {}
+
+    # Seed from the positions stored for this view, if any
+    with instrumentation.span('layout', layout=layout_type, dim=3) as span:
+        pos, fixed = cached_layout(local_G, position_view, dim=3)
+        from_cache = len(fixed) == len(local_G)
+        span.count('from_cache', int(from_cache))
+
+        # Get the layout in 3D
+        if pos is not None:
+            pass
+        elif layout_type == 'spring':
+            pos = nx.spring_layout(local_G, dim=3, **layout_params)
+        elif layout_type == 'barnes_hut':
+            pos = barnes_hut_layout(local_G, dim=3, **layout_params)
+
+    if position_view is not None:
+        position_cache.save_positions(pos, position_view, graph_cache.get_snapshot(DB_PATH), DB_PATH)
+
+    return pos, local_G
+
+@instrumentation.profiled('draw_3d')
+def draw_local_graph_3D(center_nodes, pos, local_G):
+    """Build the plotly figure of a laid out local graph and open it."""
+    # Imported on first use; plotly itself is only loaded when the figure is written
+    from render3d import show_3d
+
+    # Written as HTML next to a shared plotly.js and opened in the browser
+    show_3d(center_nodes, pos, local_G)
+
+def find_nearest_for_nodes(nodes, k=20):
+    """
+    Worker side of :func:`find_and_plot_multiple_nodes`: check the nodes and find the
+    ``k`` nearest nodes of each.
+
+    :return: ``(nearest_by_node, all_nearest_nodes)`` as from ``multi_source_k_nearest``.
+    """
+    G = graph_cache.get_snapshot(DB_PATH)
+    # Check if all nodes exist in the graph
+    for node in nodes:
+        if node not in G:
+            raise KeyError(f"Node '{node}' not found in the graph.")
+    with instrumentation.span('compare_nodes', centers=len(nodes)):
+        return multi_source_k_nearest(G, nodes, k)
 
 def find_and_plot_multiple_nodes(root):
-    global nodes, all_nearest_nodes, node_coordinates_2d, local_G
-    G = get_graph_from_db()
-    
-    # Input 5 nodes in one line (comma-separated)
-    node_input = simpledialog.askstring("Input", "Enter 5 nodes to compare (comma-separated):")
+    # Input the nodes in one line (comma-separated)
+    node_input = simpledialog.askstring("Input", "Enter nodes to compare (comma-separated):")
     
     if not node_input:
         messagebox.showerror("Error", "No input provided.")
         return
     
-    # Split the input into a list of node names and remove any extra spaces
-    nodes = [node.strip() for node in node_input.split(',')]
+    # Split the input into a list of node names and remove any extra spaces and duplicates
+    center_nodes = list(dict.fromkeys(node.strip() for node in node_input.split(',') if node.strip()))
     
-    # Check if exactly 5 nodes were provided
-    if len(nodes) != 5:
-        messagebox.showerror("Error", "Please enter exactly 5 nodes.")
+    if not center_nodes:
+        messagebox.showerror("Error", "Please enter at least one node.")
         return
     
-    # Check if all nodes exist in the graph
-    for node in nodes:
-        if node not in G.nodes():
-            messagebox.showerror("Error", f"Node '{node}' not found in the graph.")
-            return
-    
-    # Find nearest nodes for each input node
-    all_nearest_nodes = set()
+    # Loading the graph and the searches run on the task pool; the window opens when done
+    tasks.get_scheduler(root).submit(
+        f"Compare {', '.join(center_nodes)}", find_nearest_for_nodes, center_nodes,
+        on_done=lambda result: show_comparison(root, center_nodes, *result),
+        on_error=lambda error: messagebox.showerror("Error", error.args[0] if error.args else str(error)))
+
+def show_comparison(root, center_nodes, nearest_by_node, nearest_pairs):
+    """Open the results window of a finished comparison, with its plot buttons."""
+    # Every window keeps its own nodes, so several comparisons can be open at once
     result_text = ""
-    for node in nodes:
-        distances = nx.single_source_dijkstra_path_length(G, node)
-        nearest_nodes = nsmallest(21, distances.items(), key=lambda x: x[1])[1:21]  # Get top 20 excluding the node itself
-        all_nearest_nodes.update(nearest_nodes)
+    for node in center_nodes:
+        nearest_nodes = nearest_by_node[node]
         
         result_text += f"\nTop 20 nearest nodes to {node}:\n"
         result_text += "\n".join([f"{i+1}. {n[0]}: {n[1]}" for i, n in enumerate(nearest_nodes)])
@@ -421,26 +401,44 @@ def find_and_plot_multiple_nodes(root):
     text_widget.insert(tk.END, result_text)
     text_widget.config(state=tk.DISABLED)
     
-    # Calculate the metrics for the selected nodes
-    # df = calculate_node_metrics(G, nodes)
-
-    # Display the table in the GUI
-    # display_metrics(df)
+    # Calculate the metrics for the selected nodes and display the table; rows already
+    # stored in node_metrics are read instead of recomputed
+    def show_metrics():
+        tasks.get_scheduler(root).submit(
+            f"Metrics of {', '.join(center_nodes)}",
+            lambda: analysis.calculate_node_metrics(graph_cache.get_snapshot(DB_PATH), center_nodes, DB_PATH),
+            on_done=analysis.display_metrics)
 
     # Function to plot 2D graph and show coordinates
     def plot_2d_and_show_coords():
-        global node_coordinates_2d, local_G
-        node_coordinates_2d, local_G = plot_combined_local_graph_2D(nodes, list(all_nearest_nodes), 'spring_grid', {'k': 0.7, 'iterations': 50})
+        tasks.get_scheduler(root).submit(
+            f"2D layout of {', '.join(center_nodes)}", layout_local_graph_2D,
+            center_nodes, list(nearest_pairs), 'spring_grid', {'k': 0.7, 'iterations': 50}, position_view='2d',
+            on_done=draw_2d_and_show_coords)
+
+    def draw_2d_and_show_coords(result):
+        global nodes, all_nearest_nodes, node_coordinates_2d, local_G
+        # update_plot() redraws the most recent 2D plot
+        nodes, all_nearest_nodes = center_nodes, nearest_pairs
+        node_coordinates_2d, local_G = result
+        draw_local_graph_2D(center_nodes, node_coordinates_2d, local_G)
+        coordinates = node_coordinates_2d
         
         # Create buttons for showing coordinates and adjusting them
         show_coords_button = tk.Button(button_frame, text="Show 2D Coordinates", 
-                                       command=lambda: show_2d_coordinates(node_coordinates_2d))
+                                       command=lambda: show_2d_coordinates(coordinates))
         show_coords_button.pack(side=tk.LEFT, padx=5)
 
         adjust_coords_button = tk.Button(button_frame, text="Adjust Coordinates", 
-                                         command=lambda: adjust_coordinates(node_coordinates_2d, result_window))
+                                         command=lambda: adjust_coordinates(coordinates, result_window))
         adjust_coords_button.pack(side=tk.LEFT, padx=5)
 
+    def plot_3d():
+        tasks.get_scheduler(root).submit(
+            f"3D layout of {', '.join(center_nodes)}", layout_local_graph_3D,
+            center_nodes, list(nearest_pairs), position_view='3d',
+            on_done=lambda result: draw_local_graph_3D(center_nodes, *result))
+
     # Function to show 2D coordinates
     def show_2d_coordinates(coordinates):
         coord_window = tk.Toplevel(result_window)
@@ -462,12 +460,11 @@ def find_and_plot_multiple_nodes(root):
     plot_2d_button = tk.Button(button_frame, text="Plot 2D Graph", command=plot_2d_and_show_coords)
     plot_2d_button.pack(side=tk.LEFT, padx=5)
 
-    plot_3d_button = tk.Button(button_frame, text="Plot 3D Graph", 
-                               command=lambda: plot_combined_local_graph_3D(nodes, list(all_nearest_nodes)))
+    plot_3d_button = tk.Button(button_frame, text="Plot 3D Graph", command=plot_3d)
     plot_3d_button.pack(side=tk.LEFT, padx=5)
 
-    # Update the window to ensure all widgets are drawn
-    result_window.update()
+    metrics_button = tk.Button(button_frame, text="Node Metrics", command=show_metrics)
+    metrics_button.pack(side=tk.LEFT, padx=5)
 
 def show_coordinates(node_coordinates):
     coord_window = tk.Toplevel()